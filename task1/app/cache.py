@@ -0,0 +1,176 @@
+
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+# Read-through cache for GET /trades/ responses
+#   TRADES_CACHE_TTL          - seconds an entry stays fresh (0 disables the cache)
+#   TRADES_CACHE_MAX_ENTRIES  - LRU capacity of the in-process backend
+#   TRADES_CACHE_URL          - redis://host:port/db to share the cache between workers
+TRADES_CACHE_TTL = float(os.getenv("TRADES_CACHE_TTL", "5"))
+TRADES_CACHE_MAX_ENTRIES = int(os.getenv("TRADES_CACHE_MAX_ENTRIES", "1024"))
+TRADES_CACHE_URL = os.getenv("TRADES_CACHE_URL")
+
+# Generation counter bumped by every write, for queries without a ticker filter
+ALL_TICKERS = "*"
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    next_cursor: Optional[str]
+
+def _normalize(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.isoformat()
+    return str(value)
+
+def make_key(**params) -> str:
+    """Cache key for a set of query parameters, independent of their order and formatting."""
+    return "&".join(f"{name}={_normalize(params[name])}" for name in sorted(params))
+
+class TradeCache:
+    """
+    Invalidation uses per-ticker generation counters rather than deleting
+    entries: a query's key embeds the current generation of its ticker (or of
+    ALL_TICKERS when it has no ticker filter), and a write to a ticker bumps
+    both. Entries for older generations are never looked up again and age out
+    through the TTL and LRU. Because the generation is read before the query
+    runs, a write that races with a cache fill can only leave behind an entry
+    that is already unreachable.
+    """
+
+    backend = "memory"
+    # Whether calls make network round trips, and so must not run on the event loop
+    blocking = False
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = ttl > 0 and max_entries > 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+
+    def generation(self, ticker: Optional[str]) -> int:
+        return self._generations.get(ticker or ALL_TICKERS, 0)
+
+    def key(self, ticker: Optional[str], **params) -> str:
+        return f"{make_key(ticker=ticker, **params)}#{self.generation(ticker)}"
+
+    def lookup(self, ticker: Optional[str], **params) -> Tuple[str, Optional[CachedResponse]]:
+        """key() and get() in one call: the query's key, and its cached response if any."""
+        key = self.key(ticker, **params)
+        return key, self.get(key)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.expirations += 1
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: CachedResponse):
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, tickers: Iterable[str]):
+        """Makes every cached query for `tickers`, and every unfiltered query, stale."""
+        for ticker in set(tickers):
+            self._generations[ticker] = self._generations.get(ticker, 0) + 1
+            self.invalidations += 1
+        self._generations[ALL_TICKERS] = self._generations.get(ALL_TICKERS, 0) + 1
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "size": self.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+class RedisTradeCache(TradeCache):
+    """
+    Same scheme on a Redis-compatible server, so that all workers share the
+    cache and see each other's invalidations. Expiry and eviction are left to
+    the server (SET ... PX and its maxmemory policy), so the expiration and
+    eviction counters stay at zero here.
+    """
+
+    backend = "redis"
+    blocking = True
+    PREFIX = "trades:cache:"
+
+    def __init__(self, url: str, ttl: float):
+        import redis
+
+        super().__init__(ttl, max_entries=1)
+        self._redis = redis.Redis.from_url(url)
+
+    def generation(self, ticker: Optional[str]) -> int:
+        return int(self._redis.get(f"{self.PREFIX}gen:{ticker or ALL_TICKERS}") or 0)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        raw = self._redis.get(f"{self.PREFIX}q:{key}")
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        etag, next_cursor, body = raw.split(b"\n", 2)
+        return CachedResponse(body, etag.decode(), next_cursor.decode() or None)
+
+    def set(self, key: str, value: CachedResponse):
+        if not self.enabled:
+            return
+        raw = b"\n".join([value.etag.encode(), (value.next_cursor or "").encode(), value.body])
+        self._redis.set(f"{self.PREFIX}q:{key}", raw, px=int(self.ttl * 1000))
+
+    def invalidate(self, tickers: Iterable[str]):
+        pipeline = self._redis.pipeline(transaction=False)
+        for ticker in set(tickers):
+            pipeline.incr(f"{self.PREFIX}gen:{ticker}")
+            self.invalidations += 1
+        pipeline.incr(f"{self.PREFIX}gen:{ALL_TICKERS}")
+        pipeline.execute()
+
+    def size(self) -> int:
+        return sum(1 for _ in self._redis.scan_iter(f"{self.PREFIX}q:*", count=1000)) if self.enabled else 0
+
+if TRADES_CACHE_URL:
+    trade_cache = RedisTradeCache(TRADES_CACHE_URL, TRADES_CACHE_TTL)
+else:
+    trade_cache = TradeCache(TRADES_CACHE_TTL, TRADES_CACHE_MAX_ENTRIES)
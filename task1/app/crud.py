@@ -1,30 +1,175 @@
 
+from sqlalchemy import func, insert, or_, select
 from sqlalchemy.orm import Session
-from . import models, schemas
+from sqlalchemy.sql import Select
+from . import diagnostics, models, rollups, schemas
 from datetime import datetime
-from typing import List, Optional
+from typing import TYPE_CHECKING, Iterator, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    # Only needed in DB_ASYNC mode, which requires the sqlalchemy[asyncio] extra
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# The sequence trade ids are drawn from (see migrations/versions/0004_partition_trades.py)
+TRADE_ID_SEQUENCE = "trades_id_seq"
+
+# Columns of the plain-tuple trade queries (as_rows=True and stream_trades), in output order
+TRADE_COLUMNS = ("id", "ticker", "price", "quantity", "side", "timestamp")
+
+def _rollup_entry(trade: models.Trade) -> rollups.TradeEntry:
+    return (trade.ticker, trade.price, trade.quantity, trade.side, trade.timestamp)
 
 def create_trade(db: Session, trade: schemas.TradeCreate) -> models.Trade:
     db_trade = models.Trade(**trade.dict())
     db.add(db_trade)
+    db.flush()  # assigns id and timestamp
+    db.execute(rollups.rollup_upsert([_rollup_entry(db_trade)]))
     db.commit()
     db.refresh(db_trade)
     return db_trade
 
+async def create_trade_async(db: "AsyncSession", trade: schemas.TradeCreate) -> models.Trade:
+    db_trade = models.Trade(**trade.dict())
+    db.add(db_trade)
+    await db.flush()
+    await db.execute(rollups.rollup_upsert([_rollup_entry(db_trade)]))
+    await db.commit()
+    await db.refresh(db_trade)
+    return db_trade
+
+def create_trades_batch(db: Session, trades: List[schemas.TradeCreate]) -> List[dict]:
+    """
+    Insert a chunk of trades with a single multi-row INSERT ... RETURNING and
+    commit it, together with the matching rollup updates, as one transaction.
+    Returns the assigned id and timestamp of each trade in input order, so no
+    per-row refresh is needed. PostgreSQL does not promise RETURNING rows in
+    VALUES order, so the ids are drawn from the sequence first and inserted
+    explicitly, and the returned timestamps are matched up by id.
+    """
+    if not trades:
+        return []
+    ids = db.execute(
+        select(func.nextval(TRADE_ID_SEQUENCE)).select_from(func.generate_series(1, len(trades)))
+    ).scalars().all()
+    stmt = (
+        insert(models.Trade)
+        .values([dict(trade.dict(), id=trade_id) for trade, trade_id in zip(trades, ids)])
+        .returning(models.Trade.id, models.Trade.timestamp)
+    )
+    timestamps = dict(db.execute(stmt).all())
+    db.execute(rollups.rollup_upsert(
+        (trade.ticker, trade.price, trade.quantity, trade.side, timestamps[trade_id])
+        for trade, trade_id in zip(trades, ids)
+    ))
+    db.commit()
+    return [{"id": trade_id, "timestamp": timestamps[trade_id]} for trade_id in ids]
+
+def _filter_trades(
+    stmt: Select,
+    ticker: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Select:
+    if ticker:
+        stmt = stmt.where(models.Trade.ticker == ticker)
+    if start_date:
+        stmt = stmt.where(models.Trade.timestamp >= start_date)
+    if end_date:
+        stmt = stmt.where(models.Trade.timestamp <= end_date)
+    return stmt
+
+def trades_select(
+    skip: int = 0,
+    limit: int = 100,
+    ticker: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[Tuple[datetime, int]] = None,
+    as_rows: bool = False
+) -> Select:
+    """
+    SELECT for trades ordered by (timestamp, id), shared by the sync and async
+    paths. Pass `cursor` (the key of the last trade of the previous page) for
+    keyset pagination; `skip` is the legacy OFFSET path and gets slower the
+    deeper the page. With `as_rows`, selects plain TRADE_COLUMNS tuples
+    instead of ORM entities.
+    """
+    if as_rows:
+        stmt = select(*[getattr(models.Trade, name) for name in TRADE_COLUMNS])
+    else:
+        stmt = select(models.Trade)
+    stmt = _filter_trades(stmt, ticker, start_date, end_date)
+    if cursor:
+        # (timestamp, id) > cursor, spelled out with a plain lower bound on
+        # timestamp so that partitions before the cursor are pruned
+        last_timestamp, last_id = cursor
+        stmt = stmt.where(
+            models.Trade.timestamp >= last_timestamp,
+            or_(models.Trade.timestamp > last_timestamp, models.Trade.id > last_id),
+        )
+    stmt = stmt.order_by(models.Trade.timestamp, models.Trade.id)
+    if skip:
+        stmt = stmt.offset(skip)
+    return stmt.limit(limit)
+
 def get_trades(
     db: Session,
     skip: int = 0,
     limit: int = 100,
     ticker: Optional[str] = None,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    cursor: Optional[Tuple[datetime, int]] = None,
+    as_rows: bool = False
 ) -> List[models.Trade]:
-    query = db.query(models.Trade)
-    if ticker:
-        query = query.filter(models.Trade.ticker == ticker)
-    if start_date:
-        query = query.filter(models.Trade.timestamp >= start_date)
-    if end_date:
-        query = query.filter(models.Trade.timestamp <= end_date)
-    return query.offset(skip).limit(limit).all()
+    """Trades as ORM entities, or as plain TRADE_COLUMNS tuples with `as_rows`."""
+    stmt = trades_select(skip, limit, ticker, start_date, end_date, cursor, as_rows)
+    if diagnostics.ENABLED:
+        combination = diagnostics.filter_combination(
+            ticker=ticker, start_date=start_date, end_date=end_date, cursor=cursor, skip=skip
+        )
+        return diagnostics.run_with_diagnostics(db, stmt, combination, scalars=not as_rows)
+    result = db.execute(stmt)
+    return result.all() if as_rows else result.scalars().all()
+
+async def get_trades_async(
+    db: "AsyncSession",
+    skip: int = 0,
+    limit: int = 100,
+    ticker: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[Tuple[datetime, int]] = None,
+    as_rows: bool = False
+) -> List[models.Trade]:
+    stmt = trades_select(skip, limit, ticker, start_date, end_date, cursor, as_rows)
+    result = await db.execute(stmt)
+    return result.all() if as_rows else result.scalars().all()
+
+def stream_trades(
+    db: Session,
+    ticker: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    batch_size: int = 5000
+) -> Iterator[Sequence[tuple]]:
+    """
+    Yields matching trades as batches of plain TRADE_COLUMNS tuples, read
+    through a server-side cursor so memory stays bounded by `batch_size`
+    however many rows match.
+    """
+    columns = [getattr(models.Trade, name) for name in TRADE_COLUMNS]
+    stmt = _filter_trades(select(*columns), ticker, start_date, end_date)
+    stmt = stmt.order_by(models.Trade.timestamp, models.Trade.id)
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
 
+def get_trade_stats(
+    db: Session,
+    ticker: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> list:
+    """Per-ticker volume, notional, VWAP and buy/sell split, read from the minute rollups."""
+    return db.execute(rollups.stats_select(ticker, start_date, end_date)).all()
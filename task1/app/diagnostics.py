@@ -0,0 +1,44 @@
+
+import logging
+import os
+import time
+
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+# Query diagnostics for get_trades, enabled with TRADES_QUERY_DIAGNOSTICS:
+#   "plan"    - log the EXPLAIN plan once per filter combination, and the latency of every call
+#   "analyze" - same, but with EXPLAIN (ANALYZE, BUFFERS), which executes the query again
+QUERY_DIAGNOSTICS = os.getenv("TRADES_QUERY_DIAGNOSTICS", "").lower()
+ENABLED = QUERY_DIAGNOSTICS in ("1", "plan", "analyze")
+
+logger = logging.getLogger(__name__)
+if ENABLED and not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(levelname)s:     [diagnostics] %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+_explained = set()
+
+def filter_combination(**filters) -> str:
+    """Names the filters that are set, e.g. "ticker+start_date+end_date"."""
+    return "+".join(name for name, value in filters.items() if value) or "unfiltered"
+
+def explain(db: Session, stmt: Select) -> str:
+    statement = stmt.compile(dialect=db.get_bind().dialect)
+    prefix = "EXPLAIN (ANALYZE, BUFFERS) " if QUERY_DIAGNOSTICS == "analyze" else "EXPLAIN "
+    rows = db.connection().exec_driver_sql(prefix + str(statement), statement.params)
+    return "\n".join(row[0] for row in rows)
+
+def run_with_diagnostics(db: Session, stmt: Select, combination: str, scalars: bool = True) -> list:
+    """Runs `stmt` (sync sessions only), logging its latency and, the first time `combination` is seen, its plan."""
+    if combination not in _explained:
+        _explained.add(combination)
+        logger.info("get_trades plan [%s]:\n%s", combination, explain(db, stmt))
+    start = time.perf_counter()
+    result = db.execute(stmt)
+    results = result.scalars().all() if scalars else result.all()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info("get_trades [%s]: %d rows in %.2f ms", combination, len(results), elapsed_ms)
+    return results
@@ -0,0 +1,48 @@
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, Optional
+
+from . import crud, metrics
+from .database import SessionLocal
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _row_values(row) -> list:
+    trade_id, ticker, price, quantity, side, timestamp = row
+    return [trade_id, ticker, price, quantity, side.value, timestamp.isoformat()]
+
+def _ndjson_chunk(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(crud.TRADE_COLUMNS, _row_values(row)))) + "\n" for row in rows
+    )
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(_row_values(row) for row in rows)
+    return buffer.getvalue()
+
+def iter_export(
+    format: str,
+    ticker: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Iterator[str]:
+    """
+    Yields the export body chunk by chunk, one chunk per batch read from the
+    server-side cursor. The session is opened here rather than taken from
+    get_db so that it stays open for as long as the response is streaming.
+    """
+    if format == "csv":
+        yield ",".join(crud.TRADE_COLUMNS) + "\n"
+    encode = _csv_chunk if format == "csv" else _ndjson_chunk
+    with SessionLocal() as db:
+        for rows in crud.stream_trades(db, ticker=ticker, start_date=start_date, end_date=end_date):
+            with metrics.SERIALIZATION_TIME.time("/trades/export", format):
+                chunk = encode(rows)
+            yield chunk
@@ -1,23 +1,89 @@
 
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Literal, Optional
 from datetime import datetime
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
 
-from . import crud, models, schemas
-from .database import SessionLocal, engine, get_db
+from . import crud, metrics, partitions, schemas
+from .cache import CachedResponse, trade_cache
+from .export import EXPORT_MEDIA_TYPES, iter_export
+from .pagination import decode_cursor, encode_cursor
+from .serialization import rows_columnar, rows_json, trades_json
+from .database import DB_ASYNC, engine, get_async_db, get_db
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic: run `alembic upgrade head` before starting the API
+
+logger = logging.getLogger(__name__)
+
+# Seconds between runs of the trades partition maintenance (0 disables it)
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("TRADES_PARTITION_MAINTENANCE_INTERVAL", "3600"))
+
+def _maintain_partitions():
+    with engine.begin() as conn:
+        partitions.maintain(conn)
+
+async def _partition_maintenance_loop():
+    # Keeps partitions for upcoming trades in place, so inserts never hit a
+    # range without one, and applies TRADES_PARTITION_RETENTION
+    while True:
+        try:
+            await run_in_threadpool(_maintain_partitions)
+        except Exception:
+            logger.exception("Trades partition maintenance failed")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = None
+    if PARTITION_MAINTENANCE_INTERVAL > 0:
+        task = asyncio.create_task(_partition_maintenance_loop())
+    yield
+    if task is not None:
+        task.cancel()
 
 app = FastAPI(
     title="Trading System API",
     description="API for managing trade operations as part of the Internship Assignment.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Number of trades written per INSERT/transaction by the batch endpoint
+BATCH_CHUNK_SIZE = 1000
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# The core trade endpoints run on asyncpg sessions in DB_ASYNC mode and on
+# psycopg2 sessions in the threadpool otherwise
+get_session = get_async_db if DB_ASYNC else get_db
+
+async def _db_call(sync_fn, async_fn, db, **kwargs):
+    if DB_ASYNC:
+        return await async_fn(db, **kwargs)
+    return await run_in_threadpool(sync_fn, db, **kwargs)
+
+async def _cache_call(method, *args, **kwargs):
+    # The Redis backend's calls are network round trips: run them in the
+    # threadpool so a slow or stalled server does not block the event loop
+    if trade_cache.blocking:
+        return await run_in_threadpool(method, *args, **kwargs)
+    return method(*args, **kwargs)
 
 @app.post("/trades/", response_model=schemas.Trade, status_code=201)
-def create_trade_endpoint(trade: schemas.TradeCreate, db: Session = Depends(get_db)):
+async def create_trade_endpoint(
+    trade: schemas.TradeCreate,
+    db=Depends(get_session)
+):
     """
     Record a new trade.
 
@@ -28,29 +94,226 @@ def create_trade_endpoint(trade: schemas.TradeCreate, db: Session = Depends(get_
     """
     # Basic validation is handled by Pydantic models
     # Additional validation could be added here (e.g., check if ticker exists)
-    return crud.create_trade(db=db, trade=trade)
+    db_trade = await _db_call(crud.create_trade, crud.create_trade_async, db, trade=trade)
+    await _cache_call(trade_cache.invalidate, [trade.ticker])
+    return db_trade
+
+def _parse_trade(item, index: int) -> schemas.TradeCreate:
+    if not isinstance(item, dict):
+        raise HTTPException(status_code=422, detail={"index": index, "errors": "Trade must be a JSON object"})
+    try:
+        return schemas.TradeCreate(**item)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail={"index": index, "errors": e.errors()})
+
+async def _iter_trade_chunks(request: Request) -> AsyncIterator[List[schemas.TradeCreate]]:
+    """Yield validated trades from a JSON array or NDJSON body in chunks of BATCH_CHUNK_SIZE."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    chunk: List[schemas.TradeCreate] = []
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        # Parse the stream line by line so memory is bounded by one chunk
+        index = 0
+        buffer = b""
+        async for data in request.stream():
+            parse_start = time.perf_counter()
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    raise HTTPException(status_code=422, detail={"index": index, "errors": "Invalid JSON line"})
+                chunk.append(_parse_trade(item, index))
+                index += 1
+                if len(chunk) >= BATCH_CHUNK_SIZE:
+                    metrics.VALIDATION_TIME.observe(time.perf_counter() - parse_start)
+                    yield chunk
+                    chunk = []
+                    parse_start = time.perf_counter()
+            metrics.VALIDATION_TIME.observe(time.perf_counter() - parse_start)
+        if buffer.strip():
+            try:
+                item = json.loads(buffer)
+            except json.JSONDecodeError:
+                raise HTTPException(status_code=422, detail={"index": index, "errors": "Invalid JSON line"})
+            chunk.append(_parse_trade(item, index))
+    else:
+        body = await request.body()
+        with metrics.VALIDATION_TIME.time():
+            try:
+                items = json.loads(body)
+            except json.JSONDecodeError:
+                raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+            if not isinstance(items, list):
+                raise HTTPException(status_code=422, detail="Request body must be a JSON array of trades")
+            # Validate the whole array before writing anything
+            trades = [_parse_trade(item, index) for index, item in enumerate(items)]
+        for start in range(0, len(trades), BATCH_CHUNK_SIZE):
+            yield trades[start:start + BATCH_CHUNK_SIZE]
+        return
+
+    if chunk:
+        yield chunk
+
+@app.post("/trades/batch", response_model=schemas.TradeBatchResult, status_code=201)
+async def create_trades_batch_endpoint(request: Request, db: Session = Depends(get_db)):
+    """
+    Record many trades in one request.
+
+    Accepts a JSON array of trades (`application/json`) or one trade per line
+    (`application/x-ndjson`). Trades are written with one multi-row INSERT per
+    chunk of 1000, each chunk in its own transaction.
+
+    A JSON array is validated in full before anything is written. NDJSON is
+    ingested as it streams in, so chunks before an invalid line stay committed;
+    the error detail reports the index of the offending line.
+    """
+    created = []
+    async for chunk in _iter_trade_chunks(request):
+        created.extend(await run_in_threadpool(crud.create_trades_batch, db, chunk))
+        await _cache_call(trade_cache.invalidate, [trade.ticker for trade in chunk])
+    return {"count": len(created), "trades": created}
 
 @app.get("/trades/", response_model=List[schemas.Trade])
-def read_trades_endpoint(
-    skip: int = 0,
+async def read_trades_endpoint(
+    request: Request,
+    skip: int = Query(0, description="Number of records to skip (legacy OFFSET paging, slow for deep pages)"),
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
     ticker: Optional[str] = Query(None, description="Filter trades by ticker symbol"),
     start_date: Optional[datetime] = Query(None, description="Filter trades from this date/time onwards (ISO format)"),
     end_date: Optional[datetime] = Query(None, description="Filter trades up to this date/time (ISO format)"),
-    db: Session = Depends(get_db)
+    fast: bool = Query(False, description="Select plain rows and encode them without Pydantic re-validation"),
+    format: Literal["records", "columnar"] = Query(
+        "records", description="records: a list of trade objects; columnar: one array per field (implies fast)"
+    ),
+    db=Depends(get_session)
 ):
     """
     Retrieve a list of trades, with optional filtering by ticker and date range.
+
+    Trades are ordered by timestamp, then id. When more trades match, the
+    `X-Next-Cursor` response header carries a cursor for the next page; pass it
+    back as `cursor` to fetch that page in O(limit) regardless of depth.
+
+    Responses are cached per set of query parameters until a trade is recorded
+    for the same ticker, and carry an `ETag`: send it back in `If-None-Match`
+    to get an empty 304 response while the result is unchanged.
+
+    `fast=true` selects plain column tuples and encodes them directly (with
+    orjson when installed), skipping ORM entities and Pydantic validation; the
+    output holds equivalent JSON values, though floats may be spelled
+    differently (`1e-07` vs `1e-7`), so its ETags differ from the default
+    path's. `format=columnar` returns `{"id": [...], "ticker":
+    [...], ...}`, which loads straight into a pandas DataFrame.
     """
-    trades = crud.get_trades(
-        db=db,
-        skip=skip,
-        limit=limit,
-        ticker=ticker,
-        start_date=start_date,
-        end_date=end_date
+    if cursor and skip:
+        raise HTTPException(status_code=400, detail="Use either cursor or skip, not both")
+    try:
+        cursor_key = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    as_rows = fast or format == "columnar"
+    cache_key, cached = await _cache_call(
+        trade_cache.lookup, ticker, skip=skip, limit=limit, cursor=cursor, start_date=start_date,
+        end_date=end_date, format=format if as_rows else "validated"
     )
-    return trades
+    if cached is None:
+        # Fetch one extra row to find out whether there is a next page
+        trades = await _db_call(
+            crud.get_trades,
+            crud.get_trades_async,
+            db,
+            skip=skip,
+            limit=limit + 1,
+            ticker=ticker,
+            start_date=start_date,
+            end_date=end_date,
+            cursor=cursor_key,
+            as_rows=as_rows
+        )
+        has_more = len(trades) > limit
+        trades = trades[:limit]
+        next_cursor = None
+        if has_more and trades:
+            next_cursor = encode_cursor(trades[-1].timestamp, trades[-1].id)
+        if format == "columnar":
+            encode = rows_columnar
+        else:
+            encode = rows_json if as_rows else trades_json
+        with metrics.SERIALIZATION_TIME.time("/trades/", encode.__name__):
+            body = encode(trades)
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        cached = CachedResponse(body, etag, next_cursor)
+        await _cache_call(trade_cache.set, cache_key, cached)
+
+    headers = {"ETag": cached.etag}
+    if cached.next_cursor:
+        headers["X-Next-Cursor"] = cached.next_cursor
+    if request.headers.get("if-none-match") == cached.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+@app.get("/trades/stats", response_model=List[schemas.TradeStats])
+def read_trade_stats_endpoint(
+    ticker: Optional[str] = Query(None, description="Only return stats for this ticker symbol"),
+    start_date: Optional[datetime] = Query(None, description="Aggregate trades from this date/time onwards (ISO format)"),
+    end_date: Optional[datetime] = Query(None, description="Aggregate trades up to this date/time (ISO format)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Per-ticker trade count, volume, notional, VWAP and buy/sell split.
+
+    Served from per-minute rollups that are updated as trades are inserted, so
+    the cost depends on the number of minutes in the range, not the number of
+    trades. The date range is resolved to whole minutes.
+    """
+    return crud.get_trade_stats(db, ticker=ticker, start_date=start_date, end_date=end_date)
+
+@app.get("/trades/export")
+def export_trades_endpoint(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Output format: ndjson or csv"),
+    ticker: Optional[str] = Query(None, description="Filter trades by ticker symbol"),
+    start_date: Optional[datetime] = Query(None, description="Filter trades from this date/time onwards (ISO format)"),
+    end_date: Optional[datetime] = Query(None, description="Filter trades up to this date/time (ISO format)")
+):
+    """
+    Stream every matching trade as NDJSON or CSV, ordered by timestamp, then id.
+
+    Rows are read from a server-side cursor and written out as they arrive, so
+    memory use is constant whatever the size of the result.
+    """
+    return StreamingResponse(
+        iter_export(format, ticker=ticker, start_date=start_date, end_date=end_date),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="trades.{format}"'}
+    )
+
+def _cache_metrics() -> List[str]:
+    stats = trade_cache.stats()
+    lines = []
+    for name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        lines.append(f"# TYPE trades_cache_{name}_total counter")
+        lines.append(f"trades_cache_{name}_total {stats[name]}")
+    lines.append("# TYPE trades_cache_entries gauge")
+    lines.append(f"trades_cache_entries {stats['size']}")
+    return lines
+
+metrics.register_collector(_cache_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Prometheus text exposition of request, database, serialization and cache metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/cache")
+def read_cache_metrics():
+    """Hit, miss, eviction and invalidation counters of the GET /trades/ response cache."""
+    return trade_cache.stats()
 
 # Add a root endpoint for basic check
 @app.get("/")
@@ -0,0 +1,191 @@
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from sqlalchemy import event
+
+# Prometheus-style metrics, exposed in the text exposition format at /metrics.
+# Set TRADES_METRICS=false to turn all recording off.
+METRICS_ENABLED = os.getenv("TRADES_METRICS", "true").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    """
+    Cumulative-bucket histogram. observe() is a bisect plus three increments
+    under a lock, since observations come from both the event loop and the
+    threadpool.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labelvalues: str) -> "_Timer":
+        return _Timer(self, labelvalues)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram: Histogram, labelvalues: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if METRICS_ENABLED:
+            self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency, including body parsing and validation",
+    ("method", "route", "status"),
+)
+VALIDATION_TIME = Histogram(
+    "trade_validation_seconds", "Time to parse and validate the trades of a batch request",
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_seconds", "Time to check a connection out of the pool, including waiting for one", ("engine",),
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Database statement execution time", ("statement",),
+)
+QUERY_ROWS = Histogram(
+    "db_query_rows", "Rows returned by SELECT statements", buckets=ROW_BUCKETS,
+)
+SERIALIZATION_TIME = Histogram(
+    "response_serialization_seconds", "Time to serialize response bodies", ("route", "encoder"),
+)
+
+HISTOGRAMS = [REQUEST_LATENCY, VALIDATION_TIME, POOL_CHECKOUT_WAIT, QUERY_LATENCY, QUERY_ROWS, SERIALIZATION_TIME]
+
+# Extra sections of the /metrics output, rendered on each scrape
+_collectors: List[Callable[[], List[str]]] = []
+
+def register_collector(collector: Callable[[], List[str]]):
+    _collectors.append(collector)
+
+def render() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route request latency."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Label by route template rather than raw path to bound cardinality
+            route = scope.get("route")
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                scope["method"], getattr(route, "path", "unmatched"), str(status),
+            )
+
+def timed_pool(pool_class, label: str):
+    """
+    Subclass of `pool_class` that records how long each checkout takes,
+    including time spent waiting for a free connection when the pool is
+    exhausted. Sessions still check connections out lazily, so requests
+    answered from the cache never touch the pool.
+    """
+    class TimedPool(pool_class):
+        def _do_get(self):
+            if not METRICS_ENABLED:
+                return super()._do_get()
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, label)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+def instrument_engine(engine):
+    """Records statement latency and SELECT row counts through SQLAlchemy cursor events."""
+    if not METRICS_ENABLED:
+        return
+
+    # The start time lives on the execution context, which is discarded with
+    # the statement whether it succeeds or fails
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.metrics_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "metrics_query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        QUERY_LATENCY.observe(elapsed, verb)
+        # Server-side (streaming) cursors do not know their row count up front
+        streaming = context is not None and context.execution_options.get("stream_results", False)
+        if verb == "SELECT" and not streaming and cursor.rowcount is not None and cursor.rowcount >= 0:
+            QUERY_ROWS.observe(cursor.rowcount)
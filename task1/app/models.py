@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum
+from sqlalchemy import BigInteger, Column, Integer, String, Float, DateTime, Enum, Index
 from sqlalchemy.sql import func
 from .database import Base
 import enum
@@ -11,10 +11,58 @@ class TradeSide(str, enum.Enum):
 class Trade(Base):
     __tablename__ = "trades"
 
-    id = Column(Integer, primary_key=True, index=True)
-    ticker = Column(String, index=True, nullable=False)
+    # The primary key includes the partition key, as PostgreSQL requires for
+    # partitioned tables; id alone is still unique, from the trades_id_seq sequence
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ticker = Column(String, nullable=False)
     price = Column(Float, nullable=False)
     quantity = Column(Integer, nullable=False)
     side = Column(Enum(TradeSide), nullable=False)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
 
+    # Indexes and partitions are managed by the migrations in migrations/versions
+    # and by app/partitions.py
+    __table_args__ = (
+        # "ticker X between start_date and end_date", in keyset order
+        Index("ix_trades_ticker_timestamp_id", "ticker", "timestamp", "id"),
+        # Time-only queries and keyset pagination without a ticker filter
+        Index("ix_trades_timestamp_id", "timestamp", "id"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+    # Fetch the server-side timestamp with RETURNING at flush time, so the
+    # minute rollup can be updated in the same transaction as the insert
+    __mapper_args__ = {"eager_defaults": True}
+
+class TradeRollup(Base):
+    """Per-ticker, per-minute trade aggregates, updated as each trade is inserted."""
+    __tablename__ = "trade_rollups_1m"
+
+    ticker = Column(String, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)  # start of the minute
+    trade_count = Column(Integer, nullable=False)
+    volume = Column(BigInteger, nullable=False)
+    notional = Column(Float, nullable=False)  # sum(price * quantity)
+    buy_count = Column(Integer, nullable=False)
+    buy_volume = Column(BigInteger, nullable=False)
+    sell_count = Column(Integer, nullable=False)
+    sell_volume = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        # Range queries across all tickers
+        Index("ix_trade_rollups_1m_bucket", "bucket"),
+    )
+
+
+class Tick(Base):
+    """Price ticks streamed to the task2 client, written in batches by task2/tick_writer.py."""
+    __tablename__ = "ticks"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    ticker = Column(String, nullable=False)
+    price = Column(Float, nullable=False)
+    quantity = Column(Float)  # NULL when the feed does not send one
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_ticks_ticker_timestamp", "ticker", "timestamp"),
+    )
@@ -0,0 +1,21 @@
+
+import base64
+import binascii
+from datetime import datetime
+from typing import Tuple
+
+# Cursors are opaque to clients: a URL-safe base64 encoding of the
+# (timestamp, id) key of the last trade on the previous page.
+
+def encode_cursor(timestamp: datetime, trade_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{trade_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodes a cursor produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp_str, trade_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp_str), int(trade_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
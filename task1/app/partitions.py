@@ -0,0 +1,184 @@
+
+"""
+Partition management for the range-partitioned `trades` table.
+
+`trades` is partitioned by RANGE ("timestamp") into one partition per month
+(trades_p2025_06) or per day (trades_p2025_06_05). Partitions must exist
+before rows for their range arrive, so the API creates the upcoming ones at
+startup and then hourly, and old ones can be detached, and archived or
+dropped, from the command line:
+
+    python -m app.partitions list
+    python -m app.partitions maintain --ahead 3 --retain 24 [--drop]
+    python -m app.partitions explain --start 2025-06-01 --end 2025-06-30 [--ticker AAPL]
+
+`explain` prints the partitions that the get_trades query for a date range
+actually scans, to confirm partition pruning.
+"""
+import argparse
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+#   TRADES_PARTITION_INTERVAL   - "month" or "day"; fixed once partitions exist
+#   TRADES_PARTITIONS_AHEAD     - future partitions to keep created
+#   TRADES_PARTITION_RETENTION  - partitions to keep attached before the current one (0 keeps all)
+PARTITION_INTERVAL = os.getenv("TRADES_PARTITION_INTERVAL", "month")
+PARTITIONS_AHEAD = int(os.getenv("TRADES_PARTITIONS_AHEAD", "3"))
+PARTITION_RETENTION = int(os.getenv("TRADES_PARTITION_RETENTION", "0"))
+
+PARENT_TABLE = "trades"
+ARCHIVE_SCHEMA = "trades_archive"
+PARTITION_NAME = re.compile(r"^trades_p(\d{4})_(\d{2})(?:_(\d{2}))?$")
+
+def period_start(ts: datetime, interval: str = PARTITION_INTERVAL) -> datetime:
+    ts = ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    if interval == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_period(start: datetime, interval: str = PARTITION_INTERVAL) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+def previous_period(start: datetime, interval: str = PARTITION_INTERVAL) -> datetime:
+    if interval == "day":
+        return start - timedelta(days=1)
+    return (start - timedelta(days=1)).replace(day=1)
+
+def partition_name(start: datetime, interval: str = PARTITION_INTERVAL) -> str:
+    if interval == "day":
+        return f"{PARENT_TABLE}_p{start:%Y_%m_%d}"
+    return f"{PARENT_TABLE}_p{start:%Y_%m}"
+
+def parse_partition_name(name: str) -> Optional[Tuple[datetime, str]]:
+    """(period start, interval) encoded in a partition name, or None for other tables."""
+    match = PARTITION_NAME.match(name)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    start = datetime(int(year), int(month), int(day or 1), tzinfo=timezone.utc)
+    return start, "day" if day else "month"
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).scalar())
+
+def list_partitions(conn: Connection) -> List[str]:
+    rows = conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(:table)
+        ORDER BY child.relname
+    """), {"table": PARENT_TABLE})
+    return [row[0] for row in rows]
+
+def create_partition(conn: Connection, start: datetime, interval: str = PARTITION_INTERVAL) -> str:
+    name = partition_name(start, interval)
+    end = next_period(start, interval)
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{PARENT_TABLE}" '
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    return name
+
+def ensure_partitions(conn: Connection, start: datetime, end: datetime, interval: str = PARTITION_INTERVAL) -> List[str]:
+    """Creates every missing partition overlapping [start, end]. Returns the names of all of them."""
+    names = []
+    period = period_start(start, interval)
+    while period <= end:
+        names.append(create_partition(conn, period, interval))
+        period = next_period(period, interval)
+    return names
+
+def create_future_partitions(conn: Connection, ahead: int = PARTITIONS_AHEAD, interval: str = PARTITION_INTERVAL) -> List[str]:
+    """Makes sure the current period and the next `ahead` periods have partitions."""
+    start = period_start(datetime.now(timezone.utc), interval)
+    end = start
+    for _ in range(ahead):
+        end = next_period(end, interval)
+    return ensure_partitions(conn, start, end, interval)
+
+def detach_old_partitions(conn: Connection, retain: int = PARTITION_RETENTION, drop: bool = False) -> List[str]:
+    """
+    Detaches partitions that end before the `retain` periods preceding the
+    current one, then moves them to the trades_archive schema (or drops them).
+    Does nothing when `retain` is 0.
+    """
+    if retain <= 0:
+        return []
+    cutoff = period_start(datetime.now(timezone.utc))
+    for _ in range(retain):
+        cutoff = previous_period(cutoff)
+
+    detached = []
+    for name in list_partitions(conn):
+        parsed = parse_partition_name(name)
+        if parsed is None or next_period(*parsed) > cutoff:
+            continue
+        conn.execute(text(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{name}"'))
+        if drop:
+            conn.execute(text(f'DROP TABLE "{name}"'))
+        else:
+            conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{ARCHIVE_SCHEMA}"'))
+            conn.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{ARCHIVE_SCHEMA}"'))
+        detached.append(name)
+    return detached
+
+def maintain(conn: Connection, ahead: int = PARTITIONS_AHEAD, retain: int = PARTITION_RETENTION, drop: bool = False):
+    """Creates upcoming partitions and detaches expired ones. No-op for an unpartitioned table."""
+    if not is_partitioned(conn):
+        return [], []
+    return create_future_partitions(conn, ahead), detach_old_partitions(conn, retain, drop)
+
+def scanned_partitions(plan: str) -> List[str]:
+    """Partition names that appear as scan targets in an EXPLAIN plan."""
+    return sorted(set(re.findall(r" on (trades_p\d{4}_\d{2}(?:_\d{2})?)\b", plan)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List the partitions of the trades table")
+    maintain_parser = commands.add_parser("maintain", help="Create future partitions and detach old ones")
+    maintain_parser.add_argument("--ahead", type=int, default=PARTITIONS_AHEAD)
+    maintain_parser.add_argument("--retain", type=int, default=PARTITION_RETENTION)
+    maintain_parser.add_argument("--drop", action="store_true", help="Drop detached partitions instead of archiving them")
+    explain_parser = commands.add_parser("explain", help="Show which partitions a get_trades date range scans")
+    explain_parser.add_argument("--start", type=datetime.fromisoformat)
+    explain_parser.add_argument("--end", type=datetime.fromisoformat)
+    explain_parser.add_argument("--ticker")
+    args = parser.parse_args()
+
+    from . import crud, diagnostics
+    from .database import SessionLocal, engine
+
+    if args.command == "list":
+        with engine.connect() as conn:
+            for name in list_partitions(conn):
+                print(name)
+    elif args.command == "maintain":
+        with engine.begin() as conn:
+            created, detached = maintain(conn, args.ahead, args.retain, args.drop)
+        print(f"Partitions present for the next {args.ahead} periods: {', '.join(created) or 'none'}")
+        print(f"Detached: {', '.join(detached) or 'none'}")
+    else:
+        with SessionLocal() as db:
+            stmt = crud.trades_select(ticker=args.ticker, start_date=args.start, end_date=args.end)
+            plan = diagnostics.explain(db, stmt)
+            total = len(list_partitions(db.connection()))
+        print(plan)
+        scanned = scanned_partitions(plan)
+        print(f"\nScans {len(scanned)} of {total} partitions: {', '.join(scanned) or 'none'}")
+        if "Subplans Removed" in plan:
+            # Bounds that need a run-time cast (e.g. naive datetimes) are pruned at executor startup
+            print("Further partitions are pruned when the query starts (Subplans Removed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import Select
+
+from . import models
+
+# (ticker, price, quantity, side, timestamp) of a newly inserted trade
+TradeEntry = Tuple[str, float, int, str, datetime]
+
+COUNTERS = ("trade_count", "volume", "notional", "buy_count", "buy_volume", "sell_count", "sell_volume")
+
+def minute_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(second=0, microsecond=0)
+
+def rollup_upsert(entries: Iterable[TradeEntry]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE that adds `entries` to their per-minute
+    rollup rows. Entries are pre-aggregated per (ticker, minute), since one
+    statement cannot update the same row twice, and rows are written in key
+    order so concurrent writers lock them in the same order.
+    """
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for ticker, price, quantity, side, timestamp in entries:
+        row = totals[(ticker, minute_bucket(timestamp))]
+        row["trade_count"] += 1
+        row["volume"] += quantity
+        row["notional"] += price * quantity
+        if side == "buy":
+            row["buy_count"] += 1
+            row["buy_volume"] += quantity
+        else:
+            row["sell_count"] += 1
+            row["sell_volume"] += quantity
+
+    stmt = insert(models.TradeRollup).values([
+        dict(ticker=ticker, bucket=bucket, **row) for (ticker, bucket), row in sorted(totals.items())
+    ])
+    rollup = models.TradeRollup.__table__.c
+    return stmt.on_conflict_do_update(
+        index_elements=[rollup.ticker, rollup.bucket],
+        set_={name: rollup[name] + stmt.excluded[name] for name in COUNTERS},
+    )
+
+def stats_select(
+    ticker: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Select:
+    """
+    Per-ticker totals over the rollup rows in [start_date, end_date]. The range
+    is resolved to whole minutes: a minute is included if it starts at or
+    before end_date and ends after start_date.
+    """
+    rollup = models.TradeRollup
+    volume = func.sum(rollup.volume)
+    notional = func.sum(rollup.notional)
+    stmt = select(
+        rollup.ticker,
+        func.sum(rollup.trade_count).label("trade_count"),
+        volume.label("volume"),
+        notional.label("notional"),
+        (notional / func.nullif(volume, 0)).label("vwap"),
+        func.sum(rollup.buy_count).label("buy_count"),
+        func.sum(rollup.buy_volume).label("buy_volume"),
+        func.sum(rollup.sell_count).label("sell_count"),
+        func.sum(rollup.sell_volume).label("sell_volume"),
+    )
+    if ticker:
+        stmt = stmt.where(rollup.ticker == ticker)
+    if start_date:
+        stmt = stmt.where(rollup.bucket >= minute_bucket(start_date))
+    if end_date:
+        stmt = stmt.where(rollup.bucket <= end_date)
+    return stmt.group_by(rollup.ticker).order_by(rollup.ticker)
@@ -1,7 +1,7 @@
 
 from pydantic import BaseModel, Field, validator
 from datetime import datetime
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 
 class TradeBase(BaseModel):
     ticker: str = Field(..., description="Stock ticker symbol")
@@ -19,3 +19,25 @@ class Trade(TradeBase):
     class Config:
         orm_mode = True
 
+
+class TradeBatchItem(BaseModel):
+    id: int
+    timestamp: datetime
+
+class TradeBatchResult(BaseModel):
+    count: int = Field(..., description="Number of trades recorded")
+    trades: List[TradeBatchItem] = Field(..., description="Assigned id and timestamp of each trade, in input order")
+
+class TradeStats(BaseModel):
+    ticker: str
+    trade_count: int = Field(..., description="Number of trades")
+    volume: int = Field(..., description="Total quantity traded")
+    notional: float = Field(..., description="Total traded value, sum of price * quantity")
+    vwap: Optional[float] = Field(None, description="Volume-weighted average price")
+    buy_count: int
+    buy_volume: int
+    sell_count: int
+    sell_volume: int
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,64 @@
+
+import enum
+import json
+from datetime import datetime, timezone
+from typing import Sequence
+
+from fastapi.encoders import jsonable_encoder
+
+from . import crud, schemas
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+def trades_json(trades) -> bytes:
+    """
+    Default path: validates each ORM trade through schemas.Trade and encodes
+    the list the way FastAPI would for response_model=List[schemas.Trade].
+    """
+    content = jsonable_encoder([
+        schemas.Trade(
+            id=trade.id,
+            ticker=trade.ticker,
+            price=trade.price,
+            quantity=trade.quantity,
+            side=trade.side,
+            timestamp=trade.timestamp
+        )
+        for trade in trades
+    ])
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def _default(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None and value.utcoffset() == timezone.utc.utcoffset(None):
+            return value.replace(tzinfo=None).isoformat() + "Z"
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+def rows_json(rows: Sequence[tuple]) -> bytes:
+    """
+    Fast path: encodes plain crud.TRADE_COLUMNS tuples straight to JSON with
+    the same values as trades_json (keys in schemas.Trade field order),
+    without building or re-validating Pydantic models for data read from our
+    own database. orjson spells some floats differently from the json module
+    (1e-7 vs 1e-07), so the bytes, and the ETags, can differ.
+    """
+    return _dumps([
+        {"ticker": ticker, "price": price, "quantity": quantity, "side": side, "id": trade_id, "timestamp": timestamp}
+        for trade_id, ticker, price, quantity, side, timestamp in rows
+    ])
+
+def rows_columnar(rows: Sequence[tuple]) -> bytes:
+    """Encodes rows as one array per column: {"id": [...], "ticker": [...], ...}."""
+    columns = list(zip(*rows)) if rows else [()] * len(crud.TRADE_COLUMNS)
+    return _dumps({name: list(values) for name, values in zip(crud.TRADE_COLUMNS, columns)})
@@ -0,0 +1,78 @@
+
+"""
+Benchmark: rows/sec of the single-trade insert path vs. the batched path.
+
+Runs against the database configured by DATABASE_URL (see app/database.py),
+which must be migrated first (`alembic upgrade head`).
+Both paths write real rows into the `trades` table, tagged with the ticker
+BENCH so they are easy to clean up afterwards:
+
+    python bench_batch_insert.py --rows 5000
+    python bench_batch_insert.py --rows 50000 --chunk-size 2000 --cleanup
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import delete
+
+from app import crud, models, schemas
+from app.database import SessionLocal
+
+BENCH_TICKER = "BENCH"
+
+def make_trades(count):
+    return [
+        schemas.TradeCreate(
+            ticker=BENCH_TICKER,
+            price=round(random.uniform(10, 500), 2),
+            quantity=random.randint(1, 1000),
+            side=random.choice(["buy", "sell"]),
+        )
+        for _ in range(count)
+    ]
+
+def bench_single(trades):
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        for trade in trades:
+            crud.create_trade(db, trade)
+        return time.perf_counter() - start
+    finally:
+        db.close()
+
+def bench_batch(trades, chunk_size):
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        for offset in range(0, len(trades), chunk_size):
+            crud.create_trades_batch(db, trades[offset:offset + chunk_size])
+        return time.perf_counter() - start
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="Rows to insert per path")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per batched INSERT")
+    parser.add_argument("--cleanup", action="store_true", help="Delete the benchmark rows afterwards")
+    args = parser.parse_args()
+
+    trades = make_trades(args.rows)
+
+    single = bench_single(trades)
+    batch = bench_batch(trades, args.chunk_size)
+
+    print(f"rows per path:  {args.rows}")
+    print(f"single-trade:   {single:8.3f}s  {args.rows / single:12,.0f} rows/sec")
+    print(f"batched ({args.chunk_size}): {batch:8.3f}s  {args.rows / batch:12,.0f} rows/sec")
+    print(f"speedup:        {single / batch:8.1f}x")
+
+    if args.cleanup:
+        with SessionLocal() as db:
+            db.execute(delete(models.Trade).where(models.Trade.ticker == BENCH_TICKER))
+            db.commit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+
+"""
+Benchmark: page-N latency of OFFSET paging vs. keyset (cursor) paging.
+
+Seeds the `trades` table of DATABASE_URL (migrated with `alembic upgrade head`)
+up to --rows rows (using generate_series, so a few million rows take seconds),
+then times fetching page N both ways:
+
+    python bench_pagination.py --rows 2000000 --pages 1 10 100 1000 10000
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, text
+
+from app import crud, models, partitions
+from app.database import SessionLocal
+
+SEED_SQL = text("""
+    INSERT INTO trades (ticker, price, quantity, side, timestamp)
+    SELECT
+        (ARRAY['AAPL', 'GOOGL', 'MSFT', 'AMZN'])[1 + (g % 4)],
+        round((10 + random() * 490)::numeric, 2),
+        1 + (random() * 999)::int,
+        (CASE WHEN g % 2 = 0 THEN 'BUY' ELSE 'SELL' END)::tradeside,
+        now() - make_interval(secs => g)
+    FROM generate_series(1, :count) AS g
+""")
+
+def seed(db, rows):
+    existing = db.scalar(select(func.count()).select_from(models.Trade))
+    if existing < rows:
+        print(f"Seeding {rows - existing:,} trades...")
+        # One trade per second going back from now; make sure partitions cover them
+        now = datetime.now(timezone.utc)
+        if partitions.is_partitioned(db.connection()):
+            partitions.ensure_partitions(db.connection(), now - timedelta(seconds=rows - existing), now)
+        db.execute(SEED_SQL, {"count": rows - existing})
+        db.commit()
+        db.execute(text("ANALYZE trades"))
+    return max(existing, rows)
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Minimum rows in the trades table")
+    parser.add_argument("--limit", type=int, default=100, help="Page size")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000, 5000], help="Page numbers to time")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per page (median is reported)")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        total = seed(db, args.rows)
+        print(f"{total:,} trades, page size {args.limit}\n")
+        print(f"{'page':>8} {'offset ms':>12} {'cursor ms':>12}")
+        for page in args.pages:
+            skip = (page - 1) * args.limit
+            if skip >= total:
+                break
+            # The cursor for page N is the key of the last row of page N-1;
+            # look it up once, outside the timed section.
+            cursor = None
+            if skip:
+                last = db.execute(
+                    select(models.Trade.timestamp, models.Trade.id)
+                    .order_by(models.Trade.timestamp, models.Trade.id)
+                    .offset(skip - 1).limit(1)
+                ).one()
+                cursor = (last.timestamp, last.id)
+
+            offset_ms = time_call(lambda: crud.get_trades(db, skip=skip, limit=args.limit), args.repeat)
+            cursor_ms = time_call(lambda: crud.get_trades(db, limit=args.limit, cursor=cursor), args.repeat)
+            db.expunge_all()
+            print(f"{page:>8} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+
+"""
+Benchmark: bytes/sec of the GET /trades/ response paths for large pages.
+
+Compares, for pages of --limit trades read from DATABASE_URL:
+  validated - ORM entities -> schemas.Trade -> jsonable_encoder -> json (default)
+  fast      - plain column tuples -> orjson (?fast=true)
+  columnar  - plain column tuples -> one array per field (?format=columnar)
+
+Each path is timed end to end (query + encoding) and encoding only:
+
+    python bench_serialization.py --limit 1000 --repeat 50
+"""
+import argparse
+import time
+
+from app import crud
+from app.database import SessionLocal
+from app.serialization import orjson, rows_columnar, rows_json, trades_json
+
+PATHS = [
+    ("validated", False, trades_json),
+    ("fast", True, rows_json),
+    ("columnar", True, rows_columnar),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=1000, help="Trades per page")
+    parser.add_argument("--repeat", type=int, default=50, help="Pages per path")
+    args = parser.parse_args()
+
+    print(f"page size {args.limit}, {args.repeat} pages per path, orjson {'available' if orjson else 'missing'}\n")
+    print(f"{'path':<10} {'bytes':>9} {'end-to-end MB/s':>16} {'encode MB/s':>12} {'encode ms/page':>15}")
+    with SessionLocal() as db:
+        for name, as_rows, encode in PATHS:
+            size = 0
+            total_time = encode_time = 0.0
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                trades = crud.get_trades(db, limit=args.limit, as_rows=as_rows)
+                encode_start = time.perf_counter()
+                body = encode(trades)
+                end = time.perf_counter()
+                total_time += end - start
+                encode_time += end - encode_start
+                size = len(body)
+                db.expunge_all()
+            megabytes = size * args.repeat / 1e6
+            print(
+                f"{name:<10} {size:>9} {megabytes / total_time:>16.1f} {megabytes / encode_time:>12.1f}"
+                f" {encode_time / args.repeat * 1000:>15.2f}"
+            )
+
+if __name__ == "__main__":
+    main()
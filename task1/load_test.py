@@ -0,0 +1,121 @@
+
+"""
+Load test: p50/p99 latency and requests/sec of the sync and async DB modes.
+
+For each mode, starts `uvicorn app.main:app` with DB_ASYNC set accordingly,
+drives it with --concurrency concurrent clients issuing a mix of
+GET /trades/ and POST /trades/ requests, then stops the server:
+
+    python load_test.py --requests 20000 --concurrency 256
+    python load_test.py --modes async --write-ratio 0.5 --pool-size 20
+
+Requires httpx. Runs against DATABASE_URL, which must be migrated first
+(`alembic upgrade head`). POSTed trades use the ticker LOADTEST.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+TICKERS = ["AAPL", "GOOGL", "MSFT", "AMZN"]
+
+def start_server(mode, port, pool_size, max_overflow):
+    env = dict(
+        os.environ,
+        DB_ASYNC="true" if mode == "async" else "false",
+        DB_POOL_SIZE=str(pool_size),
+        DB_MAX_OVERFLOW=str(max_overflow),
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+async def wait_until_ready(client, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+async def run_load(client, total, concurrency, write_ratio):
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            if random.random() < write_ratio:
+                request = client.post("/trades/", json={
+                    "ticker": "LOADTEST",
+                    "price": round(random.uniform(10, 500), 2),
+                    "quantity": random.randint(1, 1000),
+                    "side": random.choice(["buy", "sell"]),
+                })
+            else:
+                request = client.get("/trades/", params={"ticker": random.choice(TICKERS), "limit": 100})
+            start = time.perf_counter()
+            try:
+                response = await request
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+async def bench_mode(mode, args):
+    server = start_server(mode, args.port, args.pool_size, args.max_overflow)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+            await wait_until_ready(client)
+            await run_load(client, min(args.requests, 500), args.concurrency, args.write_ratio)  # warm-up
+            latencies, errors, elapsed = await run_load(client, args.requests, args.concurrency, args.write_ratio)
+    finally:
+        server.terminate()
+        server.wait()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "mode": mode,
+        "rps": len(latencies) / elapsed,
+        "p50": quantiles[49] * 1000,
+        "p99": quantiles[98] * 1000,
+        "errors": errors,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--requests", type=int, default=10000, help="Requests per mode")
+    parser.add_argument("--concurrency", type=int, default=200, help="Concurrent clients")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Fraction of requests that are POSTs")
+    parser.add_argument("--pool-size", type=int, default=10, help="DB_POOL_SIZE for the server")
+    parser.add_argument("--max-overflow", type=int, default=20, help="DB_MAX_OVERFLOW for the server")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    results = [asyncio.run(bench_mode(mode, args)) for mode in args.modes]
+
+    print(f"{args.requests} requests per mode, concurrency {args.concurrency}, write ratio {args.write_ratio}\n")
+    print(f"{'mode':<6} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['rps']:>10.0f} {r['p50']:>10.2f} {r['p99']:>10.2f} {r['errors']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Create the trades table
+
+Baseline schema, as previously created by `create_all` at import time.
+Databases that already have the table are adopted as-is.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-06-05
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table("trades"):
+        return
+    op.create_table(
+        "trades",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ticker", sa.String(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("side", sa.Enum("BUY", "SELL", name="tradeside"), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_trades_id", "trades", ["id"])
+    op.create_index("ix_trades_ticker", "trades", ["ticker"])
+
+def downgrade():
+    op.drop_table("trades")
+    sa.Enum(name="tradeside").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,39 @@
+"""Composite indexes for ticker + time-range queries
+
+Adds (ticker, timestamp, id) for the common "ticker X between two dates"
+query and (timestamp, id) for time-only queries; both also match the
+(timestamp, id) order used by keyset pagination. The single-column ticker
+index is a prefix of the composite one and the id index duplicates the
+primary key, so both are dropped. Indexes are built CONCURRENTLY so the
+migration does not block writes on a large table.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-06-05
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_trades_ticker_timestamp_id", "trades", ["ticker", "timestamp", "id"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_trades_timestamp_id", "trades", ["timestamp", "id"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.drop_index("ix_trades_ticker", table_name="trades", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_trades_id", table_name="trades", postgresql_concurrently=True, if_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_trades_id", "trades", ["id"], postgresql_concurrently=True, if_not_exists=True)
+        op.create_index("ix_trades_ticker", "trades", ["ticker"], postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index("ix_trades_timestamp_id", table_name="trades", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_trades_ticker_timestamp_id", table_name="trades", postgresql_concurrently=True, if_exists=True)
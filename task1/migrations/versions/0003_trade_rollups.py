@@ -0,0 +1,51 @@
+"""Per-ticker, per-minute trade rollups
+
+Creates trade_rollups_1m, which crud keeps up to date as trades are inserted
+and GET /trades/stats reads from, and backfills it from existing trades.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-06-05
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "trade_rollups_1m",
+        sa.Column("ticker", sa.String(), primary_key=True),
+        sa.Column("bucket", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("trade_count", sa.Integer(), nullable=False),
+        sa.Column("volume", sa.BigInteger(), nullable=False),
+        sa.Column("notional", sa.Float(), nullable=False),
+        sa.Column("buy_count", sa.Integer(), nullable=False),
+        sa.Column("buy_volume", sa.BigInteger(), nullable=False),
+        sa.Column("sell_count", sa.Integer(), nullable=False),
+        sa.Column("sell_volume", sa.BigInteger(), nullable=False),
+    )
+    op.create_index("ix_trade_rollups_1m_bucket", "trade_rollups_1m", ["bucket"])
+    op.execute("""
+        INSERT INTO trade_rollups_1m
+            (ticker, bucket, trade_count, volume, notional, buy_count, buy_volume, sell_count, sell_volume)
+        SELECT
+            ticker,
+            date_trunc('minute', timestamp),
+            count(*),
+            sum(quantity),
+            sum(price * quantity),
+            count(*) FILTER (WHERE side = 'BUY'),
+            coalesce(sum(quantity) FILTER (WHERE side = 'BUY'), 0),
+            count(*) FILTER (WHERE side = 'SELL'),
+            coalesce(sum(quantity) FILTER (WHERE side = 'SELL'), 0)
+        FROM trades
+        WHERE timestamp IS NOT NULL
+        GROUP BY 1, 2
+    """)
+
+def downgrade():
+    op.drop_table("trade_rollups_1m")
@@ -0,0 +1,81 @@
+"""Partition trades by timestamp
+
+Rebuilds trades as a table partitioned by RANGE ("timestamp"), with one
+partition per TRADES_PARTITION_INTERVAL (month by default) from the oldest
+trade up to TRADES_PARTITIONS_AHEAD periods from now, named as app/partitions.py
+expects. PostgreSQL requires the partition key in the primary key, so it
+becomes (id, timestamp) and timestamp becomes NOT NULL; trades without a
+timestamp get the migration time. Existing rows are copied in one statement,
+so writes should be stopped while this runs.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-06-05
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+
+from app import partitions
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+COLUMNS = "id, ticker, price, quantity, side, timestamp"
+
+def _create_indexes():
+    op.create_index("ix_trades_ticker_timestamp_id", "trades", ["ticker", "timestamp", "id"])
+    op.create_index("ix_trades_timestamp_id", "trades", ["timestamp", "id"])
+
+def _rename_old_table(new_name: str):
+    op.rename_table("trades", new_name)
+    op.execute(f"ALTER INDEX trades_pkey RENAME TO {new_name}_pkey")
+    op.execute(f"ALTER INDEX ix_trades_ticker_timestamp_id RENAME TO ix_{new_name}_ticker_timestamp_id")
+    op.execute(f"ALTER INDEX ix_trades_timestamp_id RENAME TO ix_{new_name}_timestamp_id")
+
+def upgrade():
+    _rename_old_table("trades_unpartitioned")
+    op.execute("""
+        CREATE TABLE trades (
+            id integer NOT NULL DEFAULT nextval('trades_id_seq'),
+            ticker varchar NOT NULL,
+            price double precision NOT NULL,
+            quantity integer NOT NULL,
+            side tradeside NOT NULL,
+            timestamp timestamp with time zone NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    _create_indexes()
+
+    conn = op.get_bind()
+    oldest = conn.exec_driver_sql("SELECT min(timestamp) FROM trades_unpartitioned").scalar()
+    partitions.ensure_partitions(conn, oldest or datetime.now(timezone.utc), datetime.now(timezone.utc))
+    partitions.create_future_partitions(conn)
+
+    op.execute(f"""
+        INSERT INTO trades ({COLUMNS})
+        SELECT id, ticker, price, quantity, side, coalesce(timestamp, now())
+        FROM trades_unpartitioned
+    """)
+    op.execute("ALTER SEQUENCE trades_id_seq OWNED BY trades.id")
+    op.drop_table("trades_unpartitioned")
+
+def downgrade():
+    _rename_old_table("trades_partitioned")
+    op.execute("""
+        CREATE TABLE trades (
+            id integer NOT NULL DEFAULT nextval('trades_id_seq') PRIMARY KEY,
+            ticker varchar NOT NULL,
+            price double precision NOT NULL,
+            quantity integer NOT NULL,
+            side tradeside NOT NULL,
+            timestamp timestamp with time zone DEFAULT now()
+        )
+    """)
+    _create_indexes()
+    op.execute(f"INSERT INTO trades ({COLUMNS}) SELECT {COLUMNS} FROM trades_partitioned")
+    op.execute("ALTER SEQUENCE trades_id_seq OWNED BY trades.id")
+    op.drop_table("trades_partitioned")
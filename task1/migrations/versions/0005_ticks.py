@@ -0,0 +1,30 @@
+"""Streamed price ticks
+
+Creates ticks, the table task2/tick_writer.py copies the client's price
+stream into.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "ticks",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("ticker", sa.String(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("quantity", sa.Float()),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_ticks_ticker_timestamp", "ticks", ["ticker", "timestamp"])
+
+def downgrade():
+    op.drop_table("ticks")
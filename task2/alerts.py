@@ -0,0 +1,306 @@
+
+import importlib
+import json
+import logging
+import os
+import sys
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from price_window import PriceWindow
+
+# Path of a JSON file with "rules" and "sinks" (see DEFAULT_CONFIG for the format)
+ALERT_CONFIG = os.getenv("ALERT_CONFIG")
+
+# The client's original rule: a rise of more than 2% within one minute.
+# Rules without "tickers" apply to every ticker.
+DEFAULT_CONFIG = {
+    "rules": [
+        {"name": "rise_2pct_1m", "type": "pct_rise", "threshold": 2.0, "window": 60, "cooldown": 60},
+    ],
+    "sinks": ["print"],
+}
+
+class Alert(NamedTuple):
+    rule: str
+    ticker: str
+    timestamp: float  # epoch seconds of the tick that triggered it
+    price: float
+    message: str
+
+class Rule(ABC):
+    """
+    Base class of alert rules. A rule looks at the PriceWindow of one ticker
+    after each tick and returns an alert message, or None.
+
+    Once a rule fires for a ticker it stays quiet for `cooldown` seconds of
+    tick time and, with `rearm`, until its condition has been false at least
+    once, so one sustained move produces one alert.
+    """
+
+    def __init__(self, name: str, window: float = 60.0, tickers: Optional[Iterable[str]] = None,
+                 cooldown: float = 60.0, rearm: bool = True):
+        self.name = name
+        self.window = float(window)
+        self.tickers = list(tickers or [])
+        self.cooldown = float(cooldown)
+        self.rearm = rearm
+
+    @abstractmethod
+    def evaluate(self, ticker: str, window: PriceWindow, price: float) -> Optional[str]:
+        ...
+
+class PercentRise(Rule):
+    """Price more than `threshold` percent above the earliest (or, with reference="extreme", the lowest) price in the window."""
+
+    def __init__(self, name, threshold, reference="earliest", **options):
+        super().__init__(name, **options)
+        self.threshold = threshold
+        self.reference = reference
+        self.factor = 1 + threshold / 100
+
+    def evaluate(self, ticker, window, price):
+        base = window.min if self.reference == "extreme" else window.earliest
+        if price > base * self.factor:
+            return (f"{ticker} price increased by {(price - base) / base * 100:.2f}% "
+                    f"(from {base} to {price}) within the last {self.window} seconds.")
+        return None
+
+class PercentFall(Rule):
+    """Price more than `threshold` percent below the earliest (or, with reference="extreme", the highest) price in the window."""
+
+    def __init__(self, name, threshold, reference="earliest", **options):
+        super().__init__(name, **options)
+        self.threshold = threshold
+        self.reference = reference
+        self.factor = 1 - threshold / 100
+
+    def evaluate(self, ticker, window, price):
+        base = window.max if self.reference == "extreme" else window.earliest
+        if price < base * self.factor:
+            return (f"{ticker} price fell by {(base - price) / base * 100:.2f}% "
+                    f"(from {base} to {price}) within the last {self.window} seconds.")
+        return None
+
+class AbsoluteMove(Rule):
+    """Price at least `amount` away from the earliest price in the window, in either direction."""
+
+    def __init__(self, name, amount, **options):
+        super().__init__(name, **options)
+        self.amount = amount
+
+    def evaluate(self, ticker, window, price):
+        move = price - window.earliest
+        if abs(move) >= self.amount:
+            return (f"{ticker} price moved by {move:+.2f} "
+                    f"(from {window.earliest} to {price}) within the last {self.window} seconds.")
+        return None
+
+class VolatilityBand(Rule):
+    """Price more than `stddevs` standard deviations from the window mean, once the window has `min_ticks` ticks."""
+
+    def __init__(self, name, stddevs=3.0, min_ticks=20, **options):
+        super().__init__(name, **options)
+        self.stddevs = stddevs
+        self.min_ticks = min_ticks
+
+    def evaluate(self, ticker, window, price):
+        if len(window) < self.min_ticks:
+            return None
+        mean, stddev = window.mean, window.stddev
+        if stddev > 0 and abs(price - mean) > self.stddevs * stddev:
+            return (f"{ticker} price {price} is {(price - mean) / stddev:+.1f} standard deviations "
+                    f"from its {self.window} second mean of {mean:.2f}.")
+        return None
+
+class VwapDeviation(Rule):
+    """Price more than `threshold` percent away from the window VWAP."""
+
+    def __init__(self, name, threshold, **options):
+        super().__init__(name, **options)
+        self.threshold = threshold
+
+    def evaluate(self, ticker, window, price):
+        vwap = window.vwap
+        deviation = (price - vwap) / vwap * 100
+        if abs(deviation) > self.threshold:
+            return (f"{ticker} price {price} is {deviation:+.2f}% away from its "
+                    f"{self.window} second VWAP of {vwap:.2f}.")
+        return None
+
+RULE_TYPES = {
+    "pct_rise": PercentRise,
+    "pct_fall": PercentFall,
+    "abs_move": AbsoluteMove,
+    "volatility": VolatilityBand,
+    "vwap_deviation": VwapDeviation,
+}
+
+def rule_from_config(config: dict) -> Rule:
+    options = dict(config)
+    kind = options.pop("type")
+    if kind not in RULE_TYPES:
+        raise ValueError(f"Unknown rule type {kind!r}, expected one of {', '.join(RULE_TYPES)}")
+    options.setdefault("name", kind)
+    return RULE_TYPES[kind](**options)
+
+# Sinks are callables that take an Alert
+
+def print_sink(alert: Alert):
+    print(f"*** ALERT ***: {alert.message}")
+
+class JsonLinesSink:
+    """Appends each alert to a file as one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a", buffering=1)
+
+    def __call__(self, alert: Alert):
+        self.file.write(json.dumps(alert._asdict()) + "\n")
+
+class LoggingSink:
+    def __init__(self, name: str = "alerts", level: str = "WARNING"):
+        self.logger = logging.getLogger(name)
+        self.level = logging.getLevelName(level)
+
+    def __call__(self, alert: Alert):
+        self.logger.log(self.level, "[%s] %s", alert.rule, alert.message)
+
+def sink_from_config(config) -> Callable[[Alert], None]:
+    """
+    A sink from its config: "print", {"type": "jsonl", "path": ...},
+    {"type": "log", "name": ..., "level": ...}, or "module:callable" for a
+    custom sink.
+    """
+    if isinstance(config, str):
+        config = {"type": config}
+    options = dict(config)
+    kind = options.pop("type")
+    if kind == "print":
+        return print_sink
+    if kind == "jsonl":
+        return JsonLinesSink(**options)
+    if kind == "log":
+        return LoggingSink(**options)
+    if ":" in kind:
+        module, attribute = kind.split(":", 1)
+        return getattr(importlib.import_module(module), attribute)
+    raise ValueError(f"Unknown sink {kind!r}")
+
+class _RuleState:
+    __slots__ = ("rule", "window", "armed", "last_fired")
+
+    def __init__(self, rule: Rule, window: PriceWindow):
+        self.rule = rule
+        self.window = window
+        self.armed = True
+        self.last_fired = float("-inf")
+
+class AlertEngine:
+    """
+    Evaluates rules against each tick and sends the alerts to the sinks.
+
+    Rules are indexed by ticker. The first tick of a ticker binds that
+    ticker's rules and the global ones to its PriceWindows (one per distinct
+    window length) and to their cooldown state, so each later tick only
+    touches the rules that apply to its ticker.
+    """
+
+    def __init__(self, rules: Iterable[Rule], sinks: Optional[Iterable[Callable[[Alert], None]]] = None):
+        self.global_rules: List[Rule] = []
+        self.rules_by_ticker: Dict[str, List[Rule]] = defaultdict(list)
+        for rule in rules:
+            if rule.tickers:
+                for ticker in rule.tickers:
+                    self.rules_by_ticker[ticker].append(rule)
+            else:
+                self.global_rules.append(rule)
+        self.sinks = list(sinks) if sinks is not None else [print_sink]
+        # ticker -> ([PriceWindow], [_RuleState])
+        self._tickers = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "AlertEngine":
+        rules = [rule_from_config(rule) for rule in config.get("rules", [])]
+        sinks = [sink_from_config(sink) for sink in config.get("sinks", ["print"])]
+        return cls(rules, sinks)
+
+    def add_sink(self, sink: Callable[[Alert], None]):
+        self.sinks.append(sink)
+
+    def windows(self, ticker: str) -> Dict[float, PriceWindow]:
+        """The PriceWindows of a ticker by window length, for inspection."""
+        windows, _ = self._tickers.get(ticker, ([], []))
+        return {window.window: window for window in windows}
+
+    def tickers(self) -> List[str]:
+        """Tickers seen so far."""
+        return list(self._tickers)
+
+    def ticker_state(self, ticker: str) -> Tuple[List[PriceWindow], List["_RuleState"]]:
+        """A ticker's PriceWindows and rule states, bound first if the ticker is new; for snapshots (see state_store.py)."""
+        return self._tickers.get(ticker) or self._bind(ticker)
+
+    def _bind(self, ticker: str):
+        windows = {}
+        states = []
+        for rule in self.rules_by_ticker.get(ticker, []) + self.global_rules:
+            window = windows.get(rule.window)
+            if window is None:
+                window = windows[rule.window] = PriceWindow(rule.window)
+            states.append(_RuleState(rule, window))
+        bound = self._tickers[ticker] = (list(windows.values()), states)
+        return bound
+
+    def on_tick(self, ticker: str, timestamp: float, price: float, quantity: float = 1.0,
+                emit: bool = True) -> List[Alert]:
+        """
+        Records a tick, evaluates the ticker's rules, and returns the alerts
+        that fired. With emit=False (when replaying ticks whose alerts were
+        already sent) the rules' cooldowns are updated but the sinks are not called.
+        """
+        return self.evaluate(ticker, self.update(ticker, timestamp, price, quantity), timestamp, price, emit)
+
+    def update(self, ticker: str, timestamp: float, price: float, quantity: float = 1.0) -> List["_RuleState"]:
+        """The first half of on_tick(): adds the tick to the ticker's windows and returns its rule states."""
+        bound = self._tickers.get(ticker)
+        if bound is None:
+            bound = self._bind(ticker)
+        windows, states = bound
+        for window in windows:
+            window.add(timestamp, price, quantity)
+        return states
+
+    def evaluate(self, ticker: str, states: List["_RuleState"], timestamp: float, price: float,
+                 emit: bool = True) -> List[Alert]:
+        """The second half of on_tick(): evaluates the rule states returned by update()."""
+        alerts = []
+        for state in states:
+            message = state.rule.evaluate(ticker, state.window, price)
+            if message is None:
+                state.armed = True
+                continue
+            if (state.rule.rearm and not state.armed) or timestamp - state.last_fired < state.rule.cooldown:
+                continue
+            state.armed = False
+            state.last_fired = timestamp
+            alert = Alert(state.rule.name, ticker, timestamp, price, message)
+            if emit:
+                for sink in self.sinks:
+                    sink(alert)
+            alerts.append(alert)
+        return alerts
+
+def load_config(path: Optional[str] = ALERT_CONFIG) -> dict:
+    if not path:
+        return DEFAULT_CONFIG
+    with open(path) as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    # Validate a config file: python alerts.py rules.json
+    engine = AlertEngine.from_config(load_config(sys.argv[1] if len(sys.argv) > 1 else ALERT_CONFIG))
+    print(f"{len(engine.global_rules)} global rules, "
+          f"{sum(len(rules) for rules in engine.rules_by_ticker.values())} per-ticker rules "
+          f"over {len(engine.rules_by_ticker)} tickers")
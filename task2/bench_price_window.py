@@ -0,0 +1,88 @@
+
+"""
+Benchmark: per-tick cost of the spike check with PriceWindow against the old
+linear scan over a deque(maxlen=100).
+
+Replays --ticks synthetic ticks spread over --tickers tickers at --rate ticks
+per second overall, and reports ticks/sec and alert counts for both. At more
+than 100 ticks per ticker per window, the old deque drops ticks that are
+still inside the window, so its alert count differs.
+
+    python bench_price_window.py --ticks 2000000 --tickers 5000 --rate 200000
+"""
+import argparse
+import random
+import time
+from collections import deque
+
+from price_window import PriceWindow
+
+def make_ticks(count, tickers, rate, seed):
+    rng = random.Random(seed)
+    names = [f"T{i:05d}" for i in range(tickers)]
+    prices = [rng.uniform(10, 500) for _ in range(tickers)]
+    ticks = []
+    for i in range(count):
+        index = rng.randrange(tickers)
+        prices[index] *= 1 + rng.uniform(-0.005, 0.005)
+        ticks.append((names[index], i / rate, prices[index]))
+    return ticks
+
+def run_window(ticks, window, threshold):
+    histories = {}
+    alerts = 0
+    factor = 1 + threshold / 100
+    start = time.perf_counter()
+    for ticker, timestamp, price in ticks:
+        history = histories.get(ticker)
+        if history is None:
+            history = histories[ticker] = PriceWindow(window)
+        history.add(timestamp, price)
+        if price > history.earliest * factor:
+            alerts += 1
+    return time.perf_counter() - start, alerts
+
+def run_linear_scan(ticks, window, threshold):
+    # The previous check_price_increase, minus the print
+    histories = {}
+    alerts = 0
+    factor = 1 + threshold / 100
+    start = time.perf_counter()
+    for ticker, timestamp, price in ticks:
+        history = histories.get(ticker)
+        if history is None:
+            history = histories[ticker] = deque(maxlen=100)
+        history.append((timestamp, price))
+        window_start = timestamp - window
+        earliest = None
+        for ts, old_price in history:
+            if ts >= window_start:
+                if earliest is None:
+                    earliest = old_price
+                if price > earliest * factor:
+                    alerts += 1
+                    break
+    return time.perf_counter() - start, alerts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=2_000_000)
+    parser.add_argument("--tickers", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=200_000, help="Ticks per second across all tickers")
+    parser.add_argument("--window", type=float, default=60.0, help="Window in seconds")
+    parser.add_argument("--threshold", type=float, default=2.0, help="Alert threshold in percent")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Generating {args.ticks:,} ticks over {args.tickers:,} tickers...")
+    ticks = make_ticks(args.ticks, args.tickers, args.rate, args.seed)
+    per_ticker = args.rate / args.tickers * args.window
+    print(f"About {per_ticker:,.0f} ticks per ticker per {args.window:g}s window\n")
+
+    print(f"{'check':<14} {'seconds':>8} {'ticks/sec':>12} {'alerts':>10}")
+    for name, run in (("PriceWindow", run_window), ("linear scan", run_linear_scan)):
+        elapsed, alerts = run(ticks, args.window, args.threshold)
+        print(f"{name:<14} {elapsed:>8.2f} {args.ticks / elapsed:>12,.0f} {alerts:>10,}")
+
+if __name__ == "__main__":
+    main()
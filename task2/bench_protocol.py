@@ -0,0 +1,128 @@
+
+"""
+Benchmark: JSON text frames against batched binary frames (protocol.py).
+
+1. Codec: encode and decode cost per tick for one JSON object per frame
+   (the original format, including datetime.fromisoformat), a JSON array per
+   frame, and binary batches.
+2. Live: starts mock_server.py as a subprocess sending as fast as it can,
+   receives for --seconds in each format, and reports ticks/sec, frames/sec
+   and client CPU time per tick (decoding only, no alert rules).
+
+    python bench_protocol.py --ticks 200000 --batch-size 500 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import websockets
+
+import protocol
+
+TICKERS = ["AAPL", "GOOGL", "MSFT", "AMZN"]
+
+def make_ticks(count):
+    now = time.time_ns()
+    return [(random.choice(TICKERS), round(random.uniform(100, 3000), 2), now + i * 1000) for i in range(count)]
+
+def json_object(tick):
+    ticker, price, timestamp_ns = tick
+    return {"ticker": ticker, "price": price, "timestamp": datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()}
+
+def decode_json(message):
+    data = json.loads(message)
+    for update in data if isinstance(data, list) else [data]:
+        datetime.fromisoformat(update["timestamp"]).timestamp()
+
+def decode_binary(message):
+    for _ in protocol.decode_batch(message):
+        pass
+
+def bench_codec(ticks, batch_size):
+    batches = [ticks[i:i + batch_size] for i in range(0, len(ticks), batch_size)]
+    formats = [
+        ("JSON, 1/frame", lambda: [json.dumps(json_object(tick)) for tick in ticks], decode_json),
+        (f"JSON, {batch_size}/frame", lambda: [json.dumps([json_object(t) for t in batch]) for batch in batches], decode_json),
+        (f"binary, {batch_size}/frame", lambda: [protocol.encode_batch(batch) for batch in batches], decode_binary),
+    ]
+    print(f"Codec, {len(ticks):,} ticks")
+    print(f"{'format':<20} {'encode us/tick':>15} {'decode us/tick':>15} {'bytes/tick':>11}")
+    for name, encode, decode in formats:
+        start = time.perf_counter()
+        frames = encode()
+        encode_us = (time.perf_counter() - start) / len(ticks) * 1e6
+        start = time.perf_counter()
+        for frame in frames:
+            decode(frame)
+        decode_us = (time.perf_counter() - start) / len(ticks) * 1e6
+        size = sum(len(frame) for frame in frames) / len(ticks)
+        print(f"{name:<20} {encode_us:>15.2f} {decode_us:>15.2f} {size:>11.1f}")
+
+async def receive_for(uri, subprotocols, seconds):
+    ticks = frames = 0
+    async with websockets.connect(uri, subprotocols=subprotocols, max_size=None) as websocket:
+        binary = websocket.subprotocol == protocol.BINARY_SUBPROTOCOL
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            message = await websocket.recv()
+            frames += 1
+            if binary:
+                for _ in protocol.decode_batch(message):
+                    ticks += 1
+            else:
+                data = json.loads(message)
+                for update in data if isinstance(data, list) else [data]:
+                    datetime.fromisoformat(update["timestamp"]).timestamp()
+                    ticks += 1
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+    return ticks, frames, elapsed, cpu
+
+def bench_live(args):
+    print(f"\nLive, {args.seconds:g}s per format")
+    print(f"{'format':<20} {'ticks/sec':>12} {'frames/sec':>12} {'client CPU us/tick':>19}")
+    modes = [("JSON, 1/frame", 1, None), (f"binary, {args.batch_size}/frame", args.batch_size, [protocol.BINARY_SUBPROTOCOL])]
+    server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py")
+    for name, batch_size, subprotocols in modes:
+        server = subprocess.Popen(
+            [sys.executable, server_script, "--host", "127.0.0.1", "--port", str(args.port),
+             "--batch-size", str(batch_size), "--max-frame-ticks", str(batch_size), "--interval", "0"],
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            uri = f"ws://127.0.0.1:{args.port}"
+            for _ in range(50):
+                try:
+                    ticks, frames, elapsed, cpu = asyncio.run(receive_for(uri, subprotocols, args.seconds))
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            else:
+                sys.exit("mock_server.py did not start")
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{name:<20} {ticks / elapsed:>12,.0f} {frames / elapsed:>12,.0f} {cpu / ticks * 1e6:>19.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=200_000, help="Ticks for the codec benchmark")
+    parser.add_argument("--batch-size", type=int, default=500, help="Ticks per batched frame")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Receive time per format in the live benchmark")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--codec-only", action="store_true")
+    args = parser.parse_args()
+
+    bench_codec(make_ticks(args.ticks), args.batch_size)
+    if not args.codec_only:
+        bench_live(args)
+
+if __name__ == "__main__":
+    main()
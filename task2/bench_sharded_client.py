@@ -0,0 +1,77 @@
+
+"""
+Benchmark: alert rules evaluated in the client process against the sharded
+client (sharding.py) with 1, 2, 4... worker processes.
+
+Replays binary frames from the load generator's random walk through each
+mode and reports ticks/sec from the first frame until every worker has
+finished and all alerts have been merged. Throughput should grow with the
+number of workers up to the number of CPU cores.
+
+    python bench_sharded_client.py --ticks 500000 --tickers 5000 --workers 1,2,4
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+import protocol
+from alerts import AlertEngine, load_config, rule_from_config
+from broker import Batch, Broker
+from load_generator import PriceWalk
+from sharding import ShardedConsumer
+
+def make_frames(ticks, tickers, batch_size, seed):
+    walk = PriceWalk(tickers, seed=seed)
+    broker = Broker(walk.names, queue_size=batch_size, policy="drop_oldest")
+    start_ns = time.time_ns()
+    frames = []
+    for offset in range(0, ticks, batch_size):
+        count = min(batch_size, ticks - offset)
+        indexes, prices = walk.step(count)
+        # One tick per millisecond of simulated time
+        timestamps = start_ns + (offset + np.arange(count, dtype=np.int64)) * 1_000_000
+        frames.append(broker.encode(Batch(indexes, prices, timestamps), binary=True))
+    return frames
+
+def run_in_process(config, frames):
+    alerts = []
+    engine = AlertEngine([rule_from_config(rule) for rule in config.get("rules", [])], sinks=[alerts.append])
+    start = time.perf_counter()
+    for frame in frames:
+        for ticker, price, timestamp_ns in protocol.decode_batch(frame):
+            engine.on_tick(ticker, timestamp_ns / 1e9, price)
+    return time.perf_counter() - start, len(alerts)
+
+def run_sharded(config, frames, workers):
+    # Blocking, so every frame is processed however far the workers fall behind
+    consumer = ShardedConsumer(dict(config, sinks=[]), workers, block=True)
+    start = time.perf_counter()
+    for frame in frames:
+        consumer.submit(frame)
+    consumer.close()
+    return time.perf_counter() - start, consumer.alerts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=500_000)
+    parser.add_argument("--tickers", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Ticks per frame")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to run")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    config = load_config()
+    frames = make_frames(args.ticks, args.tickers, args.batch_size, args.seed)
+    print(f"{args.ticks:,} ticks over {args.tickers:,} tickers in {len(frames):,} frames, "
+          f"{len(config.get('rules', []))} rules, {os.cpu_count()} CPUs")
+    print(f"{'mode':<16} {'ticks/sec':>12} {'alerts':>8}")
+    elapsed, alerts = run_in_process(config, frames)
+    print(f"{'in-process':<16} {args.ticks / elapsed:>12,.0f} {alerts:>8,}")
+    for workers in (int(value) for value in args.workers.split(",")):
+        elapsed, alerts = run_sharded(config, frames, workers)
+        print(f"{f'{workers} workers':<16} {args.ticks / elapsed:>12,.0f} {alerts:>8,}")
+
+if __name__ == "__main__":
+    main()
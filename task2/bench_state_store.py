@@ -0,0 +1,117 @@
+
+"""
+Benchmark: warm start of the alert engine from a snapshot plus journal
+(state_store.py).
+
+Feeds --window-ticks ticks per ticker on average into an engine, starts a
+snapshot, journals --journal-ticks more, as the client does while the
+snapshot is written, then restores a fresh engine from the files and times
+the snapshot's copy (on the client's event loop) and write, the restore, and
+the journal replay. Both engines then receive the same further ticks and
+must send identical alerts. --crash-before-write leaves the snapshot
+unwritten, as if the client had stopped meanwhile.
+
+    python bench_state_store.py --tickers 20000 --window-ticks 30 --journal-ticks 50000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import protocol
+from alerts import AlertEngine, load_config, rule_from_config
+from broker import Batch, Broker
+from load_generator import PriceWalk
+from state_store import StateStore
+
+def make_frames(walk, broker, ticks, batch_size, start_ns, spacing_ns):
+    frames = []
+    for offset in range(0, ticks, batch_size):
+        count = min(batch_size, ticks - offset)
+        indexes, prices = walk.step(count)
+        timestamps = start_ns + (offset + np.arange(count, dtype=np.int64)) * spacing_ns
+        frames.append(broker.encode(Batch(indexes, prices, timestamps), binary=True))
+    return frames
+
+def feed(engine, frames, emit=True):
+    for frame in frames:
+        for ticker, price, timestamp_ns in protocol.decode_batch(frame):
+            engine.on_tick(ticker, timestamp_ns / 1e9, price, emit=emit)
+
+def new_engine(config, alerts):
+    return AlertEngine([rule_from_config(rule) for rule in config.get("rules", [])], sinks=[alerts.append])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=20_000)
+    parser.add_argument("--window-ticks", type=int, default=30, help="Ticks per ticker fed before the snapshot")
+    parser.add_argument("--journal-ticks", type=int, default=50_000, help="Ticks journaled after the snapshot")
+    parser.add_argument("--check-ticks", type=int, default=200_000, help="Ticks fed to both engines afterwards")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--crash-before-write", action="store_true", help="Restore without writing the snapshot")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    config = load_config()
+    window = max(rule.get("window", 60) for rule in config["rules"])
+    walk = PriceWalk(args.tickers, seed=args.seed)
+    broker = Broker(walk.names, queue_size=args.batch_size, policy="drop_oldest")
+    # Spread the snapshot's ticks over one window, so windows end up about full
+    before = args.tickers * args.window_ticks
+    spacing_ns = int(window * 1e9 / before)
+    start_ns = time.time_ns()
+    frames = make_frames(walk, broker, before, args.batch_size, start_ns, spacing_ns)
+    start_ns += before * spacing_ns
+    journaled = make_frames(walk, broker, args.journal_ticks, args.batch_size, start_ns, spacing_ns)
+    start_ns += args.journal_ticks * spacing_ns
+    later = make_frames(walk, broker, args.check_ticks, args.batch_size, start_ns, spacing_ns)
+
+    directory = tempfile.mkdtemp(prefix="state_store_")
+    try:
+        alerts = []
+        engine = new_engine(config, alerts)
+        store = StateStore(directory)
+        store.restore(engine, lambda frame: None)
+        # Journaled too, for a restore without the snapshot
+        for frame in frames:
+            store.record(frame)
+        feed(engine, frames)
+        started = time.perf_counter()
+        write = store.begin_snapshot(engine)
+        copy_seconds = time.perf_counter() - started
+        for frame in journaled:
+            store.record(frame)
+        feed(engine, journaled)
+        started = time.perf_counter()
+        if not args.crash_before_write:
+            write()
+        write_seconds = time.perf_counter() - started
+        store.close()
+
+        restored_alerts = []
+        restored = new_engine(config, restored_alerts)
+        started = time.perf_counter()
+        store = StateStore(directory)
+        tickers, replayed = store.restore(restored, lambda frame: feed(restored, [frame], emit=False))
+        restore_seconds = time.perf_counter() - started
+        store.close()
+
+        in_windows = sum(len(window) for ticker in engine.tickers() for window in engine.ticker_state(ticker)[0])
+        print(f"{tickers:,} tickers, {in_windows:,} ticks in windows, {replayed:,} journaled frames "
+              f"({args.journal_ticks:,} ticks after the snapshot)")
+        print(f"snapshot: {copy_seconds:.3f}s copying, {write_seconds:.3f}s writing"
+              + (" (skipped)" if args.crash_before_write else ""))
+        print(f"restore (load and replay): {restore_seconds:.3f}s")
+
+        alerts.clear()
+        feed(engine, later)
+        feed(restored, later)
+        print(f"alerts over the next {args.check_ticks:,} ticks: {len(alerts):,} uninterrupted, "
+              f"{len(restored_alerts):,} restored, identical: {alerts == restored_alerts}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+
+import asyncio
+import datetime
+import json
+import random
+import time
+from collections import deque
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import websockets
+
+import protocol
+
+# What to do when a client's queue is full:
+#   drop_oldest - discard the oldest queued ticks
+#   conflate    - keep only the latest queued price of each ticker
+#   disconnect  - close the connection (code 1013, try again later)
+POLICIES = ("drop_oldest", "conflate", "disconnect")
+
+# Every published tick gets the next sequence number of the broker's stream,
+# starting at 1. A stream id, random per broker, tells a resuming client
+# whether its sequence numbers still mean anything to the server.
+#
+# Each frame carries the stream id, the sequence number of its last tick,
+# and the first sequence number it accounts for: one past the last tick sent
+# to that client before, or past whatever the server dropped from its queue
+# or no longer holds for a resume. Ticks the client is not subscribed to are
+# not gaps, so a client sees a gap exactly when the first sequence number is
+# past the one following the last it received. Conflation is not reported as
+# a gap: the latest price of every ticker is still delivered.
+
+# NumPy layout of a protocol.RECORD ("<8sdq"), for encoding whole batches at once
+RECORD_DTYPE = np.dtype([("ticker", "S8"), ("price", "<f8"), ("timestamp", "<i8")])
+
+class Batch(NamedTuple):
+    indexes: np.ndarray     # ticker index into Broker.names
+    prices: np.ndarray
+    timestamps: np.ndarray  # epoch ns
+    sequences: Optional[np.ndarray] = None  # assigned by Broker.publish
+
+    def select(self, mask: np.ndarray) -> "Batch":
+        return Batch(*(None if array is None else array[mask] for array in self))
+
+def concatenate(batches: List[Batch]) -> Batch:
+    if len(batches) == 1:
+        return batches[0]
+    return Batch(*(np.concatenate(arrays) for arrays in zip(*batches)))
+
+class Subscriber:
+    """
+    One client's bounded queue of batches. The producer offers every batch
+    without waiting; the client's sender task drains the queue as fast as
+    the connection allows, merging whatever has queued up into one frame.
+    """
+
+    def __init__(self, websocket, mask: Optional[np.ndarray], max_ticks: int, policy: str, sent: int):
+        self.websocket = websocket
+        self.mask = mask  # per-ticker subscription flags, None for all tickers
+        self.max_ticks = max_ticks
+        self.policy = policy
+        self.queue = deque()
+        self.queued = 0
+        self.dropped = 0
+        self.sent = sent         # sequence number of the last tick sent, or the client's resume point
+        self.skipped = sent      # highest sequence number dropped rather than sent
+        self.backlog = 0         # replayed ticks still queued, not counted against max_ticks
+        self.overflowed = False
+        self.closing = None  # task closing the connection after an overflow with "disconnect"
+        self.ready = asyncio.Event()
+
+    def offer(self, batch: Batch):
+        if self.overflowed:
+            return
+        if self.mask is not None:
+            batch = batch.select(self.mask[batch.indexes])
+            if not len(batch.indexes):
+                return
+        self.queue.append(batch)
+        self.queued += len(batch.indexes)
+        if self.queued > self.max_ticks + self.backlog:
+            self._overflow()
+        self.ready.set()
+
+    def replay(self, batches: List[Batch]):
+        """Queues ticks from the broker's replay buffer ahead of the live ones, beyond the queue limit."""
+        for batch in batches:
+            if self.mask is not None:
+                batch = batch.select(self.mask[batch.indexes])
+            if len(batch.indexes):
+                self.queue.append(batch)
+                self.queued += len(batch.indexes)
+                self.backlog += len(batch.indexes)
+        self.ready.set()
+
+    def _overflow(self):
+        if self.policy == "disconnect":
+            self.overflowed = True
+            self.queue.clear()
+            self.queued = self.backlog = 0
+            # Close from here: the sender task may be blocked in send() on a full socket
+            self.closing = asyncio.get_running_loop().create_task(self._disconnect())
+            return
+        if self.policy == "conflate":
+            merged = concatenate(list(self.queue))
+            # Last occurrence of each ticker, kept in arrival order
+            count = len(merged.indexes)
+            _, last_from_end = np.unique(merged.indexes[::-1], return_index=True)
+            latest = np.sort(count - 1 - last_from_end)
+            self.queue = deque([merged.select(latest)])
+            self.dropped += count - len(latest)
+            self.queued = len(latest)
+            self.backlog = min(self.backlog, self.queued)
+            if self.queued <= self.max_ticks + self.backlog:
+                return
+        # drop_oldest, and conflate when more tickers are queued than fit;
+        # the replayed backlog is oldest, so it goes first
+        self.backlog = 0
+        while self.queued > self.max_ticks:
+            oldest = self.queue[0]
+            excess = self.queued - self.max_ticks
+            if len(oldest.indexes) <= excess:
+                self.queue.popleft()
+                self.queued -= len(oldest.indexes)
+                self.dropped += len(oldest.indexes)
+                self.skipped = max(self.skipped, int(oldest.sequences[-1]))
+            else:
+                self.queue[0] = Batch(*(array[excess:] for array in oldest))
+                self.queued -= excess
+                self.dropped += excess
+                self.skipped = max(self.skipped, int(oldest.sequences[excess - 1]))
+
+    async def _disconnect(self):
+        print(f"Disconnecting slow client: {self.websocket.remote_address}")
+        await self.websocket.close(1013, "Slow consumer: send queue full")
+
+    async def next_batch(self, max_ticks: int) -> Optional[Tuple[Batch, int]]:
+        """
+        Waits for queued ticks and returns up to about `max_ticks` of them,
+        with the first sequence number they account for; None once
+        disconnected for overflowing.
+        """
+        while not self.queue and not self.overflowed:
+            self.ready.clear()
+            await self.ready.wait()
+        if self.overflowed:
+            return None
+        batches = []
+        taken = 0
+        while self.queue and taken < max_ticks:
+            batch = self.queue.popleft()
+            batches.append(batch)
+            taken += len(batch.indexes)
+        self.queued -= taken
+        self.backlog = max(0, self.backlog - taken)
+        batch = concatenate(batches)
+        first = max(self.sent, self.skipped) + 1
+        self.sent = int(batch.sequences[-1])
+        return batch, first
+
+class Broker:
+    """
+    Fans one canonical tick stream out to every connected client, through a
+    bounded Subscriber queue per client so a slow client never holds up the
+    producer or the other clients. The last `replay_size` ticks or more are
+    kept, so a client that reconnects can resume where it left off.
+    """
+
+    def __init__(self, names: Iterable[str], queue_size: int, policy: str, max_frame_ticks: int = 10_000,
+                 replay_size: int = 100_000):
+        self.names = list(names)
+        # Raises ProtocolError for names the binary records cannot hold, which "S8" would truncate
+        self.encoded_names = np.array([protocol.encode_ticker(name) for name in self.names], dtype="S8")
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.queue_size = queue_size
+        self.policy = policy
+        self.max_frame_ticks = max_frame_ticks
+        self.replay_size = replay_size
+        self.replay = deque()  # recently published batches, oldest first
+        self.replay_ticks = 0
+        self.stream = random.getrandbits(63)
+        self.sequence = 0  # of the last published tick
+        self.subscribers = set()
+        self.published = 0
+        self.delivered = 0
+        self.disconnected = 0
+        self.resumed = 0
+        self.dropped_by_closed = 0  # drop counts of subscribers that have left
+
+    def publish(self, batch: Batch):
+        count = len(batch.indexes)
+        batch = batch._replace(sequences=np.arange(self.sequence + 1, self.sequence + count + 1, dtype=np.int64))
+        self.sequence += count
+        self.published += count
+        self.replay.append(batch)
+        self.replay_ticks += count
+        while self.replay and self.replay_ticks - len(self.replay[0].indexes) >= self.replay_size:
+            self.replay_ticks -= len(self.replay.popleft().indexes)
+        for subscriber in self.subscribers:
+            subscriber.offer(batch)
+
+    def encode(self, batch: Batch, binary: bool, send_time: Optional[int] = None, first: Optional[int] = None):
+        """
+        A frame of `batch`, stamped with `send_time` (time.monotonic_ns()) if
+        given, and with its sequence numbers if `first` is given.
+        """
+        sequenced = first is not None and batch.sequences is not None
+        if binary:
+            records = np.empty(len(batch.indexes), dtype=RECORD_DTYPE)
+            records["ticker"] = self.encoded_names[batch.indexes]
+            records["price"] = batch.prices
+            records["timestamp"] = batch.timestamps
+            flags, extensions = 0, b""
+            if send_time is not None:
+                flags |= protocol.FLAG_SEND_TIME
+                extensions += protocol.SEND_TIME.pack(send_time)
+            if sequenced:
+                flags |= protocol.FLAG_SEQUENCE
+                extensions += protocol.SEQUENCE.pack(self.stream, first, int(batch.sequences[-1]))
+            header = protocol.HEADER.pack(protocol.MAGIC, protocol.VERSION, flags, len(batch.indexes))
+            return header + extensions + records.tobytes()
+        names = self.names
+        messages = [
+            {"ticker": names[index], "price": price,
+             "timestamp": datetime.datetime.fromtimestamp(timestamp / 1e9, datetime.timezone.utc).isoformat()}
+            for index, price, timestamp in zip(batch.indexes.tolist(), batch.prices.tolist(), batch.timestamps.tolist())
+        ]
+        if send_time is not None:
+            for message in messages:
+                message["sent_ns"] = send_time
+        if sequenced:
+            for message, sequence in zip(messages, batch.sequences.tolist()):
+                message["seq"] = sequence
+            # The frame-level fields go on its first update
+            messages[0]["stream"] = self.stream
+            messages[0]["seq_from"] = first
+        # A single update keeps the original one-object-per-frame format
+        return json.dumps(messages[0] if len(messages) == 1 else messages)
+
+    def subscription_mask(self, tickers: List[str]) -> Optional[np.ndarray]:
+        if not tickers:
+            return None
+        mask = np.zeros(len(self.names), dtype=bool)
+        for ticker in tickers:
+            if ticker in self.index:
+                mask[self.index[ticker]] = True
+        return mask
+
+    def dropped(self) -> int:
+        return self.dropped_by_closed + sum(subscriber.dropped for subscriber in self.subscribers)
+
+    def replay_after(self, sequence: int) -> Tuple[List[Batch], int]:
+        """
+        Buffered ticks published after `sequence`, and the highest sequence
+        number after it that is no longer buffered (`sequence` itself if none is missing).
+        """
+        batches = []
+        for batch in reversed(self.replay):
+            if batch.sequences[-1] <= sequence:
+                break
+            batches.append(batch)
+        batches.reverse()
+        if batches and batches[0].sequences[0] <= sequence:
+            batches[0] = batches[0].select(batches[0].sequences > sequence)
+        missing = (int(batches[0].sequences[0]) if batches else self.sequence + 1) - 1
+        return batches, max(missing, sequence)
+
+    async def serve(self, websocket):
+        """
+        Connection handler. The query string can narrow the stream and
+        override the slow-consumer policy, e.g. ws://host:8765/?tickers=AAPL,MSFT&policy=conflate.
+        A reconnecting client adds the stream id and the sequence number of
+        the last tick it received, &stream=<id>&resume=<seq>, to get the
+        ticks it missed first; from another stream, it starts afresh.
+        """
+        query = parse_qs(urlsplit(websocket.request.path).query)
+        tickers = [ticker for value in query.get("tickers", []) for ticker in value.split(",") if ticker]
+        policy = query.get("policy", [self.policy])[0]
+        if policy not in POLICIES:
+            await websocket.close(1008, f"Unknown policy {policy!r}")
+            return
+        unknown = [ticker for ticker in tickers if ticker not in self.index]
+        if unknown:
+            await websocket.close(1008, f"Unknown tickers: {', '.join(unknown[:10])}")
+            return
+        try:
+            stream = int(query.get("stream", ["-1"])[0])
+            resume = int(query.get("resume", ["-1"])[0])
+        except ValueError:
+            await websocket.close(1008, "stream and resume must be integers")
+            return
+
+        binary = websocket.subprotocol == protocol.BINARY_SUBPROTOCOL
+        resuming = stream == self.stream and 0 <= resume <= self.sequence
+        subscriber = Subscriber(websocket, self.subscription_mask(tickers), self.queue_size, policy,
+                                resume if resuming else self.sequence)
+        if resuming:
+            # Nothing is published between these lines, so the replay and
+            # the live stream meet without a gap or an overlap
+            batches, subscriber.skipped = self.replay_after(resume)
+            subscriber.replay(batches)
+            self.resumed += 1
+        self.subscribers.add(subscriber)
+        print(f"Client connected: {websocket.remote_address} ({'binary' if binary else 'JSON'}, "
+              f"{len(tickers) or 'all'} tickers, {policy}"
+              f"{f', resuming after {resume:,} with {subscriber.queued:,} ticks' if resuming else ''})")
+        try:
+            while True:
+                item = await subscriber.next_batch(self.max_frame_ticks)
+                if item is None:
+                    await subscriber.closing
+                    break
+                batch, first = item
+                await websocket.send(self.encode(batch, binary, time.monotonic_ns(), first))
+                self.delivered += len(batch.indexes)
+        except websockets.exceptions.ConnectionClosedOK:
+            print(f"Client disconnected: {websocket.remote_address}")
+        except websockets.exceptions.ConnectionClosedError as e:
+            print(f"Client connection error: {websocket.remote_address}, Error: {e}")
+        finally:
+            if subscriber.overflowed:
+                self.disconnected += 1
+            self.subscribers.discard(subscriber)
+            self.dropped_by_closed += subscriber.dropped
+            print(f"Stopped sending updates to {websocket.remote_address}")
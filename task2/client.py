@@ -1,38 +1,229 @@
 
 import asyncio
+import os
+import random
+import time
 import websockets
 import json
-from datetime import datetime, timedelta
-from collections import defaultdict, deque
+from datetime import datetime
+from urllib.parse import urlencode
 
-# Store recent prices for each ticker (ticker -> deque of (timestamp, price))
-price_history = defaultdict(lambda: deque(maxlen=100)) # Keep last 100 updates per ticker
-notification_threshold_percent = 2.0
-notification_time_window = timedelta(minutes=1)
+import protocol
+from alerts import AlertEngine, load_config
+from latency import LATENCY_STATS, LatencyRecorder, monitor_event_loop, report_periodically
+
+# Alert rules and sinks come from the JSON file named by ALERT_CONFIG; by
+# default, a >2% rise within one minute is printed, at most once a minute per ticker.
+# The engine keeps the recent prices of each ticker (see price_window.py).
+alert_engine = AlertEngine.from_config(load_config())
+
+# "binary" asks the server for batched binary frames (protocol.py); servers
+# that do not support them fall back to JSON. "json" always uses JSON.
+TICK_PROTOCOL = os.getenv("TICK_PROTOCOL", "binary")
+# Comma-separated tickers to receive (default: all), e.g. SUBSCRIBE_TICKERS=AAPL,MSFT
+SUBSCRIBE_TICKERS = os.getenv("SUBSCRIBE_TICKERS")
+# With more than one worker, ticks are split by ticker across that many
+# processes, each running the alert rules for its own tickers (see sharding.py)
+CLIENT_WORKERS = int(os.getenv("CLIENT_WORKERS", "1"))
+sharded_consumer = None
+# With PERSIST_TICKS=true, received ticks are also written to the ticks table
+# of the task1 database (DATABASE_URL) in batches, see tick_writer.py
+PERSIST_TICKS = os.getenv("PERSIST_TICKS", "false").lower() in ("1", "true", "yes")
+tick_writer = None
+dropping_ticks = False
+dropping_worker_ticks = False
+# With STATE_DIR set, the alert engine's state is snapshotted there every
+# SNAPSHOT_INTERVAL seconds and every frame is journaled, so a restarted
+# client resumes with warm price windows and cooldowns (see state_store.py)
+STATE_DIR = os.getenv("STATE_DIR")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "10"))
+state_store = None
+# Per-stage latency histograms, reported every LATENCY_REPORT_INTERVAL seconds
+# and on exit; LATENCY_STATS=false turns them off (see latency.py)
+latency = LatencyRecorder() if LATENCY_STATS else None
+# Reconnects wait a random time up to RECONNECT_BASE_DELAY seconds, doubling
+# with each failed attempt up to RECONNECT_MAX_DELAY ("full jitter"), so
+# clients dropped together do not all come back at once
+RECONNECT_BASE_DELAY = float(os.getenv("RECONNECT_BASE_DELAY", "0.1"))
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", "10"))
+# Position in the server's tick stream (see broker.py): its stream id and the
+# sequence number of the last tick received, from which a reconnect resumes
+stream = None
+last_sequence = None
+gaps = 0
+missed = 0
+
+def persist_message(message):
+    """Hands a frame to the tick writer, which drops it rather than block if the database falls behind."""
+    global dropping_ticks
+    accepted = tick_writer.submit(message)
+    if not accepted and not dropping_ticks:
+        print("Tick writer buffer full; dropping ticks until the database catches up")
+    elif accepted and dropping_ticks:
+        print(f"Tick writer caught up ({tick_writer.dropped_frames} frames dropped so far)")
+    dropping_ticks = not accepted
+
+def submit_sharded(message):
+    """Hands a frame to the worker processes, which drop ticks rather than block if one falls behind; returns its sequence numbers."""
+    global dropping_worker_ticks
+    sequence = sharded_consumer.submit(message)
+    saturated = sharded_consumer.saturated
+    if saturated and not dropping_worker_ticks:
+        print("Alert worker queue full; dropping its ticks until it catches up")
+    elif not saturated and dropping_worker_ticks:
+        print(f"Alert workers caught up ({sharded_consumer.dropped_ticks:,} ticks dropped so far)")
+    dropping_worker_ticks = saturated
+    return sequence
+
+def track_sequence(sequence, report=True):
+    """
+    Advances the stream position to a frame's (stream id, first, last)
+    sequence numbers, reporting any gap; report=False only advances it, for
+    frames replayed from the journal.
+    """
+    global stream, last_sequence, gaps, missed
+    frame_stream, first, last = sequence
+    if frame_stream != stream:
+        if stream is not None and report:
+            print("Server stream changed (server restarted?); ticks sent since the disconnect are lost")
+        stream = frame_stream
+    elif first > last_sequence + 1 and report:
+        # Counted in the whole stream's sequence numbers, so with
+        # SUBSCRIBE_TICKERS this includes other tickers' ticks
+        gaps += 1
+        missed += first - last_sequence - 1
+        print(f"Gap in the tick stream: sequence numbers {last_sequence + 1:,} to {first - 1:,} were not received")
+    last_sequence = last
+
+def handle_message(message, received):
+    """Feeds every tick of a frame to the alert engine; `received` is its time.monotonic_ns() receipt time."""
+    if tick_writer is not None:
+        persist_message(message)
+    if sharded_consumer is not None:
+        sequence = submit_sharded(message)
+        if sequence is not None:
+            track_sequence(sequence)
+        if latency is not None:
+            # The workers' stages are not timed; only binary frames give
+            # their send time without being parsed here
+            sent = protocol.send_time(message) if isinstance(message, bytes) else None
+            if sent is not None:
+                latency.record("transit", received - sent)
+            latency.record("frame", time.monotonic_ns() - received)
+        return
+    if state_store is not None:
+        state_store.record(message)
+    if latency is not None:
+        evaluate_message_timed(message, received)
+    else:
+        evaluate_message(message)
+
+def evaluate_message(message, emit=True):
+    """Evaluates the alert rules on every tick of a frame; emit=False updates the state without sending alerts."""
+    ticks, _, sequence = message_ticks(message)
+    if sequence is not None:
+        track_sequence(sequence, report=emit)
+    for ticker, timestamp, price, quantity in ticks:
+        # Store the new price update and evaluate the alert rules for its ticker
+        alert_engine.on_tick(ticker, timestamp, price, quantity, emit=emit)
+
+def message_ticks(message):
+    """
+    (ticker, timestamp, price, quantity) of every tick of a frame, and the
+    frame's send time and sequence numbers if it has them.
+    """
+    if isinstance(message, bytes):
+        ticks = [(ticker, timestamp_ns / 1e9, price, 1.0) for ticker, price, timestamp_ns in protocol.decode_batch(message)]
+        return ticks, protocol.send_time(message), protocol.sequence(message)
+    data = json.loads(message)
+    updates = data if isinstance(data, list) else [data]
+    ticks = [
+        (update["ticker"], datetime.fromisoformat(update["timestamp"]).timestamp(), update["price"], update.get("quantity", 1))
+        for update in updates
+    ]
+    return ticks, updates[0].get("sent_ns") if updates else None, protocol.json_sequence(updates)
+
+def evaluate_message_timed(message, received):
+    """evaluate_message(), recording the latency of each stage."""
+    start = time.monotonic_ns()
+    ticks, sent, sequence = message_ticks(message)
+    latency.record("decode", time.monotonic_ns() - start)
+    if sequence is not None:
+        track_sequence(sequence)
+    if sent is not None:
+        latency.record("transit", received - sent)
+
+    alert_latency = latency.histogram("alert")
+    if latency.sample():
+        update_latency = latency.histogram("update")
+        evaluate_latency = latency.histogram("evaluate")
+        for ticker, timestamp, price, quantity in ticks:
+            start = time.monotonic_ns()
+            states = alert_engine.update(ticker, timestamp, price, quantity)
+            updated = time.monotonic_ns()
+            alerts = alert_engine.evaluate(ticker, states, timestamp, price)
+            evaluated = time.monotonic_ns()
+            update_latency.record(updated - start)
+            evaluate_latency.record(evaluated - updated)
+            if alerts and sent is not None:
+                for _ in alerts:
+                    alert_latency.record(evaluated - sent)
+    else:
+        for ticker, timestamp, price, quantity in ticks:
+            alerts = alert_engine.on_tick(ticker, timestamp, price, quantity)
+            if alerts and sent is not None:
+                emitted = time.monotonic_ns()
+                for _ in alerts:
+                    alert_latency.record(emitted - sent)
+    latency.record("frame", time.monotonic_ns() - received)
+
+def stream_position():
+    """(stream id, last sequence number received), saved with state snapshots; None before the first sequenced frame."""
+    return (stream, last_sequence) if stream is not None else None
+
+async def take_snapshots():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        # Only copying the state holds up the receive loop; the snapshot is
+        # built and written in a thread while frames keep being journaled
+        start = time.perf_counter()
+        write = state_store.begin_snapshot(alert_engine, stream_position())
+        copied = time.perf_counter()
+        try:
+            await loop.run_in_executor(None, write)
+        except Exception as e:
+            print(f"State snapshot failed: {e}")
+            continue
+        print(f"State snapshot: {len(alert_engine.tickers())} tickers, copied in {copied - start:.3f}s, "
+              f"written in {time.perf_counter() - copied:.3f}s")
+
+def stream_uri():
+    """The server URI, asking to resume after the last tick received once there is one."""
+    query = {}
+    if SUBSCRIBE_TICKERS:
+        query["tickers"] = SUBSCRIBE_TICKERS
+    if stream is not None:
+        query.update(stream=stream, resume=last_sequence)
+    return "ws://localhost:8765" + ("/?" + urlencode(query) if query else "")
+
+def reconnect_delay(attempt):
+    return random.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt))
 
 async def process_stock_updates():
-    uri = "ws://localhost:8765"
+    subprotocols = [protocol.BINARY_SUBPROTOCOL] if TICK_PROTOCOL == "binary" else None
+    attempt = 0
     while True:
+        uri = stream_uri()
         try:
-            async with websockets.connect(uri) as websocket:
-                print(f"Connected to WebSocket server at {uri}")
+            async with websockets.connect(uri, subprotocols=subprotocols) as websocket:
+                print(f"Connected to WebSocket server at {uri} ({'binary' if websocket.subprotocol else 'JSON'})")
                 while True:
                     try:
                         message = await websocket.recv()
-                        data = json.loads(message)
-                        # print(f"Received: {data}")
-
-                        ticker = data["ticker"]
-                        price = data["price"]
-                        timestamp_str = data["timestamp"]
-                        timestamp = datetime.fromisoformat(timestamp_str)
-
-                        # Store the new price update
-                        history = price_history[ticker]
-                        history.append((timestamp, price))
-
-                        # Check for significant price increase within the time window
-                        check_price_increase(ticker, timestamp, price, history)
+                        # Back off afresh only once the connection delivers
+                        attempt = 0
+                        handle_message(message, time.monotonic_ns())
 
                     except websockets.exceptions.ConnectionClosed:
                         print("Connection closed by server. Reconnecting...")
@@ -41,39 +232,67 @@ async def process_stock_updates():
                         print(f"Received non-JSON message: {message}")
                     except Exception as e:
                         print(f"Error processing message: {e}")
-                        # Optional: Add a small delay before trying to receive next message
-                        await asyncio.sleep(1)
 
         except (websockets.exceptions.ConnectionClosedError, ConnectionRefusedError, OSError) as e:
-            print(f"Failed to connect or connection lost: {e}. Retrying in 5 seconds...")
-            await asyncio.sleep(5)
+            print(f"Failed to connect or connection lost: {e}.")
         except Exception as e:
-            print(f"An unexpected error occurred: {e}. Retrying in 10 seconds...")
-            await asyncio.sleep(10)
-
-def check_price_increase(ticker, current_timestamp, current_price, history):
-    """Checks if the price increased by more than the threshold within the window."""
-    # Find the earliest price within the notification time window
-    window_start_time = current_timestamp - notification_time_window
-    earliest_price_in_window = None
-
-    # Iterate through history (which is ordered by time) to find relevant prices
-    for ts, price in history:
-        if ts >= window_start_time:
-            if earliest_price_in_window is None:
-                 earliest_price_in_window = price # First price within the window
-            # Check increase against the earliest price found in the window
-            if current_price > earliest_price_in_window * (1 + notification_threshold_percent / 100):
-                percentage_increase = ((current_price - earliest_price_in_window) / earliest_price_in_window) * 100
-                print(f"*** ALERT ***: {ticker} price increased by {percentage_increase:.2f}% ",
-                      f"(from {earliest_price_in_window} to {current_price}) ",
-                      f"within the last {notification_time_window.total_seconds()} seconds.")
-                # Avoid repeated alerts for the same rise by potentially adding a cooldown
-                # For simplicity, we just print the alert every time the condition is met
-                break # Alert triggered for this update, no need to check further back
+            print(f"An unexpected error occurred: {e}.")
+        delay = reconnect_delay(attempt)
+        attempt += 1
+        print(f"Reconnecting in {delay:.2f} seconds...")
+        await asyncio.sleep(delay)
 
 async def main():
-    await process_stock_updates()
+    global sharded_consumer, tick_writer, state_store, stream, last_sequence
+    snapshots = None
+    if STATE_DIR and CLIENT_WORKERS > 1:
+        print("STATE_DIR is ignored with CLIENT_WORKERS > 1")
+    elif STATE_DIR:
+        from state_store import StateStore
+
+        state_store = StateStore(STATE_DIR)
+        start = time.perf_counter()
+        tickers, frames = state_store.restore(alert_engine, lambda message: evaluate_message(message, emit=False))
+        print(f"Restored {tickers} tickers and replayed {frames} journaled frames "
+              f"in {time.perf_counter() - start:.3f}s")
+        # Journaled frames are newer than the snapshot, so their position wins
+        if stream is None and state_store.stream_position is not None:
+            stream, last_sequence = state_store.stream_position
+        if stream is not None:
+            print(f"Resuming the tick stream after sequence number {last_sequence:,}")
+        snapshots = asyncio.create_task(take_snapshots())
+    if latency is not None:
+        latency_tasks = [asyncio.create_task(monitor_event_loop(latency)), asyncio.create_task(report_periodically(latency))]
+    if CLIENT_WORKERS > 1:
+        from sharding import ShardedConsumer
+
+        sharded_consumer = ShardedConsumer(load_config(), CLIENT_WORKERS)
+        print(f"Evaluating alert rules in {CLIENT_WORKERS} worker processes")
+    # Started after the workers are forked
+    if PERSIST_TICKS:
+        from tick_writer import TickWriter
+
+        tick_writer = TickWriter()
+    try:
+        await process_stock_updates()
+    finally:
+        if stream is not None:
+            print(f"Tick stream: last sequence number {last_sequence:,}, {gaps} gaps, {missed:,} sequence numbers missed")
+        if latency is not None:
+            for task in latency_tasks:
+                task.cancel()
+            print("\n".join(latency.report(final=True)))
+        if snapshots is not None:
+            snapshots.cancel()
+            state_store.close(alert_engine, stream_position())
+        if sharded_consumer is not None:
+            sharded_consumer.close(timeout=5)
+            print(f"Alert workers: {sharded_consumer.ticks_processed:,} ticks processed, "
+                  f"{sharded_consumer.dropped_ticks:,} dropped")
+        if tick_writer is not None:
+            tick_writer.close(timeout=5)
+            print(f"Tick writer: {tick_writer.written} ticks written, {tick_writer.dropped_frames} frames dropped, "
+                  f"{tick_writer.rejected_ticks} ticks rejected by the database, {tick_writer.lost_ticks} ticks lost at close")
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,136 @@
+
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+# Latency instrumentation for client.py. Stages, all in nanoseconds:
+#   transit   server send (protocol send time) to the frame being received;
+#             includes time queued in the client's socket while it was busy.
+#             Both ends read CLOCK_MONOTONIC, so it needs them on the same host
+#   decode    decoding one frame
+#   update    adding one tick to its ticker's price windows
+#   evaluate  evaluating one tick's rules
+#   frame     handling one frame, from receipt to its last rule evaluation
+#   alert     server send to an alert being sent to the sinks
+#   loop_lag  how late the event loop runs a timer (see monitor_event_loop)
+# update and evaluate are timed on one frame in LATENCY_SAMPLE_EVERY, so the
+# per-tick cost of timing stays off most frames.
+STAGES = ("transit", "decode", "update", "evaluate", "frame", "alert", "loop_lag")
+LATENCY_STATS = os.getenv("LATENCY_STATS", "true").lower() in ("1", "true", "yes")
+LATENCY_REPORT_INTERVAL = float(os.getenv("LATENCY_REPORT_INTERVAL", "60"))
+LATENCY_SAMPLE_EVERY = int(os.getenv("LATENCY_SAMPLE_EVERY", "16"))
+
+# Each power-of-two range of values is split into 2**(SUB_BUCKET_BITS - 1)
+# linear sub-buckets, as in HdrHistogram: values are kept to within 1/128
+# (0.8%) of their size, in a fixed array, at any magnitude
+SUB_BUCKET_BITS = 8
+SUB_BUCKETS = 1 << (SUB_BUCKET_BITS - 1)
+# Values above 2**40 ns (about 18 minutes) are counted in the last bucket
+MAX_BITS = 40
+BUCKETS = (MAX_BITS - SUB_BUCKET_BITS + 2) * SUB_BUCKETS
+
+def bucket_upper(index: int) -> int:
+    """Largest value counted in bucket `index`."""
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index - shift * SUB_BUCKETS + 1) << shift) - 1
+
+class LatencyHistogram:
+    """Log-linear histogram of non-negative integer values (ns), HDR style."""
+
+    __slots__ = ("counts", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.max = 0
+
+    def record(self, value: int):
+        if value < 0:
+            value = 0
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        index = value if shift <= 0 else min((shift << (SUB_BUCKET_BITS - 1)) + (value >> shift), BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> int:
+        """Value at or below which `percent` of the recorded values fall, to within the bucket width."""
+        if not self.count:
+            return 0
+        rank = max(1, round(self.count * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper(index), self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+class LatencyRecorder:
+    """
+    One histogram per stage for the current reporting interval, merged into
+    running totals by each report.
+    """
+
+    def __init__(self, sample_every: int = LATENCY_SAMPLE_EVERY):
+        self.sample_every = sample_every
+        self.interval: Dict[str, LatencyHistogram] = {}
+        self.totals: Dict[str, LatencyHistogram] = {}
+        self.frames = 0
+        self.started = self.interval_started = time.monotonic()
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self.interval.get(stage)
+        if histogram is None:
+            histogram = self.interval[stage] = LatencyHistogram()
+        return histogram
+
+    def record(self, stage: str, value: int):
+        self.histogram(stage).record(value)
+
+    def sample(self) -> bool:
+        """Counts a frame; True for the frames whose per-tick stages should be timed."""
+        self.frames += 1
+        return self.frames % self.sample_every == 0
+
+    def report(self, final: bool = False) -> List[str]:
+        """Lines for the interval since the last report (or all totals if `final`), in microseconds."""
+        now = time.monotonic()
+        for stage, histogram in self.interval.items():
+            total = self.totals.get(stage)
+            if total is None:
+                total = self.totals[stage] = LatencyHistogram()
+            total.merge(histogram)
+        histograms = self.totals if final else self.interval
+        elapsed = now - (self.started if final else self.interval_started)
+        self.interval = {}
+        self.interval_started = now
+        lines = [f"[latency] {'total over' if final else 'last'} {elapsed:.0f}s, in us",
+                 f"[latency] {'stage':<9} {'count':>11} {'p50':>10} {'p99':>10} {'p99.9':>10} {'max':>10}"]
+        order = {stage: position for position, stage in enumerate(STAGES)}
+        for stage, histogram in sorted(histograms.items(), key=lambda item: order.get(item[0], len(order))):
+            if not histogram.count:
+                continue
+            values = [histogram.percentile(p) / 1000 for p in (50, 99, 99.9)] + [histogram.max / 1000]
+            lines.append(f"[latency] {stage:<9} {histogram.count:>11,} " + " ".join(f"{value:>10,.1f}" for value in values))
+        return lines
+
+async def monitor_event_loop(recorder: LatencyRecorder, interval: float = 0.1):
+    """Records how late each `interval` timer fires: time the loop spent busy with other work."""
+    while True:
+        start = time.monotonic_ns()
+        await asyncio.sleep(interval)
+        recorder.record("loop_lag", time.monotonic_ns() - start - int(interval * 1e9))
+
+async def report_periodically(recorder: LatencyRecorder, interval: float = LATENCY_REPORT_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        print("\n".join(recorder.report()))
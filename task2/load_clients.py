@@ -0,0 +1,77 @@
+
+"""
+Opens many concurrent WebSocket clients against mock_server.py and reports
+the ticks/sec they receive, to find where the server or the clients saturate.
+Clients only decode frames; they do not evaluate alert rules.
+
+    python mock_server.py --load --tickers 20000 --rate 50000 --burst spike:4:10:2
+    python load_clients.py --clients 50 --seconds 30 --protocol binary
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+
+import websockets
+
+import protocol
+
+async def run_client(uri, subprotocols, counts, index, deadline):
+    async with websockets.connect(uri, subprotocols=subprotocols, max_size=None) as websocket:
+        binary = websocket.subprotocol == protocol.BINARY_SUBPROTOCOL
+        while time.perf_counter() < deadline:
+            try:
+                message = await asyncio.wait_for(websocket.recv(), timeout=max(deadline - time.perf_counter(), 0.001))
+            except asyncio.TimeoutError:
+                break
+            if binary:
+                counts[index] += protocol.HEADER.unpack_from(message)[3]
+                for _ in protocol.decode_batch(message):
+                    pass
+            else:
+                data = json.loads(message)
+                counts[index] += len(data) if isinstance(data, list) else 1
+
+async def report(counts, interval, deadline):
+    last_total, last_time = 0, time.perf_counter()
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(interval)
+        now, total = time.perf_counter(), sum(counts)
+        rate = (total - last_total) / (now - last_time)
+        active = sum(1 for count in counts if count)
+        print(f"{rate:>12,.0f} ticks/s received | {rate / max(active, 1):>10,.0f} per client | {active} clients receiving")
+        last_total, last_time = total, now
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="ws://localhost:8765")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--protocol", choices=["binary", "json"], default="binary")
+    parser.add_argument("--subscribe", help="Comma-separated tickers to subscribe to (default: all)")
+    parser.add_argument("--policy", help="Slow-consumer policy to request: drop_oldest, conflate or disconnect")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    subprotocols = [protocol.BINARY_SUBPROTOCOL] if args.protocol == "binary" else None
+    query = {name: value for name, value in (("tickers", args.subscribe), ("policy", args.policy)) if value}
+    uri = f"{args.uri.rstrip('/')}/?{urlencode(query)}" if query else args.uri
+    counts = [0] * args.clients
+    start = time.perf_counter()
+    deadline = start + args.seconds
+    reporter = asyncio.create_task(report(counts, args.report_interval, deadline))
+    results = await asyncio.gather(
+        *(run_client(uri, subprotocols, counts, index, deadline) for index in range(args.clients)),
+        return_exceptions=True,
+    )
+    reporter.cancel()
+    errors = [result for result in results if isinstance(result, Exception)]
+    elapsed = time.perf_counter() - start
+    print(f"\n{sum(counts):,} ticks in {elapsed:.1f}s: {sum(counts) / elapsed:,.0f} ticks/s over "
+          f"{args.clients - len(errors)} clients ({len(errors)} failed)")
+    for error in errors[:3]:
+        print(f"  {type(error).__name__}: {error}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
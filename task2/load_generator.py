@@ -0,0 +1,77 @@
+
+import math
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+# Rate multipliers over time for the load-generator mode of mock_server.py:
+#   "steady"                          - constant rate
+#   "spike:<factor>:<every>:<length>" - <factor> times the rate for <length>
+#                                       seconds out of every <every> seconds
+#   "sine:<amplitude>:<period>"       - rate * (1 + amplitude * sin(2*pi*t / period))
+#   "ramp:<factor>:<length>"          - rises linearly from 1x to <factor>x over
+#                                       <length> seconds, then stays there
+def burst_profile(spec: str) -> Callable[[float], float]:
+    name, *params = spec.split(":")
+    values = [float(param) for param in params]
+    if name == "steady" and not values:
+        return lambda elapsed: 1.0
+    if name == "spike" and len(values) == 3:
+        factor, every, length = values
+        return lambda elapsed: factor if elapsed % every < length else 1.0
+    if name == "sine" and len(values) == 2:
+        amplitude, period = values
+        return lambda elapsed: max(0.0, 1 + amplitude * math.sin(2 * math.pi * elapsed / period))
+    if name == "ramp" and len(values) == 2:
+        factor, length = values
+        return lambda elapsed: 1 + (factor - 1) * min(elapsed / length, 1.0)
+    raise ValueError(f"Invalid burst profile {spec!r}")
+
+def ticker_names(count: int) -> List[str]:
+    width = max(5, len(str(count - 1)))
+    return [f"T{i:0{width}d}" for i in range(count)]
+
+class PriceWalk:
+    """
+    Random walk over many tickers, generated a batch at a time with NumPy.
+
+    Each tick picks a random ticker and moves its price by a uniform
+    +/- `volatility` fraction, as the original per-tick random.uniform loop
+    did. Batch prices compound correctly when a ticker appears more than
+    once in a batch.
+    """
+
+    def __init__(self, tickers: int, volatility: float = 0.015, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.names = ticker_names(tickers)
+        self.prices = self.rng.uniform(10.0, 1000.0, tickers)
+        self.volatility = volatility
+
+    def step(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Moves `count` random tickers. Returns their indexes and the price after each tick."""
+        indexes = self.rng.integers(0, len(self.prices), count)
+        changes = 1 + self.rng.uniform(-self.volatility, self.volatility, count)
+
+        # Price after each tick: the ticker's price before the batch times the
+        # product of its changes so far, computed as a per-ticker running sum
+        # of log changes over the ticks sorted by ticker (stable, so in tick order)
+        order = np.argsort(indexes, kind="stable")
+        sorted_indexes = indexes[order]
+        log_changes = np.log(changes[order])
+        running = np.cumsum(log_changes)
+        group_start = np.empty(count, dtype=bool)
+        group_start[:1] = True
+        np.not_equal(sorted_indexes[1:], sorted_indexes[:-1], out=group_start[1:])
+        start_positions = np.maximum.accumulate(np.where(group_start, np.arange(count), 0))
+        before_group = running[start_positions] - log_changes[start_positions]
+        prices = np.empty(count)
+        prices[order] = self.prices[sorted_indexes] * np.exp(running - before_group)
+
+        np.multiply.at(self.prices, indexes, changes)
+        np.maximum(self.prices, 0.01, out=self.prices)
+        return indexes, np.maximum(np.round(prices, 2), 0.01)
+
+    def timestamps(self, count: int, interval: float) -> np.ndarray:
+        """Epoch-ns timestamps for a batch, spread evenly over the next `interval` seconds."""
+        return time.time_ns() + (np.arange(count) * (interval * 1e9 / count)).astype(np.int64)
@@ -1,10 +1,16 @@
 
+import argparse
 import asyncio
+import time
 import websockets
-import json
 import random
 import datetime
 
+import numpy as np
+
+import protocol
+from broker import POLICIES, Batch, Broker
+
 # Mock stock data
 stocks = {
     "AAPL": {"price": 150.0, "last_update": datetime.datetime.now()},
@@ -13,54 +19,144 @@ stocks = {
     "AMZN": {"price": 3400.0, "last_update": datetime.datetime.now()}
 }
 
-async def generate_stock_updates(websocket):
-    print(f"Client connected: {websocket.remote_address}")
-    try:
-        while True:
-            # Select a random stock to update
-            ticker = random.choice(list(stocks.keys()))
-            stock = stocks[ticker]
-
-            # Simulate price change (small random fluctuation)
-            change_percent = random.uniform(-0.015, 0.015) # +/- 1.5%
-            new_price = round(stock["price"] * (1 + change_percent), 2)
-
-            # Ensure price doesn't go below zero
-            new_price = max(0.01, new_price)
-
-            stock["price"] = new_price
-            stock["last_update"] = datetime.datetime.now()
-
-            update_message = {
-                "ticker": ticker,
-                "price": new_price,
-                "timestamp": stock["last_update"].isoformat()
-            }
-
-            await websocket.send(json.dumps(update_message))
-            # print(f"Sent update: {update_message}")
-
-            # Wait for a short interval before sending the next update
-            await asyncio.sleep(random.uniform(0.5, 2.0)) # Send updates every 0.5-2 seconds
-    except websockets.exceptions.ConnectionClosedOK:
-        print(f"Client disconnected: {websocket.remote_address}")
-    except websockets.exceptions.ConnectionClosedError as e:
-        print(f"Client connection error: {websocket.remote_address}, Error: {e}")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-    finally:
-        print(f"Stopped sending updates to {websocket.remote_address}")
+def next_update():
+    """Moves the price of a random stock and returns (ticker, price, timestamp in epoch ns)."""
+    # Select a random stock to update
+    ticker = random.choice(list(stocks.keys()))
+    stock = stocks[ticker]
+
+    # Simulate price change (small random fluctuation)
+    change_percent = random.uniform(-0.015, 0.015) # +/- 1.5%
+    new_price = round(stock["price"] * (1 + change_percent), 2)
+
+    # Ensure price doesn't go below zero
+    new_price = max(0.01, new_price)
+
+    timestamp_ns = time.time_ns()
+    stock["price"] = new_price
+    stock["last_update"] = datetime.datetime.fromtimestamp(timestamp_ns / 1e9)
+    return ticker, new_price, timestamp_ns
+
+async def produce_stock_updates(broker, batch_size=1, interval=None):
+    """The original feed: `batch_size` updates of the four stocks, every 0.5-2 seconds unless `interval` is given."""
+    while True:
+        updates = [next_update() for _ in range(batch_size)]
+        tickers, prices, timestamps = zip(*updates)
+        broker.publish(Batch(
+            np.array([broker.index[ticker] for ticker in tickers]),
+            np.array(prices),
+            np.array(timestamps, dtype=np.int64),
+        ))
+        # print(f"Published updates: {updates}")
+
+        # Wait for a short interval before sending the next update
+        await asyncio.sleep(random.uniform(0.5, 2.0) if interval is None else interval)
+
+class ProducerStats:
+    def __init__(self):
+        self.target_rate = 0.0  # at the current point of the burst profile
+        self.lag = 0.0          # seconds behind the publishing schedule
+
+async def produce_load(broker, walk, rate, profile, frame_interval, stats):
+    """
+    Publishes `walk` at `rate` ticks/sec (scaled by the burst profile), one
+    batch every `frame_interval` seconds. If generation cannot keep up, the
+    reported lag grows; the schedule restarts after one second of lag rather
+    than bursting to catch up.
+    """
+    loop = asyncio.get_running_loop()
+    start = next_frame = loop.time()
+    due = 0.0
+    while True:
+        stats.target_rate = rate * profile(loop.time() - start)
+        due += stats.target_rate * frame_interval
+        count = int(due)
+        if count:
+            due -= count
+            indexes, prices = walk.step(count)
+            broker.publish(Batch(indexes, prices, walk.timestamps(count, frame_interval)))
+
+        next_frame += frame_interval
+        delay = next_frame - loop.time()
+        stats.lag = max(0.0, -delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            if delay < -1.0:
+                next_frame = loop.time()
+            await asyncio.sleep(0)
+
+async def report(broker, stats, interval):
+    published, delivered, last = broker.published, broker.delivered, time.perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        elapsed = now - last
+        subscribers = list(broker.subscribers)
+        queues = [subscriber.queued for subscriber in subscribers]
+        buffers = [s.websocket.transport.get_write_buffer_size() for s in subscribers if s.websocket.transport]
+        target = f" (target {stats.target_rate:,.0f}, lag {stats.lag:.2f} s)" if stats else ""
+        print(f"[broker] {len(subscribers)} clients | published {(broker.published - published) / elapsed:,.0f} ticks/s"
+              f"{target} | delivered {(broker.delivered - delivered) / elapsed:,.0f} ticks/s | "
+              f"queues max {max(queues, default=0):,} total {sum(queues):,} ticks | "
+              f"send buffers max {max(buffers, default=0) / 1024:,.1f} KB | "
+              f"dropped {broker.dropped():,} | disconnected {broker.disconnected} | resumed {broker.resumed}")
+        published, delivered, last = broker.published, broker.delivered, now
 
 async def main():
-    host = "0.0.0.0"
-    port = 8765
-    async with websockets.serve(generate_stock_updates, host, port):
-        print(f"Mock WebSocket server started on ws://{host}:{port}")
-        await asyncio.Future()  # Run forever
+    parser = argparse.ArgumentParser(description="Mock WebSocket server sending simulated stock price updates.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-size", type=int, default=1, help="Updates per frame (default 1)")
+    parser.add_argument("--interval", type=float, default=None,
+                        help="Seconds between frames (default: random 0.5-2.0; 0 sends as fast as possible)")
+    load = parser.add_argument_group("load-generator mode")
+    load.add_argument("--load", action="store_true", help="Send a NumPy random walk over many tickers at a target rate")
+    load.add_argument("--tickers", type=int, default=10_000, help="Number of tickers (default 10000)")
+    load.add_argument("--rate", type=float, default=100_000, help="Target ticks/sec (default 100000)")
+    load.add_argument("--burst", default="steady",
+                      help="Rate profile: steady, spike:<factor>:<every>:<length>, sine:<amplitude>:<period> "
+                           "or ramp:<factor>:<length> (seconds)")
+    load.add_argument("--frame-ms", type=float, default=10.0, help="Milliseconds between frames (default 10)")
+    load.add_argument("--seed", type=int, default=None)
+    fanout = parser.add_argument_group("fan-out")
+    fanout.add_argument("--queue-size", type=int, default=10_000, help="Ticks queued per client before --slow-consumer applies")
+    fanout.add_argument("--slow-consumer", choices=POLICIES, default="drop_oldest",
+                        help="What to do when a client's queue is full (clients can override it with ?policy=)")
+    fanout.add_argument("--max-frame-ticks", type=int, default=10_000,
+                        help="Most queued ticks merged into one frame when a client falls behind")
+    fanout.add_argument("--replay-buffer", type=int, default=100_000,
+                        help="Recent ticks kept for reconnecting clients to resume from (default 100000)")
+    fanout.add_argument("--report-interval", type=float, default=None,
+                        help="Seconds between throughput and backlog reports (default 5 with --load, otherwise off)")
+    args = parser.parse_args()
+
+    # One producer publishes a single stream; the broker fans it out to every client
+    stats = None
+    if args.load:
+        from load_generator import PriceWalk, burst_profile
+
+        walk = PriceWalk(args.tickers, seed=args.seed)
+        broker = Broker(walk.names, args.queue_size, args.slow_consumer, args.max_frame_ticks, args.replay_buffer)
+        stats = ProducerStats()
+        producer = produce_load(broker, walk, args.rate, burst_profile(args.burst), args.frame_ms / 1000, stats)
+    else:
+        broker = Broker(stocks, args.queue_size, args.slow_consumer, args.max_frame_ticks, args.replay_buffer)
+        producer = produce_stock_updates(broker, args.batch_size, args.interval)
+    producer_task = asyncio.create_task(producer)
+    report_interval = args.report_interval if args.report_interval is not None else (5.0 if args.load else 0)
+    if report_interval:
+        asyncio.create_task(report(broker, stats, report_interval))
+
+    # Clients offering the "ticks.bin.v1" subprotocol get binary batches, others JSON
+    async with websockets.serve(broker.serve, args.host, args.port,
+                                subprotocols=[protocol.BINARY_SUBPROTOCOL],
+                                select_subprotocol=protocol.select_subprotocol):
+        print(f"Mock WebSocket server started on ws://{args.host}:{args.port}")
+        await producer_task  # Run forever
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         print("Server stopped manually.")
-
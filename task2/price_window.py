@@ -0,0 +1,108 @@
+
+import math
+from collections import deque
+
+class PriceWindow:
+    """
+    Prices of one ticker over the last `window` seconds.
+
+    Ticks are evicted by timestamp rather than by count, so the window holds
+    every tick of the last `window` seconds at any update rate. The minimum
+    and maximum are kept in monotonic deques, and running sums give the mean,
+    standard deviation and VWAP, which makes add() amortized O(1) and every
+    statistic O(1). Timestamps are epoch seconds (floats) and are expected to
+    arrive in order for a given ticker.
+    """
+
+    __slots__ = ("window", "_ticks", "_min", "_max", "_sum", "_sum_sq", "_volume", "_notional")
+
+    def __init__(self, window: float):
+        self.window = window
+        self._ticks = deque()  # (timestamp, price, quantity), oldest first
+        self._min = deque()    # (timestamp, price) with increasing prices
+        self._max = deque()    # (timestamp, price) with decreasing prices
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._volume = 0.0
+        self._notional = 0.0
+
+    def add(self, timestamp: float, price: float, quantity: float = 1.0):
+        """Adds a tick and evicts the ticks older than `window` seconds before it."""
+        self._ticks.append((timestamp, price, quantity))
+        self._sum += price
+        self._sum_sq += price * price
+        self._volume += quantity
+        self._notional += price * quantity
+
+        tick = (timestamp, price)
+        min_ticks = self._min
+        while min_ticks and min_ticks[-1][1] >= price:
+            min_ticks.pop()
+        min_ticks.append(tick)
+
+        max_ticks = self._max
+        while max_ticks and max_ticks[-1][1] <= price:
+            max_ticks.pop()
+        max_ticks.append(tick)
+
+        self.evict(timestamp - self.window)
+
+    def evict(self, cutoff: float):
+        """Drops ticks with a timestamp before `cutoff`."""
+        ticks = self._ticks
+        while ticks and ticks[0][0] < cutoff:
+            _, price, quantity = ticks.popleft()
+            self._sum -= price
+            self._sum_sq -= price * price
+            self._volume -= quantity
+            self._notional -= price * quantity
+        if not ticks:
+            # Reset rather than carry rounding error into the next ticks
+            self._sum = self._sum_sq = self._volume = self._notional = 0.0
+        for extremes in (self._min, self._max):
+            while extremes and extremes[0][0] < cutoff:
+                extremes.popleft()
+
+    @property
+    def earliest(self) -> float:
+        """Price of the oldest tick in the window."""
+        return self._ticks[0][1]
+
+    @property
+    def latest(self) -> float:
+        return self._ticks[-1][1]
+
+    @property
+    def min(self) -> float:
+        return self._min[0][1]
+
+    @property
+    def max(self) -> float:
+        return self._max[0][1]
+
+    @property
+    def mean(self) -> float:
+        return self._sum / len(self._ticks)
+
+    @property
+    def stddev(self) -> float:
+        """Population standard deviation of the prices in the window."""
+        mean = self.mean
+        return math.sqrt(max(self._sum_sq / len(self._ticks) - mean * mean, 0.0))
+
+    @property
+    def vwap(self) -> float:
+        """Volume-weighted average price; quantities default to 1, which makes it the mean."""
+        return self._notional / self._volume if self._volume else self.mean
+
+    def __len__(self):
+        return len(self._ticks)
+
+    def dump(self) -> tuple:
+        """The ticks, the min and max deques and the running sums, for snapshots (see state_store.py)."""
+        return self._ticks, self._min, self._max, (self._sum, self._sum_sq, self._volume, self._notional)
+
+    def load(self, ticks: deque, min_ticks: deque, max_ticks: deque, sums: tuple):
+        """Replaces the window's state with one from dump()."""
+        self._ticks, self._min, self._max = ticks, min_ticks, max_ticks
+        self._sum, self._sum_sq, self._volume, self._notional = sums
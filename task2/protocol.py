@@ -0,0 +1,116 @@
+
+import struct
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+# Binary tick batches, negotiated with the "ticks.bin.v1" WebSocket
+# subprotocol. Connections without it get the original JSON text frames.
+#
+# Frame: header, optional send time and sequence, then `count` fixed-size
+# records, all little-endian.
+#   header     "<2sBBI"  magic b"TK", version, flags, count
+#   send time  "<q"      with FLAG_SEND_TIME: the server's time.monotonic_ns()
+#                        when it sent the frame, for latency measurements
+#   sequence   "<QQQ"    with FLAG_SEQUENCE: the server's stream id, the first
+#                        sequence number the frame accounts for, and the
+#                        sequence number of its last tick (see broker.py)
+#   record     "<8sdq"   ticker (ASCII, NUL-padded to 8 bytes; longer names cannot be
+#                        sent and raise ProtocolError), price, timestamp (epoch ns)
+BINARY_SUBPROTOCOL = "ticks.bin.v1"
+MAGIC = b"TK"
+VERSION = 1
+HEADER = struct.Struct("<2sBBI")
+SEND_TIME = struct.Struct("<q")
+SEQUENCE = struct.Struct("<QQQ")
+RECORD = struct.Struct("<8sdq")
+FLAG_SEND_TIME = 0x01
+FLAG_SEQUENCE = 0x02
+TICKER_SIZE = 8
+# Bound on the decoded ticker names kept by decode_batch
+TICKER_CACHE_SIZE = 4096
+
+# (ticker, price, timestamp in epoch nanoseconds)
+Tick = Tuple[str, float, int]
+
+class ProtocolError(ValueError):
+    pass
+
+def select_subprotocol(connection, subprotocols: Sequence[str]) -> Optional[str]:
+    """Server-side negotiation: binary when the client offers it, plain JSON otherwise."""
+    return BINARY_SUBPROTOCOL if BINARY_SUBPROTOCOL in subprotocols else None
+
+def encode_ticker(ticker: str) -> bytes:
+    """A ticker's record bytes, before padding. Raises ProtocolError rather than truncate a name that does not fit."""
+    try:
+        encoded = ticker.encode("ascii")
+    except UnicodeEncodeError:
+        raise ProtocolError(f"Ticker {ticker!r} is not ASCII") from None
+    if len(encoded) > TICKER_SIZE:
+        raise ProtocolError(f"Ticker {ticker!r} is longer than {TICKER_SIZE} bytes")
+    return encoded
+
+def encode_batch(ticks: Sequence[Tick]) -> bytes:
+    buffer = bytearray(HEADER.size + RECORD.size * len(ticks))
+    HEADER.pack_into(buffer, 0, MAGIC, VERSION, 0, len(ticks))
+    offset = HEADER.size
+    pack_into = RECORD.pack_into
+    for ticker, price, timestamp_ns in ticks:
+        pack_into(buffer, offset, encode_ticker(ticker), price, timestamp_ns)
+        offset += RECORD.size
+    return bytes(buffer)
+
+# Decoded ticker names by their padded 8-byte form, so each distinct ticker is
+# decoded once; emptied when it reaches TICKER_CACHE_SIZE, so a stream of
+# ever-new names cannot grow it without bound
+_tickers: Dict[bytes, str] = {}
+
+def payload_offset(flags: int) -> int:
+    """Offset of the first record in a frame with these header flags."""
+    offset = HEADER.size
+    if flags & FLAG_SEND_TIME:
+        offset += SEND_TIME.size
+    if flags & FLAG_SEQUENCE:
+        offset += SEQUENCE.size
+    return offset
+
+def send_time(frame: bytes) -> Optional[int]:
+    """The server's monotonic send time of a binary frame in ns, if it has one."""
+    if frame[3] & FLAG_SEND_TIME:
+        return SEND_TIME.unpack_from(frame, HEADER.size)[0]
+    return None
+
+def sequence(frame: bytes) -> Optional[Tuple[int, int, int]]:
+    """(stream id, first sequence number covered, last tick's sequence number) of a binary frame, if it has them."""
+    flags = frame[3]
+    if not flags & FLAG_SEQUENCE:
+        return None
+    return SEQUENCE.unpack_from(frame, HEADER.size + (SEND_TIME.size if flags & FLAG_SEND_TIME else 0))
+
+def json_sequence(updates: Sequence[dict]) -> Optional[Tuple[int, int, int]]:
+    """(stream id, first, last) sequence numbers of a JSON frame's updates, if it has them."""
+    if updates and "seq_from" in updates[0]:
+        return updates[0]["stream"], updates[0]["seq_from"], updates[-1]["seq"]
+    return None
+
+def decode_batch(frame: bytes) -> Iterator[Tick]:
+    """
+    Yields the ticks of a binary frame. Records are unpacked straight from a
+    memoryview of the frame, without copying the payload.
+    """
+    view = memoryview(frame)
+    if len(view) < HEADER.size:
+        raise ProtocolError("Frame shorter than its header")
+    magic, version, flags, count = HEADER.unpack_from(view)
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError(f"Unsupported frame (magic {magic!r}, version {version})")
+    payload = view[payload_offset(flags):]
+    if len(payload) != count * RECORD.size:
+        raise ProtocolError(f"Frame holds {len(payload)} payload bytes, expected {count} records")
+
+    tickers = _tickers
+    for raw_ticker, price, timestamp_ns in RECORD.iter_unpack(payload):
+        ticker = tickers.get(raw_ticker)
+        if ticker is None:
+            if len(tickers) >= TICKER_CACHE_SIZE:
+                tickers.clear()
+            ticker = tickers[raw_ticker] = raw_ticker.rstrip(b"\0").decode("ascii")
+        yield ticker, price, timestamp_ns
@@ -0,0 +1,222 @@
+
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+from datetime import datetime
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import protocol
+from alerts import Alert, AlertEngine, rule_from_config, sink_from_config
+
+# Sharded mode of client.py: the receiving process splits each frame by
+# ticker into WORKERS worker processes over pipes. Each worker owns the
+# alert-engine state (price windows, cooldowns) of its tickers, so every
+# ticker is processed by one process, in arrival order. Workers send their
+# alerts back over one pipe each, and a thread in the receiving process
+# passes them to the sinks, which keeps the alerts of each ticker in order.
+
+# Frames queued for each worker, at most. A thread per worker writes them to
+# its pipe, so a worker that falls behind fills its queue instead of blocking
+# the receive loop on a full pipe; its further frames are then dropped until
+# the queue is half drained (see ShardedConsumer)
+SHARD_QUEUE_FRAMES = int(os.getenv("SHARD_QUEUE_FRAMES", "256"))
+
+# Multiplicative hash of the ticker's 8 NUL-padded bytes, read as a
+# little-endian uint64; shared by the vectorized (binary) and per-tick (JSON)
+# paths, and by every run, unlike hash(str). Longer tickers, which only JSON
+# frames can carry, fold in every further 8 bytes instead of being truncated
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+# Binary record read with the ticker as its hash key
+KEYED_RECORD = np.dtype([("key", "<u8"), ("price", "<f8"), ("timestamp", "<i8")])
+
+def shard_of(ticker: str, shards: int) -> int:
+    encoded = ticker.encode("utf-8")
+    key = 0
+    for start in range(0, max(len(encoded), 1), 8):
+        key = ((key * HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) ^ int.from_bytes(encoded[start:start + 8].ljust(8, b"\0"), "little")
+    return (((key * HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> 32) % shards
+
+def _shards_of(keys: np.ndarray, shards: int) -> np.ndarray:
+    return ((keys * np.uint64(HASH_MULTIPLIER)) >> np.uint64(32)) % np.uint64(shards)
+
+def _worker_main(rules_config: List[dict], ticks_conn, alerts_conn):
+    """
+    Worker process. Reads binary frames or pickled JSON updates until an
+    empty message, and sends back the alerts of each message (if any), then
+    its tick count and None.
+    """
+    engine = AlertEngine([rule_from_config(rule) for rule in rules_config], sinks=[])
+    on_tick = engine.on_tick
+    ticks = 0
+    while True:
+        message = ticks_conn.recv_bytes()
+        if not message:
+            break
+        alerts = []
+        if message[:2] == protocol.MAGIC:
+            for ticker, price, timestamp_ns in protocol.decode_batch(message):
+                alerts += on_tick(ticker, timestamp_ns / 1e9, price)
+                ticks += 1
+        else:
+            for ticker, timestamp, price, quantity in pickle.loads(message):
+                alerts += on_tick(ticker, datetime.fromisoformat(timestamp).timestamp(), price, quantity)
+                ticks += 1
+        if alerts:
+            alerts_conn.send(alerts)
+    alerts_conn.send(ticks)
+    alerts_conn.send(None)
+
+class ShardedConsumer:
+    """
+    Splits incoming frames by ticker across `workers` processes and merges
+    their alerts into the sinks of `config`.
+
+    submit() never waits for a worker: each worker's frames go through a
+    queue of `queue_frames` frames, and while a worker's queue is full, or
+    until it is half drained again (`saturated`), its share of each frame is
+    dropped and counted in `dropped_ticks`. With block=True, submit() waits
+    for queue space instead, as an offline replay wants.
+    """
+
+    def __init__(self, config: dict, workers: int, queue_frames: int = SHARD_QUEUE_FRAMES, block: bool = False):
+        self.workers = workers
+        self.sinks: List[Callable[[Alert], None]] = [sink_from_config(sink) for sink in config.get("sinks", ["print"])]
+        self.block = block
+        self.alerts = 0
+        self.ticks_processed = 0
+        self.dropped_ticks = 0
+        self._queues = [queue.Queue(maxsize=queue_frames) for _ in range(workers)]
+        self._saturated = [False] * workers
+        self._alert_conns = []
+        self._processes = []
+        self._senders = []
+        self._json_shards: Dict[str, int] = {}
+        for _ in range(workers):
+            ticks_reader, ticks_writer = multiprocessing.Pipe(duplex=False)
+            alerts_reader, alerts_writer = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_worker_main, args=(config.get("rules", []), ticks_reader, alerts_writer), daemon=True
+            )
+            process.start()
+            ticks_reader.close()
+            alerts_writer.close()
+            self._alert_conns.append(alerts_reader)
+            self._processes.append(process)
+            sender = threading.Thread(target=self._send_frames, args=(self._queues[len(self._senders)], ticks_writer),
+                                      daemon=True)
+            sender.start()
+            self._senders.append(sender)
+        self._merger = threading.Thread(target=self._merge_alerts, daemon=True)
+        self._merger.start()
+
+    @property
+    def saturated(self) -> bool:
+        """Whether ticks for some worker are being dropped."""
+        return any(self._saturated)
+
+    def submit(self, message) -> Optional[Tuple[int, int, int]]:
+        """
+        Routes the ticks of one WebSocket frame (binary or JSON text) to their
+        workers. Returns the frame's (stream id, first, last) sequence
+        numbers, if it has them, so the caller need not parse it again.
+        """
+        if isinstance(message, bytes):
+            return self._submit_binary(message)
+        return self._submit_json(message)
+
+    def _send(self, shard: int, payload: bytes, ticks: int):
+        frames = self._queues[shard]
+        if self._saturated[shard] and frames.qsize() <= frames.maxsize // 2:
+            self._saturated[shard] = False
+        if not self._saturated[shard]:
+            try:
+                frames.put(payload, block=self.block)
+                return
+            except queue.Full:
+                self._saturated[shard] = True
+        self.dropped_ticks += ticks
+
+    @staticmethod
+    def _send_frames(frames: queue.Queue, conn):
+        while True:
+            payload = frames.get()
+            conn.send_bytes(payload)
+            if not payload:
+                conn.close()
+                return
+
+    def _submit_binary(self, frame: bytes):
+        _, version, flags, count = protocol.HEADER.unpack_from(frame)
+        offset = protocol.payload_offset(flags)
+        records = np.frombuffer(frame, dtype=KEYED_RECORD, count=count, offset=offset)
+        # Each worker's frame keeps the send time and sequence numbers, if any
+        extensions = frame[protocol.HEADER.size:offset]
+        if self.workers == 1:
+            self._send(0, frame, count)
+            return protocol.sequence(frame)
+        shards = _shards_of(records["key"], self.workers)
+        # Stable, so each ticker's records keep their order within its shard
+        order = np.argsort(shards, kind="stable")
+        ordered = records[order]
+        bounds = np.searchsorted(shards[order], np.arange(self.workers + 1))
+        for shard in range(self.workers):
+            start, end = bounds[shard], bounds[shard + 1]
+            if start < end:
+                header = protocol.HEADER.pack(protocol.MAGIC, version, flags, end - start) + extensions
+                self._send(shard, header + ordered[start:end].tobytes(), end - start)
+        return protocol.sequence(frame)
+
+    def _submit_json(self, message: str):
+        data = json.loads(message)
+        updates = data if isinstance(data, list) else [data]
+        by_shard: Dict[int, list] = {}
+        shard_cache = self._json_shards
+        for update in updates:
+            ticker = update["ticker"]
+            shard = shard_cache.get(ticker)
+            if shard is None:
+                shard = shard_cache[ticker] = shard_of(ticker, self.workers)
+            by_shard.setdefault(shard, []).append(
+                (ticker, update["timestamp"], update["price"], update.get("quantity", 1))
+            )
+        for shard, shard_updates in by_shard.items():
+            self._send(shard, pickle.dumps(shard_updates, protocol=pickle.HIGHEST_PROTOCOL), len(shard_updates))
+        return protocol.json_sequence(updates)
+
+    def _merge_alerts(self):
+        pending = list(self._alert_conns)
+        while pending:
+            for conn in wait(pending):
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    pending.remove(conn)
+                    continue
+                if message is None:
+                    pending.remove(conn)
+                elif isinstance(message, int):
+                    self.ticks_processed += message
+                else:
+                    for alert in message:
+                        self.alerts += 1
+                        for sink in self.sinks:
+                            sink(alert)
+
+    def close(self, timeout: Optional[float] = None):
+        """Lets the workers finish their queued ticks, then stops them and the merger."""
+        for frames in self._queues:
+            try:
+                frames.put(b"", timeout=timeout)
+            except queue.Full:
+                pass  # a worker that stopped reading; its sender is a daemon thread
+        for sender in self._senders:
+            sender.join(timeout)
+        self._merger.join(timeout)
+        for process in self._processes:
+            process.join(timeout)
@@ -0,0 +1,349 @@
+
+import gc
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from alerts import AlertEngine
+
+# Warm start for client.py: the alert engine's per-ticker state (the ticks,
+# min/max deques and running sums of every PriceWindow, and each rule's
+# cooldown) is written every SNAPSHOT_INTERVAL seconds to a compact snapshot,
+# and every frame received since is appended to a journal. On startup the
+# latest snapshot is loaded and the journal replayed, so alerting carries on
+# as if the client had never stopped.
+#
+# Every snapshot starts a new generation. Snapshots alternate between two
+# slot files, so the previous one stays intact while the next is written, and
+# a slot only becomes valid when its header is written, last. Each slot has
+# its own journal, and journal records carry the generation they belong to.
+# A snapshot's state is copied and the journal switched to the new slot
+# first; the snapshot is then written while new frames are journaled. A
+# restore replays the latest snapshot's generation, then the next one's from
+# the other journal, left there if the client stopped before that snapshot
+# was complete, so a crash at any point neither loses nor replays a frame twice.
+#
+# Files are rewritten in place rather than replaced: freeing the blocks of a
+# large replaced or deleted file can take longer than writing it.
+SNAPSHOT_FILES = ("snapshot.0.bin", "snapshot.1.bin")
+JOURNAL_FILES = ("journal.0.bin", "journal.1.bin")
+
+# magic, version, generation, snapshot time, then the size of the names
+# section (JSON) and the row counts of the four arrays that follow it
+SNAPSHOT_HEADER = struct.Struct("<4sIQdQQQQQ")
+SNAPSHOT_MAGIC = b"TKSS"
+SNAPSHOT_VERSION = 1
+
+WINDOW_DTYPE = np.dtype([
+    ("ticker", "<u4"), ("window", "<f8"), ("ticks", "<u4"), ("min", "<u4"), ("max", "<u4"),
+    ("sum", "<f8"), ("sum_sq", "<f8"), ("volume", "<f8"), ("notional", "<f8"),
+])
+TICK_DTYPE = np.dtype([("timestamp", "<f8"), ("price", "<f8"), ("quantity", "<f8")])
+EXTREME_DTYPE = np.dtype([("timestamp", "<f8"), ("price", "<f8")])
+STATE_DTYPE = np.dtype([("ticker", "<u4"), ("rule", "<u4"), ("armed", "u1"), ("last_fired", "<f8")])
+
+# The journal starts with its magic, followed by one record per frame:
+# generation, payload length, kind, CRC-32 of the payload, then the payload
+JOURNAL_MAGIC = b"TKJL"
+JOURNAL_RECORD = struct.Struct("<QIBI")
+BINARY_FRAME, TEXT_FRAME = 0, 1
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+class StateStore:
+    """
+    Snapshots and journal of an AlertEngine's state in `directory`.
+
+    record() appends a frame to the journal with a single unbuffered write,
+    so frames survive a crash of the client process. snapshot() writes the
+    whole state through a memory map into the older of the two slots;
+    begin_snapshot() does the same in two steps, so that the slow one can run
+    in another thread while frames keep being recorded.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_paths = [os.path.join(directory, name) for name in SNAPSHOT_FILES]
+        self.journal_paths = [os.path.join(directory, name) for name in JOURNAL_FILES]
+        self.generation = 0  # of the frames being journaled
+        self.stream_position = None  # saved with the loaded snapshot, see begin_snapshot()
+        self._slot = 1  # slot of the latest snapshot; the next one goes to the other
+        self._journal_slot = 1  # slot whose journal frames are appended to
+        self._journals = [None, None]
+        # Held while a snapshot is written, so that writes never overlap
+        self._lock = threading.Lock()
+
+    def restore(self, engine: AlertEngine, apply: Callable[[object], None]) -> Tuple[int, int]:
+        """
+        Loads the latest snapshot into `engine`, then passes each journaled
+        frame of its generation to `apply`, which should process it without
+        sending alerts. Returns the number of tickers restored and of frames
+        replayed. New frames are journaled after the replayed ones.
+        """
+        tickers = 0
+        latest = self._latest_slot()
+        if latest is not None:
+            # The load allocates a tuple per saved tick; collecting while
+            # they are created would rescan them over and over
+            gc.disable()
+            try:
+                tickers = self._load_snapshot(engine, latest)
+            finally:
+                gc.enable()
+
+        self._journal_slot = self._slot
+        frames, end, damaged = self._replay_journal(self._slot, self.generation, apply)
+        if not damaged:
+            # Frames journaled while the next snapshot was written, if the
+            # client stopped before it was complete
+            later, later_end, damaged = self._replay_journal(1 - self._slot, self.generation + 1, apply)
+            if later or damaged:
+                frames += later
+                self.generation += 1
+                self._journal_slot = 1 - self._slot
+                end = later_end
+        if damaged or self._journal_slot != self._slot:
+            # Records of this generation may follow a damaged one, or the
+            # other journal holds frames the latest snapshot needs; start a
+            # new generation so they can never be replayed
+            self.snapshot(engine)
+        else:
+            os.lseek(self._journal(self._slot), end, os.SEEK_SET)
+        return tickers, frames
+
+    def record(self, message):
+        """Appends one received frame (bytes or text) to the journal."""
+        if isinstance(message, str):
+            payload, kind = message.encode(), TEXT_FRAME
+        else:
+            payload, kind = message, BINARY_FRAME
+        header = JOURNAL_RECORD.pack(self.generation, len(payload), kind, zlib.crc32(payload))
+        os.write(self._journal(self._journal_slot), header + payload)
+
+    def snapshot(self, engine: AlertEngine, stream_position: Optional[Tuple[int, int]] = None):
+        """Writes the engine's state as a new generation, whose journal starts empty."""
+        self.begin_snapshot(engine, stream_position)()
+
+    def begin_snapshot(self, engine: AlertEngine, stream_position: Optional[Tuple[int, int]] = None) -> Callable[[], None]:
+        """
+        Copies the engine's state and starts its generation: frames recorded
+        from now on belong to it. Returns the function that writes the
+        snapshot (building its arrays, most of the work), which may run in
+        another thread while frames are recorded. `stream_position`, the
+        client's (stream id, last sequence number), is saved with it and
+        becomes `stream_position` when the snapshot is restored.
+        """
+        with self._lock:
+            generation = self.generation + 1
+            slot = 1 - self._slot
+            # The copies allocate a list per window and no garbage;
+            # collections triggered meanwhile would only rescan the state
+            gc.disable()
+            try:
+                state = self._capture(engine, stream_position)
+            finally:
+                gc.enable()
+            if slot == self._journal_slot:
+                # The previous snapshot was never written, and this slot's
+                # journal holds frames the one before needs: write first,
+                # before any more frames arrive, and only then start over
+                self._write_snapshot(state, generation, self.snapshot_paths[slot])
+                self._slot = slot
+                self._start_journal(slot, generation)
+                return lambda: None
+            self._start_journal(slot, generation)
+
+        def write():
+            with self._lock:
+                self._write_snapshot(state, generation, self.snapshot_paths[slot])
+                self._slot = slot
+        return write
+
+    def close(self, engine: Optional[AlertEngine] = None, stream_position: Optional[Tuple[int, int]] = None):
+        """Takes a final snapshot if `engine` is given, then closes the journals."""
+        if engine is not None:
+            self.snapshot(engine, stream_position)
+        for slot, journal in enumerate(self._journals):
+            if journal is not None:
+                os.close(journal)
+                self._journals[slot] = None
+
+    def _journal(self, slot: int) -> int:
+        if self._journals[slot] is None:
+            self._journals[slot] = os.open(self.journal_paths[slot], os.O_RDWR | os.O_CREAT, 0o644)
+        return self._journals[slot]
+
+    def _start_journal(self, slot: int, generation: int):
+        """Makes `slot`'s journal, overwritten from the start, the one frames of `generation` are recorded to."""
+        journal = self._journal(slot)
+        # Records of older generations left further on end the replay of this one
+        os.pwrite(journal, JOURNAL_MAGIC, 0)
+        os.lseek(journal, len(JOURNAL_MAGIC), os.SEEK_SET)
+        self.generation, self._journal_slot = generation, slot
+
+    def _latest_slot(self) -> Optional[int]:
+        latest, latest_generation = None, -1
+        for slot, path in enumerate(self.snapshot_paths):
+            try:
+                with open(path, "rb") as f:
+                    header = f.read(SNAPSHOT_HEADER.size)
+            except FileNotFoundError:
+                continue
+            if len(header) < SNAPSHOT_HEADER.size:
+                continue
+            magic, version, generation, *_ = SNAPSHOT_HEADER.unpack(header)
+            if magic == SNAPSHOT_MAGIC and version == SNAPSHOT_VERSION and generation > latest_generation:
+                latest, latest_generation = slot, generation
+        return latest
+
+    def _capture(self, engine: AlertEngine, stream_position: Optional[Tuple[int, int]]) -> tuple:
+        """
+        A copy of the engine's state, for _write_snapshot(): the deques are
+        copied as lists, which takes a fraction of the time building the
+        arrays from them does.
+        """
+        tickers = engine.tickers()
+        rules = {}
+        windows, ticks, extremes, states = [], [], [], []
+        for index, ticker in enumerate(tickers):
+            ticker_windows, ticker_states = engine.ticker_state(ticker)
+            for window in ticker_windows:
+                window_ticks, min_ticks, max_ticks, sums = window.dump()
+                windows.append((index, window.window, len(window_ticks), len(min_ticks), len(max_ticks)) + sums)
+                ticks.append(list(window_ticks))
+                extremes.append(list(min_ticks))
+                extremes.append(list(max_ticks))
+            for state in ticker_states:
+                rule = rules.setdefault(state.rule.name, len(rules))
+                states.append((index, rule, state.armed, state.last_fired))
+        return tickers, list(rules), stream_position, windows, ticks, extremes, states
+
+    def _write_snapshot(self, state: tuple, generation: int, path: str):
+        tickers, rules, stream_position, windows, tick_lists, extreme_lists, states = state
+        ticks = [tick for window_ticks in tick_lists for tick in window_ticks]
+        extremes = [extreme for window_extremes in extreme_lists for extreme in window_extremes]
+
+        names = json.dumps({"tickers": tickers, "rules": rules, "stream_position": stream_position}).encode()
+        arrays = [
+            np.array(windows, dtype=WINDOW_DTYPE),
+            np.array(ticks, dtype=TICK_DTYPE),
+            np.array(extremes, dtype=EXTREME_DTYPE),
+            np.array(states, dtype=STATE_DTYPE),
+        ]
+        offset = _aligned(SNAPSHOT_HEADER.size + len(names))
+        offsets = []
+        for array in arrays:
+            offsets.append(offset)
+            offset = _aligned(offset + array.nbytes)
+
+        with open(path, "a+b") as f:
+            # Grown when needed, never shrunk: the header says how much is used
+            size = max(os.fstat(f.fileno()).st_size, offset)
+            f.truncate(size)
+            with mmap.mmap(f.fileno(), size) as mapped:
+                # Invalidate the slot until the new snapshot is complete
+                mapped[:SNAPSHOT_HEADER.size] = bytes(SNAPSHOT_HEADER.size)
+                mapped.flush()
+                mapped[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + len(names)] = names
+                for array, start in zip(arrays, offsets):
+                    mapped[start:start + array.nbytes] = array.tobytes()
+                mapped.flush()
+                SNAPSHOT_HEADER.pack_into(
+                    mapped, 0, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, generation, time.time(), len(names),
+                    *(len(array) for array in arrays),
+                )
+                mapped.flush()
+
+    def _load_snapshot(self, engine: AlertEngine, slot: int) -> int:
+        with open(self.snapshot_paths[slot], "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            _, _, generation, _, names_size, *counts = SNAPSHOT_HEADER.unpack_from(mapped)
+            names = json.loads(mapped[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + names_size])
+            offset = _aligned(SNAPSHOT_HEADER.size + names_size)
+            rows = []
+            for dtype, count in zip((WINDOW_DTYPE, TICK_DTYPE, EXTREME_DTYPE, STATE_DTYPE), counts):
+                array = np.frombuffer(mapped, dtype=dtype, count=count, offset=offset)
+                # Lists of tuples, the deques' own element format, so each
+                # deque below is built by one slice; this also releases the
+                # views on the mapping before it is closed
+                rows.append(array.tolist())
+                offset = _aligned(offset + array.nbytes)
+                del array
+        self.generation, self._slot = generation, slot
+        windows, ticks, extremes, states = rows
+        tickers, rules = names["tickers"], names["rules"]
+        # Absent from snapshots of older versions
+        position = names.get("stream_position")
+        self.stream_position = tuple(position) if position else None
+
+        saved = {}  # ticker index -> {window length: the window's dump() state}
+        tick_start = extreme_start = 0
+        for ticker, length, tick_count, min_count, max_count, *sums in windows:
+            tick_end = tick_start + tick_count
+            min_end = extreme_start + min_count
+            max_end = min_end + max_count
+            saved.setdefault(ticker, {})[length] = (
+                deque(ticks[tick_start:tick_end]),
+                deque(extremes[extreme_start:min_end]),
+                deque(extremes[min_end:max_end]),
+                tuple(sums),
+            )
+            tick_start, extreme_start = tick_end, max_end
+
+        saved_states = {(ticker, rules[rule]): (armed, last_fired) for ticker, rule, armed, last_fired in states}
+        for index, ticker in enumerate(tickers):
+            ticker_windows, ticker_states = engine.ticker_state(ticker)
+            ticker_saved = saved.get(index, {})
+            for window in ticker_windows:
+                state = ticker_saved.get(window.window)
+                if state is not None:
+                    window.load(*state)
+                elif ticker_saved:
+                    # A window length the snapshot does not have (the rules
+                    # changed): rebuild it from the longest saved window
+                    for timestamp, price, quantity in ticker_saved[max(ticker_saved)][0]:
+                        window.add(timestamp, price, quantity)
+            for rule_state in ticker_states:
+                armed, last_fired = saved_states.get((index, rule_state.rule.name), (True, float("-inf")))
+                rule_state.armed, rule_state.last_fired = bool(armed), last_fired
+        return len(tickers)
+
+    def _replay_journal(self, slot: int, replayed: int, apply: Callable[[object], None]) -> Tuple[int, int, bool]:
+        """
+        Applies the frames of generation `replayed` in `slot`'s journal.
+        Returns how many there were, the offset after the last one, and
+        whether the replay stopped at a damaged record rather than at the end of the generation.
+        """
+        journal = self._journal(slot)
+        with open(self.journal_paths[slot], "rb") as f:
+            data = f.read()
+        if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+            os.pwrite(journal, JOURNAL_MAGIC, 0)
+            return 0, len(JOURNAL_MAGIC), False
+        frames = 0
+        offset = len(JOURNAL_MAGIC)
+        while offset + JOURNAL_RECORD.size <= len(data):
+            generation, size, kind, crc = JOURNAL_RECORD.unpack_from(data, offset)
+            if generation != replayed:
+                break
+            start = offset + JOURNAL_RECORD.size
+            payload = data[start:start + size]
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                # Partly written when the machine stopped
+                return frames, offset, True
+            try:
+                apply(payload.decode() if kind == TEXT_FRAME else payload)
+            except Exception as e:
+                print(f"Skipping journaled frame that failed to replay: {e}")
+            frames += 1
+            offset = start + size
+        return frames, offset, False
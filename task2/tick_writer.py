@@ -0,0 +1,226 @@
+
+import io
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import protocol
+
+# The tick table and the database engine come from the task1 trades API
+# (app/models.py, app/database.py), configured by the same DATABASE_URL
+TASK1_DIR = os.getenv("TASK1_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "task1"))
+
+# Flush once this many bytes of frames are buffered, or every TICK_FLUSH_INTERVAL seconds
+TICK_FLUSH_BYTES = int(os.getenv("TICK_FLUSH_BYTES", str(1 << 20)))
+TICK_FLUSH_INTERVAL = float(os.getenv("TICK_FLUSH_INTERVAL", "1.0"))
+# Frames buffered or being written, at most; further frames are dropped
+TICK_BUFFER_BYTES = int(os.getenv("TICK_BUFFER_BYTES", str(64 << 20)))
+
+# NULL in COPY's text format, and the characters it needs escaped
+COPY_NULL = "\\N"
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+# DB-API errors a retry cannot fix: the batch itself is at fault, not the
+# connection. Matched by name, as each driver defines its own classes
+DATA_ERRORS = {"DataError", "IntegrityError", "ProgrammingError", "NotSupportedError"}
+
+def _utc(timestamp_ns: int) -> str:
+    return datetime.fromtimestamp(timestamp_ns / 1e9, timezone.utc).isoformat()
+
+def _json_utc(timestamp: str) -> str:
+    """
+    A JSON tick timestamp in UTC. The server sends them with a UTC offset;
+    naive ones, from servers that predate it, are taken as this machine's
+    local time, as the alert engine reads them too.
+    """
+    parsed = datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return parsed.astimezone(timezone.utc).isoformat()
+
+def _copy_value(value) -> str:
+    """A column value in COPY's text format."""
+    return COPY_NULL if value is None else str(value).translate(COPY_ESCAPES)
+
+def _data_error(error: Exception) -> bool:
+    """Whether a failed write failed on its rows rather than on the database or connection."""
+    # SQLAlchemy wraps the driver's exception in one of its own
+    error = getattr(error, "orig", None) or error
+    return any(cls.__name__ in DATA_ERRORS for cls in type(error).__mro__)
+
+def frame_rows(message) -> List[tuple]:
+    """(ticker, price, quantity, timestamp) rows of one WebSocket frame, binary or JSON."""
+    if isinstance(message, bytes):
+        return [(ticker, price, None, _utc(timestamp_ns)) for ticker, price, timestamp_ns in protocol.decode_batch(message)]
+    data = json.loads(message)
+    return [
+        (update["ticker"], update["price"], update.get("quantity"), _json_utc(update["timestamp"]))
+        for update in (data if isinstance(data, list) else [data])
+    ]
+
+class TickWriter:
+    """
+    Buffers received frames and writes their ticks to the ticks table from a
+    background thread, in one COPY per flush (multi-row INSERTs on drivers
+    other than psycopg2).
+
+    submit() only appends the raw frame; decoding and writing happen on the
+    writer thread. Memory is bounded by `max_buffer_bytes`: while that much is
+    buffered or being written, submit() drops the frame and returns False,
+    and keeps dropping frames (`saturated`) until the backlog is half drained. A slow or
+    unavailable database therefore costs dropped ticks, never a stalled
+    receive loop. Writes that fail on the database or the connection are
+    retried with the batch kept in the buffer; a batch the database rejects
+    (a DataError, say) is dropped and its ticks counted in `rejected_ticks`.
+
+    close() keeps retrying until its timeout; the ticks it could not write by
+    then are counted in `lost_ticks`.
+    """
+
+    def __init__(self, engine=None, flush_bytes: int = TICK_FLUSH_BYTES, flush_interval: float = TICK_FLUSH_INTERVAL,
+                 max_buffer_bytes: int = TICK_BUFFER_BYTES):
+        if TASK1_DIR not in sys.path:
+            sys.path.insert(0, TASK1_DIR)
+        from app.models import Tick
+
+        if engine is None:
+            from app.database import engine
+
+        self.engine = engine
+        self.table = Tick.__table__
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_buffer_bytes = max_buffer_bytes
+        self.saturated = False
+        self.written = 0
+        self.flushes = 0
+        self.dropped_frames = 0
+        self.errors = 0  # failed write attempts
+        self.lost_ticks = 0  # buffered at close() but never written
+        self.rejected_ticks = 0  # in batches the database refused
+        self._pending = []
+        self._pending_bytes = 0
+        self._buffered_bytes = 0  # pending plus the batch being written
+        self._closing = False
+        self._close_deadline = None  # time.monotonic() by which close() gives up, None to wait indefinitely
+        self._in_flight = 0  # ticks of the batch being written
+        self._wakeup = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="tick-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, message) -> bool:
+        """Buffers one frame. Returns False, without blocking, if the buffer is full."""
+        size = len(message)
+        with self._wakeup:
+            if self.saturated or self._buffered_bytes + size > self.max_buffer_bytes:
+                self.saturated = True
+                self.dropped_frames += 1
+                return False
+            self._pending.append(message)
+            self._pending_bytes += size
+            self._buffered_bytes += size
+            if self._pending_bytes >= self.flush_bytes:
+                self._wakeup.notify()
+        return True
+
+    def _run(self):
+        retry_delay = 0.0
+        while True:
+            with self._wakeup:
+                if not self._closing:
+                    self._wakeup.wait_for(
+                        lambda: self._closing or self._pending_bytes >= self.flush_bytes,
+                        timeout=self.flush_interval,
+                    )
+                if not self._pending:
+                    if self._closing:
+                        return
+                    continue
+                batch, batch_bytes = self._pending, self._pending_bytes
+                self._pending, self._pending_bytes = [], 0
+            rows = []
+            for message in batch:
+                try:
+                    rows += frame_rows(message)
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Tick writer: skipping undecodable frame ({e})")
+            self._in_flight = len(rows)
+            written = True
+            while True:
+                try:
+                    self._write(rows)
+                    break
+                except Exception as e:
+                    self.errors += 1
+                    if _data_error(e):
+                        # Retrying would fail again and hold up every later frame
+                        print(f"Tick writer: database rejected {len(rows)} ticks ({e}); dropping them")
+                        self.rejected_ticks += len(rows)
+                        written = False
+                        break
+                    retry_delay = min(max(retry_delay * 2, 0.5), 30.0)
+                    with self._wakeup:
+                        if self._closing and self._close_deadline is not None:
+                            retry_delay = min(retry_delay, self._close_deadline - time.monotonic())
+                            if retry_delay <= 0:
+                                self._give_up()
+                                return
+                        print(f"Tick writer: failed to write {len(rows)} ticks ({e}); retrying in {retry_delay:.1f}s")
+                        # close() cuts the wait short, for one more attempt before its deadline
+                        self._wakeup.wait(retry_delay)
+            retry_delay = 0.0
+            if written:
+                self.written += len(rows)
+                self.flushes += 1
+            with self._wakeup:
+                self._in_flight = 0
+                self._buffered_bytes -= batch_bytes
+                if self.saturated and self._buffered_bytes <= self.max_buffer_bytes // 2:
+                    self.saturated = False
+
+    def _write(self, rows: List[tuple]):
+        with self.engine.begin() as conn:
+            if self.engine.dialect.driver == "psycopg2":
+                data = io.StringIO()
+                for ticker, price, quantity, timestamp in rows:
+                    data.write(f"{_copy_value(ticker)}\t{_copy_value(price)}\t{_copy_value(quantity)}\t{_copy_value(timestamp)}\n")
+                data.seek(0)
+                cursor = conn.connection.driver_connection.cursor()
+                cursor.copy_expert("COPY ticks (ticker, price, quantity, timestamp) FROM STDIN", data)
+            else:
+                conn.execute(self.table.insert(), [
+                    {"ticker": ticker, "price": price, "quantity": quantity, "timestamp": datetime.fromisoformat(timestamp)}
+                    for ticker, price, quantity, timestamp in rows
+                ])
+
+    def _give_up(self):
+        """Counts the batch being written and everything still buffered as lost. Called holding _wakeup."""
+        lost = self._in_flight
+        for message in self._pending:
+            try:
+                lost += len(frame_rows(message))
+            except (ValueError, KeyError, TypeError):
+                pass
+        self.lost_ticks += lost
+        self._in_flight, self._pending, self._pending_bytes = 0, [], 0
+        if lost:
+            print(f"Tick writer: {lost} ticks lost, the database was unavailable until close")
+
+    def close(self, timeout: Optional[float] = None):
+        """
+        Writes whatever is buffered, then stops the writer thread. While the
+        database is unavailable, retries for up to `timeout` seconds.
+        """
+        with self._wakeup:
+            self._closing = True
+            if timeout is not None:
+                self._close_deadline = time.monotonic() + timeout
+            self._wakeup.notify()
+        self._thread.join(timeout)
+        with self._wakeup:
+            if self._thread.is_alive():
+                # Stuck in a write past the deadline; the daemon thread dies with the process
+                self._give_up()
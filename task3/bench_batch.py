@@ -0,0 +1,101 @@
+
+"""
+Benchmark: batch mode of lambda_simulation.py over a synthetic year of trades.
+
+Writes --days days of --files-per-day trade files each under a temporary
+simulated bucket, then analyzes the whole range with each --workers count and
+reports the wall time. Every run must produce the same reports, and the
+range-level VWAP must match one computed directly from all generated trades.
+
+    python bench_batch.py --days 365 --files-per-day 4 --trades-per-file 2000 --workers 1,2,4
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from lambda_simulation import analyze_date_range, date_directory
+
+def write_year(base_path, start_date, days, files_per_day, trades_per_file, tickers, seed):
+    """Writes the synthetic trade files; returns the exact per-ticker volume and value of all of them."""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"T{i:04d}" for i in range(tickers)])
+    base_prices = rng.uniform(10, 1000, tickers)
+    volume = np.zeros(tickers)
+    value = np.zeros(tickers)
+    start_obj = datetime.strptime(start_date, '%Y-%m-%d')
+    for day in range(days):
+        date_obj = start_obj + timedelta(days=day)
+        directory = date_directory(base_path, date_obj)
+        os.makedirs(directory, exist_ok=True)
+        for part in range(files_per_day):
+            indexes = rng.integers(0, tickers, trades_per_file)
+            prices = np.round(base_prices[indexes] * rng.uniform(0.95, 1.05, trades_per_file), 2)
+            quantities = rng.integers(1, 500, trades_per_file)
+            seconds = np.sort(rng.integers(0, 86_400, trades_per_file))
+            timestamps = np.datetime64(date_obj.strftime('%Y-%m-%d')) + seconds.astype('timedelta64[s]')
+            pd.DataFrame({
+                'ticker': names[indexes],
+                'price': prices,
+                'quantity': quantities,
+                'side': np.where(rng.random(trades_per_file) < 0.5, 'buy', 'sell'),
+                'timestamp': np.datetime_as_string(timestamps) + 'Z',
+            }).to_csv(os.path.join(directory, f"trades-{part:02d}.csv"), index=False)
+            np.add.at(volume, indexes, quantities)
+            np.add.at(value, indexes, prices * quantities)
+    return pd.DataFrame({'ticker': names, 'expected_volume': volume, 'expected_vwap': value / volume})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start-date", default="2024-01-01")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--files-per-day", type=int, default=4)
+    parser.add_argument("--trades-per-file", type=int, default=2000)
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to compare")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    end_date = (datetime.strptime(args.start_date, '%Y-%m-%d') + timedelta(days=args.days - 1)).strftime('%Y-%m-%d')
+    base_path = tempfile.mkdtemp(prefix="simulated_s3_")
+    try:
+        started = time.perf_counter()
+        expected = write_year(base_path, args.start_date, args.days, args.files_per_day, args.trades_per_file,
+                              args.tickers, args.seed)
+        files = args.days * args.files_per_day
+        trades = files * args.trades_per_file
+        print(f"Wrote {files:,} files, {trades:,} trades in {time.perf_counter() - started:.1f}s "
+              f"({args.start_date} to {end_date}, {os.cpu_count()} CPUs)")
+
+        baseline = None
+        for workers in [int(count) for count in args.workers.split(",")]:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                daily_reports, range_report = analyze_date_range(base_path, args.start_date, end_date, workers)
+            elapsed = time.perf_counter() - started
+            reports = (
+                {date: report.to_csv(index=False) for date, report in daily_reports.items()},
+                range_report.to_csv(index=False),
+            )
+            if baseline is None:
+                baseline = reports
+                merged = range_report.merge(expected, on='ticker')
+                # Sums in a different order can move a VWAP across a rounding boundary
+                correct = (len(merged) == args.tickers
+                           and (merged['total_volume'] == merged['expected_volume']).all()
+                           and np.allclose(merged['average_price'], merged['expected_vwap'], atol=0.0051))
+                print(f"range VWAP matches the generated trades: {correct}")
+            print(f"{workers} workers: {elapsed:.2f}s, {files / elapsed:,.0f} files/s, {trades / elapsed:,.0f} trades/s, "
+                  f"same reports: {reports == baseline}")
+    finally:
+        shutil.rmtree(base_path)
+
+if __name__ == "__main__":
+    main()
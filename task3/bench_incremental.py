@@ -0,0 +1,101 @@
+
+"""
+Benchmark: incremental re-analysis (INCREMENTAL_ANALYSIS in lambda_simulation.py)
+of a synthetic range of trade files.
+
+Writes --days days of --files-per-day trade files each, then times the batch
+mode with a fresh manifest, again with nothing changed, and again after
+--appended-files files have had --appended-trades trades appended, as late
+intraday updates would. Then the same files lose their final newline, and
+get it back with more trades after it. Each incremental run must give the
+same reports as reading every file in full.
+
+    python bench_incremental.py --days 90 --files-per-day 4 --trades-per-file 50000
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from bench_batch import write_year
+from lambda_simulation import analyze_date_range, find_trade_files
+from manifest import Manifest
+from storage import open_store
+
+def analyze(base_path, start_date, end_date, workers, manifest):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        daily_reports, range_report = analyze_date_range(base_path, start_date, end_date, workers, manifest=manifest)
+    elapsed = time.perf_counter() - started
+    return elapsed, ({date: report.to_csv(index=False) for date, report in daily_reports.items()},
+                     range_report.to_csv(index=False))
+
+def same_reports(first, second):
+    """Whether two runs' reports match: volumes exactly, VWAPs to the cent, as sums in a different order can round differently."""
+    for csv_first, csv_second in [*zip(first[0].values(), second[0].values()), (first[1], second[1])]:
+        a, b = pd.read_csv(io.StringIO(csv_first)), pd.read_csv(io.StringIO(csv_second))
+        if (len(a) != len(b) or not (a['ticker'] == b['ticker']).all() or not (a['total_volume'] == b['total_volume']).all()
+                or (a['average_price'] - b['average_price']).abs().max() > 0.0101):
+            return False
+    return first[0].keys() == second[0].keys()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start-date", default="2024-01-01")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--files-per-day", type=int, default=4)
+    parser.add_argument("--trades-per-file", type=int, default=50_000)
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--appended-files", type=int, default=4)
+    parser.add_argument("--appended-trades", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    end_date = (datetime.strptime(args.start_date, '%Y-%m-%d') + timedelta(days=args.days - 1)).strftime('%Y-%m-%d')
+    base_path = tempfile.mkdtemp(prefix="simulated_s3_")
+    try:
+        write_year(base_path, args.start_date, args.days, args.files_per_day, args.trades_per_file, args.tickers, args.seed)
+        print(f"Wrote {args.days * args.files_per_day:,} files, {args.days * args.files_per_day * args.trades_per_file:,} trades")
+
+        def incremental(label):
+            manifest = Manifest(open_store(base_path))
+            elapsed, reports = analyze(base_path, args.start_date, end_date, args.workers, manifest)
+            manifest.save()
+            full_elapsed, full_reports = analyze(base_path, args.start_date, end_date, args.workers, None)
+            print(f"{label}: {elapsed:.2f}s incremental, {full_elapsed:.2f}s reading every file, "
+                  f"same reports: {same_reports(reports, full_reports)}")
+
+        incremental("first run")
+        incremental("re-run, nothing changed")
+        # The last date's files get more trades, copied from their own first lines
+        appended_paths = find_trade_files(base_path, end_date)[-args.appended_files:]
+        for path in appended_paths:
+            with open(path) as f:
+                lines = f.readlines()[1:args.appended_trades + 1]
+            with open(path, 'a') as f:
+                f.writelines(lines)
+        incremental(f"{args.appended_files} files with {args.appended_trades} trades appended")
+        # A last trade without its newline is counted, and read again once the line is complete
+        for path in appended_paths:
+            with open(path, 'rb+') as f:
+                f.truncate(os.path.getsize(path) - 1)
+        incremental(f"{args.appended_files} files without a final newline")
+        for path in appended_paths:
+            with open(path) as f:
+                lines = f.readlines()[1:args.appended_trades + 1]
+            with open(path, 'a') as f:
+                f.write('\n')
+                f.writelines(lines)
+        incremental(f"{args.appended_files} files with their last line completed and {args.appended_trades} more trades")
+    finally:
+        shutil.rmtree(base_path)
+
+if __name__ == "__main__":
+    main()
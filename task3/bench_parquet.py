@@ -0,0 +1,67 @@
+
+"""
+Benchmark: scan times of the same trades as CSV and as Parquet
+(convert_to_parquet.py), analyzed in full and for a few tickers.
+
+Writes a --rows trade file, converts it, then times read_trade_aggregates()
+on each format with no ticker filter and with --filter-tickers tickers. The
+CSV has to be parsed whole either way; Parquet reads only the analyzed
+columns, and with the filter only the row groups whose ticker range can
+match. Each format must give the same report.
+
+    python bench_parquet.py --rows 10000000 --tickers 500 --filter-tickers 3
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+from bench_streaming import write_trades
+from convert_to_parquet import ROW_GROUP_ROWS, convert_trade_file
+from lambda_simulation import ANALYSIS_CHUNK_ROWS, build_report, read_trade_aggregates
+
+def timed(path, tickers, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        aggregates, trades = read_trade_aggregates(path, ANALYSIS_CHUNK_ROWS, tickers)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, trades, build_report(aggregates).to_csv(index=False)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--filter-tickers", type=int, default=3, help="Tickers analyzed in the filtered runs")
+    parser.add_argument("--row-group-rows", type=int, default=ROW_GROUP_ROWS)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_parquet_")
+    try:
+        csv_path = os.path.join(directory, 'trades.csv')
+        write_trades(csv_path, args.rows, args.tickers, args.seed)
+        started = time.perf_counter()
+        parquet_path, _ = convert_trade_file(csv_path, row_group_rows=args.row_group_rows)
+        metadata = pq.ParquetFile(parquet_path).metadata
+        print(f"{args.rows:,} trades: CSV {os.path.getsize(csv_path) / 1e6:,.0f} MB, Parquet "
+              f"{os.path.getsize(parquet_path) / 1e6:,.0f} MB in {metadata.num_row_groups} row groups "
+              f"(converted in {time.perf_counter() - started:.1f}s)")
+
+        # Spread over the ticker range, so they fall in different row groups
+        tickers = [f"T{i:04d}" for i in range(0, args.tickers, max(1, args.tickers // args.filter_tickers))][:args.filter_tickers]
+        for label, filter_tickers in (("all tickers", None), (f"{len(tickers)} tickers", tickers)):
+            csv_seconds, trades, csv_report = timed(csv_path, filter_tickers, args.repeat)
+            parquet_seconds, _, parquet_report = timed(parquet_path, filter_tickers, args.repeat)
+            print(f"{label} ({trades:,} trades): CSV {csv_seconds:.2f}s, Parquet {parquet_seconds:.2f}s "
+                  f"({csv_seconds / parquet_seconds:.1f}x), same report: {csv_report == parquet_report}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
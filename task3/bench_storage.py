@@ -0,0 +1,124 @@
+
+"""
+Benchmark: throughput of many small trade files through the object stores of
+storage.py, moved one at a time and STORAGE_IO_WORKERS-style concurrently.
+
+Uploads --files objects of about --file-bytes bytes each, lists them, and
+downloads them back, with each --workers count, and checks that every
+download matches what was uploaded. --location is a local directory (the
+default, a temporary one) or an s3:// URL; with --moto, an S3 bucket on a
+moto server started for the benchmark. --latency-ms adds a delay to every S3
+request, as a stand-in for the round trip to AWS, which a local server does
+not have.
+
+    python bench_storage.py --moto --files 2000 --workers 1,4,16,64 --latency-ms 20
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from storage import LocalStore, S3Store
+
+def trade_files(count, size, seed):
+    """{key: CSV bytes} of `count` small trade files, a few per date prefix."""
+    rng = np.random.default_rng(seed)
+    rows = max(1, size // 40)
+    files = {}
+    for index in range(count):
+        lines = [f"T{ticker:04d},{price:.2f},{quantity},buy,2025-06-05T00:00:00Z"
+                 for ticker, price, quantity in zip(rng.integers(0, 500, rows), rng.uniform(10, 1000, rows),
+                                                    rng.integers(1, 500, rows))]
+        files[f"2025/{1 + index // 280 % 12:02d}/{1 + index // 10 % 28:02d}/trades-{index:05d}.csv"] = (
+            'ticker,price,quantity,side,timestamp\n' + '\n'.join(lines) + '\n').encode()
+    return files
+
+def start_moto():
+    """A moto server on a free port, and its endpoint URL."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, '-m', 'moto.server', '-p', str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return server, f"http://127.0.0.1:{port}"
+
+def open_bench_store(location, endpoint_url, pool_size, latency):
+    if not location.startswith('s3://'):
+        return LocalStore(location)
+    bucket, _, prefix = location[len('s3://'):].partition('/')
+    store = S3Store(bucket, prefix, endpoint_url=endpoint_url, pool_size=pool_size)
+    if latency:
+        store.client.meta.events.register('before-send.s3', lambda **kwargs: time.sleep(latency))
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--location", help="Local directory or s3:// URL to write under; S3 objects are left there (default: a temporary directory)")
+    parser.add_argument("--moto", action="store_true", help="Use a bucket on a moto server started for the benchmark")
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--file-bytes", type=int, default=20_000)
+    parser.add_argument("--workers", default="1,4,16,64", help="Comma-separated worker counts to compare")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every S3 request")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server = None
+    endpoint_url = os.getenv('S3_ENDPOINT_URL')
+    directory = tempfile.mkdtemp(prefix="bench_storage_")
+    try:
+        location = args.location or os.path.join(directory, 'bucket')
+        if args.moto:
+            import boto3
+
+            os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+            os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+            os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+            server, endpoint_url = start_moto()
+            boto3.client('s3', endpoint_url=endpoint_url).create_bucket(Bucket='bench-trades')
+            location = 's3://bench-trades/storage'
+        files = trade_files(args.files, args.file_bytes, args.seed)
+        total_bytes = sum(len(data) for data in files.values())
+        print(f"{len(files):,} files, {total_bytes / 1e6:,.1f} MB, at {location}"
+              + (f", {args.latency_ms:g} ms added per request" if args.latency_ms else ""))
+
+        worker_counts = [int(count) for count in args.workers.split(",")]
+        for workers in worker_counts:
+            store = open_bench_store(f"{location}/{workers}", endpoint_url, max(worker_counts), args.latency_ms / 1000)
+            started = time.perf_counter()
+            store.write_many(files.items(), workers)
+            upload_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            keys = [info.key for info in store.list()]
+            list_seconds = time.perf_counter() - started
+
+            download_directory = os.path.join(directory, f"download_{workers}")
+            started = time.perf_counter()
+            paths = store.download_many(keys, download_directory, workers)
+            download_seconds = time.perf_counter() - started
+            identical = sorted(keys) == sorted(files) and all(
+                open(path, 'rb').read() == files[key] for key, path in zip(keys, paths))
+            shutil.rmtree(download_directory)
+            print(f"{workers} workers: upload {len(files) / upload_seconds:,.0f} files/s, "
+                  f"list {list_seconds:.2f}s, download {len(files) / download_seconds:,.0f} files/s "
+                  f"({total_bytes / download_seconds / 1e6:,.1f} MB/s), identical: {identical}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+
+"""
+Benchmark: peak memory and throughput of analyzing one large trade file whole
+and in chunks (ANALYSIS_CHUNK_ROWS in lambda_simulation.py).
+
+Writes a --rows trade file (about 40 bytes a row, so the default is about
+2 GB), then analyzes it in a fresh process for each --chunk-rows value,
+where 0 reads the file whole as before. Reports wall time, throughput and
+peak RSS of each run, and checks that every report is byte-identical to the
+first one. A run that runs out of memory is reported as failed.
+
+    python bench_streaming.py --rows 50000000 --chunk-rows 0,1000000,100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+def write_trades(path, rows, tickers, seed, block_rows=1_000_000):
+    rng = np.random.default_rng(seed)
+    names = np.array([f"T{i:04d}" for i in range(tickers)])
+    base_prices = rng.uniform(10, 1000, tickers)
+    start = np.datetime64('2025-06-05T00:00:00')
+    with open(path, 'w') as f:
+        f.write('ticker,price,quantity,side,timestamp\n')
+        for offset in range(0, rows, block_rows):
+            count = min(block_rows, rows - offset)
+            indexes = rng.integers(0, tickers, count)
+            seconds = (offset + np.arange(count)) * 86_400 // rows
+            pd.DataFrame({
+                'ticker': names[indexes],
+                'price': np.round(base_prices[indexes] * rng.uniform(0.95, 1.05, count), 2),
+                'quantity': rng.integers(1, 500, count),
+                'side': np.where(rng.random(count) < 0.5, 'buy', 'sell'),
+                'timestamp': np.datetime_as_string(start + seconds.astype('timedelta64[s]')) + 'Z',
+            }).to_csv(f, header=False, index=False)
+
+def peak_rss_mb():
+    """This process's peak resident memory. Unlike ru_maxrss, VmHWM does not carry over the parent's peak from before exec."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+def measure(path, chunk_rows, output):
+    """Runs in the child process: analyzes `path` and prints its time and peak RSS as JSON."""
+    from lambda_simulation import build_report, read_trade_aggregates
+
+    started = time.perf_counter()
+    aggregates, trades = read_trade_aggregates(path, chunk_rows)
+    build_report(aggregates).to_csv(output, index=False)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({'seconds': elapsed, 'trades': trades, 'peak_rss_mb': peak_rss_mb()}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--chunk-rows", default="0,1000000,100000", help="Comma-separated chunk sizes; 0 reads whole")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--measure", nargs=3, metavar=("PATH", "CHUNK_ROWS", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        path, chunk_rows, output = args.measure
+        measure(path, int(chunk_rows), output)
+        return
+
+    directory = tempfile.mkdtemp(prefix="bench_streaming_")
+    path = os.path.join(directory, 'trades.csv')
+    try:
+        started = time.perf_counter()
+        write_trades(path, args.rows, args.tickers, args.seed)
+        size = os.path.getsize(path)
+        print(f"Wrote {args.rows:,} trades, {size / 1e9:.2f} GB, in {time.perf_counter() - started:.0f}s")
+
+        baseline = None
+        for chunk_rows in [int(value) for value in args.chunk_rows.split(",")]:
+            label = "whole file" if chunk_rows == 0 else f"{chunk_rows:,}-row chunks"
+            output = os.path.join(directory, f"analysis_{chunk_rows}.csv")
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", path, str(chunk_rows), output],
+                                    capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            if result.returncode != 0:
+                print(f"{label}: failed (exit code {result.returncode}, killed for memory if negative)")
+                continue
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            with open(output, 'rb') as f:
+                report = f.read()
+            if baseline is None:
+                baseline = report
+            print(f"{label}: {stats['seconds']:.1f}s, {stats['trades'] / stats['seconds']:,.0f} trades/s, "
+                  f"{size / stats['seconds'] / 1e6:,.0f} MB/s, peak RSS {stats['peak_rss_mb']:,.0f} MB, "
+                  f"identical report: {report == baseline}")
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+if __name__ == "__main__":
+    main()
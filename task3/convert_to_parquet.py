@@ -0,0 +1,129 @@
+
+"""
+Converts the CSV trade files of the simulated S3 bucket to Parquet, next to
+them (trades.csv -> trades.parquet); lambda_simulation.py then reads the
+Parquet file in place of the CSV one.
+
+Each file is converted --chunk-rows rows at a time. The rows of a chunk are
+sorted by ticker and written as row groups of at most --row-group-rows rows,
+so every row group covers a narrow range of tickers, recorded in its
+statistics, and a ticker filter can skip the others. Files whose Parquet
+version is newer than the CSV are skipped unless --force is given.
+
+    python convert_to_parquet.py --bucket simulated_s3
+    python convert_to_parquet.py --start-date 2025-06-01 --end-date 2025-06-30 --delete-csv
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lambda_simulation import SIMULATED_S3_BUCKET_PATH, date_directory, dates_in_range
+
+# Row groups are the unit a ticker filter can skip: smaller ones skip more
+# precisely, larger ones scan faster
+ROW_GROUP_ROWS = 65_536
+
+class SchemaChanged(Exception):
+    """A chunk's inferred column types differ from the file's earlier chunks."""
+
+    def __init__(self, dtypes):
+        super().__init__(dtypes)
+        self.dtypes = dtypes
+
+def _widened(first: pa.DataType, other: pa.DataType) -> str:
+    """A pandas dtype that holds the values of both column types."""
+    if pa.types.is_integer(first) and pa.types.is_floating(other) or pa.types.is_floating(first) and pa.types.is_integer(other):
+        return 'float64'
+    return 'str'
+
+def _write_chunks(csv_path, output_path, dtypes, chunk_rows, row_group_rows):
+    writer = None
+    rows = 0
+    try:
+        with pd.read_csv(csv_path, dtype=dtypes, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                table = pa.Table.from_pandas(chunk.sort_values('ticker', kind='stable'), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                elif not table.schema.equals(writer.schema):
+                    changed = {
+                        field.name: _widened(writer.schema.field(field.name).type, field.type)
+                        for field in table.schema if field.type != writer.schema.field(field.name).type
+                    }
+                    raise SchemaChanged(changed)
+                writer.write_table(table, row_group_size=row_group_rows)
+                rows += len(chunk)
+        if writer is None:
+            # A header without rows
+            empty = pd.read_csv(csv_path, dtype=dtypes, nrows=0)
+            writer = pq.ParquetWriter(output_path, pa.Schema.from_pandas(empty, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def convert_trade_file(csv_path, chunk_rows=1_000_000, row_group_rows=ROW_GROUP_ROWS):
+    """Writes the Parquet version of one CSV trade file; returns its path and number of rows."""
+    parquet_path = os.path.splitext(csv_path)[0] + '.parquet'
+    # Written under another name first, so a partly written file is never
+    # mistaken for a trade file
+    temporary_path = parquet_path + '.tmp'
+    dtypes = {'ticker': 'str', 'price': 'float64'}
+    while True:
+        try:
+            rows = _write_chunks(csv_path, temporary_path, dtypes, chunk_rows, row_group_rows)
+            break
+        except SchemaChanged as e:
+            # Say quantity was all integers in the first chunk and has decimals
+            # in a later one: start over with the wider type
+            if all(dtypes.get(column) == dtype for column, dtype in e.dtypes.items()):
+                raise ValueError(f"Inconsistent column types in {csv_path}: {e.dtypes}")
+            dtypes.update(e.dtypes)
+    os.replace(temporary_path, parquet_path)
+    return parquet_path, rows
+
+def csv_trade_files(bucket, start_date=None, end_date=None):
+    """The CSV files under the given dates' prefixes of the bucket, or anywhere in it without dates."""
+    if start_date:
+        directories = [date_directory(bucket, datetime.strptime(date, '%Y-%m-%d'))
+                       for date in dates_in_range(start_date, end_date or start_date)]
+    else:
+        directories = [directory for directory, _, _ in os.walk(bucket)]
+    return sorted(os.path.join(directory, name) for directory in directories if os.path.isdir(directory)
+                  for name in os.listdir(directory) if name.endswith('.csv'))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bucket", default=SIMULATED_S3_BUCKET_PATH, help="Simulated S3 bucket directory")
+    parser.add_argument("--start-date", help="First date to convert (default: every CSV file in the bucket)")
+    parser.add_argument("--end-date", help="Last date to convert (default: --start-date)")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--row-group-rows", type=int, default=ROW_GROUP_ROWS)
+    parser.add_argument("--delete-csv", action="store_true", help="Delete each CSV file once converted")
+    parser.add_argument("--force", action="store_true", help="Convert files that already have an up-to-date Parquet version")
+    args = parser.parse_args()
+    if args.bucket.startswith('s3://'):
+        parser.error("only local buckets can be converted; convert a local copy and upload it")
+
+    converted = skipped = 0
+    for csv_path in csv_trade_files(args.bucket, args.start_date, args.end_date):
+        parquet_path = os.path.splitext(csv_path)[0] + '.parquet'
+        if not args.force and os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+            skipped += 1
+            continue
+        started = time.perf_counter()
+        parquet_path, rows = convert_trade_file(csv_path, args.chunk_rows, args.row_group_rows)
+        print(f"{csv_path}: {rows:,} rows, {os.path.getsize(csv_path) / 1e6:,.1f} MB CSV -> "
+              f"{os.path.getsize(parquet_path) / 1e6:,.1f} MB Parquet in {time.perf_counter() - started:.1f}s")
+        if args.delete_csv:
+            os.remove(csv_path)
+        converted += 1
+    print(f"Converted {converted} files, skipped {skipped} up to date")
+
+if __name__ == "__main__":
+    main()
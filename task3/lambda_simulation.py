@@ -1,30 +1,88 @@
 
-import csv
+import contextlib
+import hashlib
+import io
 import os
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from urllib.parse import urlencode
 from collections import defaultdict
 import pandas as pd
 
+from manifest import (MANIFEST_FILE, HashingRange, Manifest, aggregates_from_json, aggregates_to_json,
+                      complete_lines_end, hash_prefix)
+from storage import ObjectInfo, local_copies, local_copy, open_store, split_location
+
 # Simulate environment variables or context that Lambda might receive
 # In a real Lambda, these might come from the event payload or environment variables
-SIMULATED_S3_BUCKET_PATH = '/home/ubuntu/task3_aws_lambda/simulated_s3'
-SIMULATED_S3_OUTPUT_PATH = '/home/ubuntu/task3_aws_lambda/simulated_s3_output'
+# Trade files are read from TRADES_BUCKET and results saved to RESULTS_BUCKET:
+# local directories simulating S3 (by default next to this script) or s3://
+# URLs, e.g. TRADES_BUCKET=s3://market-data/trades (see storage.py)
+SIMULATED_S3_BUCKET_PATH = os.getenv('TRADES_BUCKET', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simulated_s3'))
+SIMULATED_S3_OUTPUT_PATH = os.getenv('RESULTS_BUCKET', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simulated_s3_output'))
 TARGET_DATE_STR = os.getenv('TARGET_DATE', '2025-06-05') # Default to the date we created data for
+# When set (e.g. http://localhost:8000), trades are streamed from the trades API's
+# /trades/export endpoint instead of being read from a pre-dumped trades.csv
+TRADES_API_URL = os.getenv('TRADES_API_URL')
+# Batch mode: with START_DATE and END_DATE (or "start_date" and "end_date" in the
+# event), every trade file of every date in the range is analyzed, spread over
+# ANALYSIS_WORKERS processes, and daily plus range-level results are saved
+START_DATE_STR = os.getenv('START_DATE')
+END_DATE_STR = os.getenv('END_DATE')
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', str(os.cpu_count() or 1)))
+# Trade files are read ANALYSIS_CHUNK_ROWS rows at a time and folded into running
+# per-ticker sums, so memory is bounded by the chunk size rather than the file
+# size; 0 reads each file whole
+ANALYSIS_CHUNK_ROWS = int(os.getenv('ANALYSIS_CHUNK_ROWS', '1000000'))
+# Only the columns the analysis uses are kept. quantity is left to pandas' type
+# inference, which decides whether volumes are reported as integers
+TRADE_COLUMNS = ['ticker', 'price', 'quantity']
+TRADE_DTYPES = {'ticker': 'category', 'price': 'float64'}
+# Trade files are CSV or Parquet (see convert_to_parquet.py); a Parquet file
+# replaces the CSV file of the same name as long as it is at least as new. A
+# CSV file modified after its conversion (e.g. appended to) is read instead of
+# the stale Parquet file, by the same mtime rule convert_to_parquet.py uses to
+# decide what to convert again. Parquet reads only the analyzed columns, and
+# with a ticker filter only the row groups whose ticker range can match, so
+# analyzing a few tickers reads a fraction of the file
+# Comma-separated tickers to analyze (default: all), e.g. ANALYSIS_TICKERS=AAPL,MSFT,
+# or "tickers" in the event
+ANALYSIS_TICKERS = os.getenv('ANALYSIS_TICKERS')
+# Formats the analysis results are saved in: csv, parquet, or both (csv,parquet)
+ANALYSIS_OUTPUT_FORMATS = os.getenv('ANALYSIS_OUTPUT_FORMATS', 'csv').split(',')
+# Re-runs reuse the partial aggregates of the trade files analyzed before,
+# recorded in a manifest in SIMULATED_S3_OUTPUT_PATH (see manifest.py): an
+# unchanged file is not read again, and a CSV file that has only been appended
+# to has just its new trades read. INCREMENTAL_ANALYSIS=false reads every file
+INCREMENTAL_ANALYSIS = os.getenv('INCREMENTAL_ANALYSIS', 'true').lower() in ('1', 'true', 'yes')
+
+def date_prefix(date_obj):
+    """The S3 key prefix of one date: YYYY/MM/DD."""
+    return f"{date_obj.year}/{date_obj.month:02d}/{date_obj.day:02d}"
+
+def date_directory(base_path, date_obj):
+    """The simulated S3 prefix of one date: <base>/YYYY/MM/DD."""
+    return os.path.join(base_path, *date_prefix(date_obj).split('/'))
 
 def find_latest_trade_file(base_path, target_date):
-    """Simulates finding the relevant trade file in S3 for a given date."""
+    """Simulates finding the relevant trade file in S3 for a given date; returns its path or s3:// URL."""
     try:
         date_obj = datetime.strptime(target_date, '%Y-%m-%d')
-        file_path = os.path.join(base_path, str(date_obj.year), f"{date_obj.month:02d}", f"{date_obj.day:02d}", 'trades.csv')
+        store = open_store(base_path)
+        prefix = f"{date_prefix(date_obj)}/"
+        key = f"{prefix}trades.csv"
         
         # In a real scenario with multiple files per day (e.g., timestamped),
         # you would list objects and find the latest one.
-        # For this simulation, we assume one file named 'trades.csv'.
-        if os.path.exists(file_path):
-            print(f"Found trade file: {file_path}")
-            return file_path
+        # For this simulation, we assume one file named 'trades.csv', or
+        # 'trades.parquet' once converted (and not modified since).
+        files = current_trade_files(store.list(prefix), prefix)
+        if 'trades' in files:
+            print(f"Found trade file: {store.location(files['trades'].key)}")
+            return store.location(files['trades'].key)
         else:
-            print(f"Trade file not found for date {target_date} at {file_path}")
+            print(f"Trade file not found for date {target_date} at {store.location(key)}")
             return None
     except ValueError:
         print(f"Invalid date format: {target_date}. Please use YYYY-MM-DD.")
@@ -33,34 +91,99 @@ def find_latest_trade_file(base_path, target_date):
         print(f"Error finding trade file: {e}")
         return None
 
-def analyze_trade_data(file_path):
-    """Reads trade data from CSV and calculates volume and average price per stock."""
-    if not file_path:
-        return None
+def current_trade_files(objects, prefix):
+    """
+    The trade files (*.csv, *.parquet) directly under `prefix` among listed
+    ObjectInfo, by name without extension. Of a CSV and Parquet file of the
+    same name, the Parquet one unless the CSV file is newer.
+    """
+    files = {}
+    for info in objects:
+        stem, extension = os.path.splitext(info.key[len(prefix):])
+        if '/' in stem or extension not in ('.csv', '.parquet'):
+            continue
+        other = files.get(stem)
+        if other is None:
+            files[stem] = info
+        else:
+            csv_info, parquet_info = (info, other) if extension == '.csv' else (other, info)
+            files[stem] = parquet_info if parquet_info.mtime_ns >= csv_info.mtime_ns else csv_info
+    return files
 
-    try:
-        df = pd.read_csv(file_path)
-        print(f"Read {len(df)} trades from {file_path}")
+def list_trade_objects(store, target_date):
+    """
+    Lists every trade file directly under a date's prefix of a store, as
+    ObjectInfo in name order (see current_trade_files).
+    """
+    prefix = f"{date_prefix(datetime.strptime(target_date, '%Y-%m-%d'))}/"
+    return [info for _, info in sorted(current_trade_files(store.list(prefix), prefix).items())]
+
+def find_trade_files(base_path, target_date):
+    """Simulates listing every trade file under a date's prefix in S3 (see list_trade_objects); returns their paths or s3:// URLs."""
+    store = open_store(base_path)
+    return [store.location(info.key) for info in list_trade_objects(store, target_date)]
+
+def parse_tickers(tickers):
+    """A ticker filter from a comma-separated string or a list; None for all tickers."""
+    if isinstance(tickers, str):
+        tickers = [ticker.strip() for ticker in tickers.split(',')]
+    tickers = [ticker for ticker in tickers or [] if ticker]
+    return tickers or None
 
-        # Ensure correct data types
-        df['price'] = pd.to_numeric(df['price'])
-        df['quantity'] = pd.to_numeric(df['quantity'])
+def dates_in_range(start_date, end_date):
+    """Every date from start_date to end_date inclusive, as YYYY-MM-DD strings."""
+    start_obj = datetime.strptime(start_date, '%Y-%m-%d')
+    end_obj = datetime.strptime(end_date, '%Y-%m-%d')
+    return [(start_obj + timedelta(days=days)).strftime('%Y-%m-%d') for days in range((end_obj - start_obj).days + 1)]
 
-        # Calculate total value for weighted average price
-        df['total_value'] = df['price'] * df['quantity']
+def build_trade_export_url(api_url, target_date):
+    """Builds the /trades/export URL that streams one day's trades as CSV."""
+    try:
+        date_obj = datetime.strptime(target_date, '%Y-%m-%d')
+    except ValueError:
+        print(f"Invalid date format: {target_date}. Please use YYYY-MM-DD.")
+        return None
+    end_obj = date_obj + timedelta(days=1) - timedelta(microseconds=1)
+    query = urlencode({
+        'format': 'csv',
+        'start_date': date_obj.isoformat() + '+00:00',
+        'end_date': end_obj.isoformat() + '+00:00',
+    })
+    export_url = f"{api_url.rstrip('/')}/trades/export?{query}"
+    print(f"Reading trades from API: {export_url}")
+    return export_url
 
-        # Group by ticker and aggregate
-        analysis = df.groupby('ticker').agg(
-            total_volume=('quantity', 'sum'),
-            total_value=('total_value', 'sum')
-        ).reset_index()
+def analyze_trade_data(file_path, tickers=None, manifest=None):
+    """
+    Reads trade data from CSV (a local path or URL) or Parquet and calculates
+    volume and average price per stock, of only `tickers` if given. With a
+    manifest, a local file is read incrementally and its entry updated.
+    """
+    if not file_path:
+        return None
 
-        # Calculate average price (weighted by quantity)
-        analysis['average_price'] = analysis['total_value'] / analysis['total_volume']
-        analysis['average_price'] = analysis['average_price'].round(2) # Round to 2 decimal places
+    try:
+        # S3 objects are downloaded to a temporary file first
+        if manifest is None:
+            with local_copy(file_path) as local_path:
+                aggregates, trades = read_trade_aggregates(local_path, tickers=tickers)
+            print(f"Read {trades} trades from {file_path}")
+        else:
+            entry = manifest.inputs.get(file_path)
+            unchanged = False
+            if entry and file_path.startswith('s3://'):
+                # An unchanged object is not even downloaded
+                store, key = split_location(file_path)
+                unchanged = unchanged_entry(entry, tickers, store.info(key))
+            if unchanged:
+                aggregates, status, trades = aggregates_from_json(entry['aggregates']), 'unchanged', 0
+            else:
+                with local_copy(file_path) as local_path:
+                    aggregates, entry, status, trades = incremental_trade_aggregates(local_path, entry, tickers)
+                manifest.inputs[file_path] = entry
+            print(f"Read {trades} trades from {file_path} ({status}, {entry['trades']} in total)")
 
-        # Select and rename columns for the final report
-        analysis_report = analysis[['ticker', 'total_volume', 'average_price']]
+        analysis_report = build_report(aggregates)
         print("Analysis complete:")
         print(analysis_report)
         return analysis_report
@@ -72,6 +195,337 @@ def analyze_trade_data(file_path):
         print(f"Error processing trade data: {e}")
         return None
 
+def aggregate_trades(df):
+    """
+    Per-ticker partial aggregates of a trades DataFrame: total_volume and
+    total_value (the sum of price * quantity). Partials of several files add
+    up to the partials of all their trades (see merge_aggregates).
+    """
+    # Ensure correct data types
+    df['price'] = pd.to_numeric(df['price'])
+    df['quantity'] = pd.to_numeric(df['quantity'])
+
+    # Calculate total value for weighted average price
+    df['total_value'] = df['price'] * df['quantity']
+
+    # Group by ticker and aggregate
+    return df.groupby('ticker').agg(
+        total_volume=('quantity', 'sum'),
+        total_value=('total_value', 'sum')
+    ).reset_index()
+
+def read_trade_aggregates(file_path, chunk_rows=ANALYSIS_CHUNK_ROWS, tickers=None):
+    """
+    Partial aggregates of a trade file (see aggregate_trades), of only
+    `tickers` if given, and the number of trades they cover. The file is read
+    `chunk_rows` rows at a time, each chunk's per-ticker sums added to running
+    totals; the result is the same as aggregating the whole file at once.
+    """
+    if file_path.endswith('.parquet'):
+        return fold_trade_chunks(read_parquet_chunks(file_path, chunk_rows, tickers))
+    if not chunk_rows:
+        df = pd.read_csv(file_path)
+        if tickers:
+            df = df[df['ticker'].isin(tickers)]
+        return aggregate_trades(df), len(df)
+    with pd.read_csv(file_path, usecols=TRADE_COLUMNS, dtype=TRADE_DTYPES, chunksize=chunk_rows) as reader:
+        if tickers:
+            # CSV has to be parsed whole either way
+            return fold_trade_chunks(chunk[chunk['ticker'].isin(tickers)] for chunk in reader)
+        return fold_trade_chunks(reader)
+
+def read_parquet_chunks(file_path, chunk_rows, tickers):
+    """
+    DataFrames of the analyzed columns of a Parquet trade file, about
+    `chunk_rows` rows each (one for the whole file if 0), of only `tickers`
+    if given. The ticker filter is pushed down to the row-group statistics.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    # Tickers read as dictionaries become categoricals without being hashed
+    # again, but a filter on a dictionary column is not checked against the
+    # row-group statistics, so filtered reads convert them in to_pandas()
+    if tickers:
+        file_format = ds.ParquetFileFormat()
+        scanner_filter = ds.field('ticker').isin(tickers)
+    else:
+        file_format = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=['ticker']))
+        scanner_filter = None
+    scanner = ds.dataset(file_path, format=file_format).scanner(columns=TRADE_COLUMNS, filter=scanner_filter)
+    batches, rows = [], 0
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            batches.append(batch)
+            rows += batch.num_rows
+        if chunk_rows and rows >= chunk_rows:
+            yield pa.Table.from_batches(batches).to_pandas(strings_to_categorical=True)
+            batches, rows = [], 0
+    if batches:
+        yield pa.Table.from_batches(batches).to_pandas(strings_to_categorical=True)
+
+def fold_trade_chunks(chunks):
+    """read_trade_aggregates() of DataFrames holding consecutive parts of a trade file."""
+    totals = None
+    integral = True  # whether every chunk's quantities were read as integers
+    trades = 0
+    for chunk in chunks:
+        trades += len(chunk)
+        quantity = pd.to_numeric(chunk['quantity'])
+        integral = integral and pd.api.types.is_integer_dtype(quantity)
+        sums = pd.DataFrame({'total_volume': quantity, 'total_value': chunk['price'] * quantity}).groupby(
+            chunk['ticker'], observed=True).sum()
+        sums.index = sums.index.astype(str)
+        totals = sums if totals is None else totals.add(sums, fill_value=0)
+    if totals is None:
+        return pd.DataFrame({'ticker': [], 'total_volume': [], 'total_value': []}), 0
+
+    # As when the whole file is read: sorted by ticker, integer volumes if
+    # every quantity was an integer
+    totals = totals.sort_index()
+    volume = totals['total_volume']
+    return pd.DataFrame({
+        'ticker': totals.index,
+        'total_volume': volume.astype('int64') if integral else volume,
+        'total_value': totals['total_value'],
+    }).reset_index(drop=True), trades
+
+def read_csv_range(file_path, start, end, hasher, chunk_rows=ANALYSIS_CHUNK_ROWS, tickers=None):
+    """
+    fold_trade_chunks() of the trades in bytes [start, end) of a CSV trade
+    file, which must begin at the header (start 0) or at a line. Every byte
+    read is fed to `hasher`.
+    """
+    if end <= start:
+        return fold_trade_chunks([])
+    with open(file_path, 'rb') as f:
+        header = b''
+        if start:
+            # The header is not in the range, so it is read first, as if it
+            # were (like pandas, skipping blank lines before it). Parsed as a
+            # header rather than given as names, a last line with fields still
+            # missing is read as a full read would, with NaNs
+            header = f.readline()
+            while header and not header.strip():
+                header = f.readline()
+        stream = io.BufferedReader(HashingRange(f, start, end, hasher, prefix=header))
+        reader = pd.read_csv(stream, usecols=TRADE_COLUMNS, dtype=TRADE_DTYPES, chunksize=chunk_rows or None)
+        with reader if chunk_rows else contextlib.nullcontext([reader]) as chunks:
+            if tickers:
+                return fold_trade_chunks(chunk[chunk['ticker'].isin(tickers)] for chunk in chunks)
+            return fold_trade_chunks(chunks)
+
+def unchanged_entry(entry, tickers, info):
+    """Whether a file's manifest entry still describes it, listed as `info`: same size, mtime and ticker filter."""
+    if not entry or entry['tickers'] != tickers:
+        return False
+    return entry['size'] == info.size and entry['mtime_ns'] == info.mtime_ns
+
+def incremental_trade_aggregates(file_path, entry, tickers=None, chunk_rows=ANALYSIS_CHUNK_ROWS):
+    """
+    read_trade_aggregates() of a local trade file, given its manifest entry
+    from an earlier run (or None): {size, mtime_ns, tickers, offset, hash,
+    trades, aggregates}, where offset is the number of bytes processed, hash
+    theirs, and aggregates the partial aggregates of their trades.
+
+    An unchanged file is not read. When a CSV file has grown and its first
+    offset bytes still have the recorded hash, it has only been appended to,
+    and only the trades after offset are read and added to the aggregates.
+    Anything else is read in full. offset ends at the last newline: a last
+    line without one is counted too, but kept out of offset and hash, with
+    the aggregates of the lines before it in the entry's complete_lines, so
+    that it is read again, whole, once more is appended.
+
+    Returns the aggregates, the file's new entry, what was read ('unchanged',
+    'appended' or 'full') and the number of trades read.
+    """
+    stat = os.stat(file_path)
+    if unchanged_entry(entry, tickers, ObjectInfo(file_path, stat.st_size, stat.st_mtime_ns)):
+        return aggregates_from_json(entry['aggregates']), entry, 'unchanged', 0
+    if entry and entry['tickers'] != tickers:
+        entry = None
+
+    if file_path.endswith('.parquet'):
+        # Parquet files are rewritten, never appended to
+        aggregates, trades = read_trade_aggregates(file_path, chunk_rows, tickers)
+        return aggregates, new_entry(stat, tickers, stat.st_size, None, trades, aggregates), 'full', trades
+
+    hasher, start = hashlib.blake2b(digest_size=16), 0
+    if entry and stat.st_size >= entry['offset']:
+        prefix_hasher = hash_prefix(file_path, entry['offset'])
+        if prefix_hasher.hexdigest() == entry['hash']:
+            hasher, start = prefix_hasher, entry['offset']
+    offset = max(start, complete_lines_end(file_path, stat.st_size))
+    if start:
+        # Entries of files that ended with a newline have no complete_lines
+        lines = entry.get('complete_lines') or entry
+        aggregates, total = aggregates_from_json(lines['aggregates']), lines['trades']
+    else:
+        aggregates, total = fold_trade_chunks([])
+    trades = 0
+    if offset > start:
+        new_aggregates, trades = read_csv_range(file_path, start, offset, hasher, chunk_rows, tickers)
+        aggregates = add_aggregates(aggregates, new_aggregates)
+
+    complete_lines = None
+    if offset < stat.st_size:
+        complete_lines = {'trades': total + trades, 'aggregates': aggregates_to_json(aggregates)}
+        tail_aggregates, tail_trades = read_csv_range(file_path, offset, stat.st_size, hashlib.blake2b(),
+                                                      chunk_rows, tickers)
+        aggregates = add_aggregates(aggregates, tail_aggregates)
+        trades += tail_trades
+    entry = new_entry(stat, tickers, offset, hasher.hexdigest(), total + trades, aggregates, complete_lines)
+    return aggregates, entry, 'appended' if start else 'full', trades
+
+def new_entry(stat, tickers, offset, digest, trades, aggregates, complete_lines=None):
+    """A manifest entry, see incremental_trade_aggregates."""
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'tickers': tickers,
+        'offset': offset,
+        'hash': digest,
+        'trades': trades,
+        'aggregates': aggregates_to_json(aggregates),
+        'complete_lines': complete_lines,
+    }
+
+def add_aggregates(aggregates, more):
+    """merge_aggregates() of two partials, either of which may be empty, and so without integer volumes."""
+    if not len(more):
+        return aggregates
+    if not len(aggregates):
+        return more
+    return merge_aggregates([aggregates, more])
+
+def merge_aggregates(partials):
+    """Adds up the partial aggregates of several files or dates, per ticker."""
+    if len(partials) == 1:
+        return partials[0]
+    return pd.concat(partials, ignore_index=True).groupby('ticker').agg(
+        total_volume=('total_volume', 'sum'),
+        total_value=('total_value', 'sum')
+    ).reset_index()
+
+def build_report(aggregates):
+    """The analysis report (ticker, total_volume, average_price) of per-ticker aggregates."""
+    analysis = aggregates.copy()
+
+    # Calculate average price (weighted by quantity)
+    analysis['average_price'] = analysis['total_value'] / analysis['total_volume']
+    analysis['average_price'] = analysis['average_price'].round(2) # Round to 2 decimal places
+
+    # Select and rename columns for the final report
+    return analysis[['ticker', 'total_volume', 'average_price']]
+
+def aggregate_trade_file(file_path, entry=None, tickers=None, incremental=False):
+    """
+    Reads one trade file and returns its partial aggregates and, if
+    `incremental`, its new manifest entry (see incremental_trade_aggregates,
+    given its earlier `entry`); runs in the batch mode's worker processes.
+    """
+    if incremental:
+        aggregates, entry, _, _ = incremental_trade_aggregates(file_path, entry, tickers)
+        return aggregates, entry
+    return read_trade_aggregates(file_path, tickers=tickers)[0], None
+
+def analyze_date_range(base_path, start_date, end_date, workers=ANALYSIS_WORKERS, tickers=None, manifest=None):
+    """
+    Analyzes every trade file of every date from start_date to end_date, for
+    only `tickers` if given.
+    Files are read and aggregated `workers` at a time in a process pool, and
+    their partial aggregates merged into each date's report and one report
+    for the whole range, so the VWAPs weigh every trade exactly once. With a
+    manifest, files are read incrementally and their entries updated. Files
+    in S3 are first downloaded concurrently (see storage.local_copies).
+    Returns ({date: report}, range report), or (None, None) on failure.
+    """
+    try:
+        store = open_store(base_path)
+        files = [(date, info) for date in dates_in_range(start_date, end_date) for info in list_trade_objects(store, date)]
+    except ValueError:
+        print(f"Invalid date range: {start_date} to {end_date}. Please use YYYY-MM-DD.")
+        return None, None
+    except Exception as e:
+        print(f"Error listing trade files: {e}")
+        return None, None
+    if not files:
+        print(f"No trade files found from {start_date} to {end_date}")
+        return None, None
+    print(f"Found {len(files)} trade files from {start_date} to {end_date}")
+
+    # Files are known to the manifest by their path or s3:// URL
+    locations = [store.location(info.key) for _, info in files]
+    partials = [None] * len(files)
+    entries = [None] * len(files)
+    if manifest is not None:
+        # Unchanged files are taken from the manifest without being downloaded
+        # or sent through the pool
+        for index, (_, info) in enumerate(files):
+            entries[index] = manifest.inputs.get(locations[index])
+            if unchanged_entry(entries[index], tickers, info):
+                partials[index] = aggregates_from_json(entries[index]['aggregates'])
+    pending = [index for index, file_aggregates in enumerate(partials) if file_aggregates is None]
+    if manifest is not None:
+        print(f"{len(files) - len(pending)} trade files unchanged since the last run")
+    pending_entries = [entries[index] for index in pending]
+    aggregate = partial(aggregate_trade_file, tickers=tickers, incremental=manifest is not None)
+    try:
+        with local_copies(store, [files[index][1].key for index in pending]) as pending_paths:
+            if workers > 1 and len(pending) > 1:
+                workers = min(workers, len(pending))
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    # A few chunks per worker keeps the pool busy without a round trip per file
+                    results = list(pool.map(aggregate, pending_paths, pending_entries,
+                                            chunksize=max(1, len(pending) // (workers * 4))))
+            else:
+                results = [aggregate(path, entry) for path, entry in zip(pending_paths, pending_entries)]
+    except Exception as e:
+        print(f"Error processing trade data: {e}")
+        return None, None
+    for index, (file_aggregates, entry) in zip(pending, results):
+        partials[index] = file_aggregates
+        if manifest is not None:
+            manifest.inputs[locations[index]] = entry
+
+    by_date = defaultdict(list)
+    for (date, _), file_aggregates in zip(files, partials):
+        by_date[date].append(file_aggregates)
+    daily = {date: merge_aggregates(date_partials) for date, date_partials in by_date.items()}
+    daily_reports = {date: build_report(aggregates) for date, aggregates in daily.items()}
+    range_report = build_report(merge_aggregates(list(daily.values())))
+    print(f"Analysis complete for {len(daily_reports)} dates:")
+    print(range_report)
+    return daily_reports, range_report
+
+def encode_report(analysis_df, output_format):
+    """A report as the bytes of a CSV or Parquet file."""
+    if output_format == 'parquet':
+        buffer = io.BytesIO()
+        analysis_df.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    elif output_format == 'csv':
+        return analysis_df.to_csv(index=False).encode()
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+def save_reports(output_base_path, reports):
+    """
+    Simulates saving reports ({key without extension: report}) to S3, in
+    every ANALYSIS_OUTPUT_FORMATS, several uploads at a time.
+    """
+    try:
+        store = open_store(output_base_path)
+        objects = [(f"{name}.{output_format}", encode_report(report, output_format))
+                   for name, report in reports.items() for output_format in ANALYSIS_OUTPUT_FORMATS]
+        store.write_many(objects)
+        for key, _ in objects:
+            print(f"Analysis results saved to: {store.location(key)}")
+        return True
+    except Exception as e:
+        print(f"Error saving analysis results: {e}")
+        return False
+
 def save_analysis_results(analysis_df, output_base_path, target_date):
     """Simulates saving the analysis results back to S3."""
     if analysis_df is None or analysis_df.empty:
@@ -80,38 +534,81 @@ def save_analysis_results(analysis_df, output_base_path, target_date):
 
     try:
         date_obj = datetime.strptime(target_date, '%Y-%m-%d')
-        output_dir = os.path.join(output_base_path, str(date_obj.year), f"{date_obj.month:02d}", f"{date_obj.day:02d}")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        output_filename = f"analysis_{target_date}.csv"
-        output_file_path = os.path.join(output_dir, output_filename)
-        
-        analysis_df.to_csv(output_file_path, index=False)
-        print(f"Analysis results saved to: {output_file_path}")
+    except ValueError:
+        print(f"Invalid date format: {target_date}. Please use YYYY-MM-DD.")
+        return False
+    return save_reports(output_base_path, {f"{date_prefix(date_obj)}/analysis_{target_date}": analysis_df})
+
+def open_manifest():
+    """The manifest of the output bucket (see manifest.py)."""
+    return Manifest(open_store(SIMULATED_S3_OUTPUT_PATH), MANIFEST_FILE)
+
+def save_manifest(manifest):
+    """Saves the manifest once the results it describes are saved; a run that fails before is redone from the previous one."""
+    try:
+        manifest.save()
+        print(f"Manifest saved to: {manifest.location}")
         return True
     except Exception as e:
-        print(f"Error saving analysis results: {e}")
+        print(f"Error saving manifest: {e}")
         return False
 
+def batch_handler(start_date, end_date, tickers=None):
+    """The Lambda flow for a range of dates: daily results for each date with trades, and one for the range."""
+    print(f"Lambda batch simulation started for {start_date} to {end_date} ({ANALYSIS_WORKERS} workers)")
+    manifest = open_manifest() if INCREMENTAL_ANALYSIS else None
+    daily_reports, range_report = analyze_date_range(SIMULATED_S3_BUCKET_PATH, start_date, end_date, tickers=tickers,
+                                                     manifest=manifest)
+    if range_report is None:
+        return {'statusCode': 500, 'body': f'Failed to analyze trade data from {start_date} to {end_date}'}
+
+    # Daily reports under each date's prefix, the range report next to them
+    reports = {f"{date_prefix(datetime.strptime(date, '%Y-%m-%d'))}/analysis_{date}": report
+               for date, report in daily_reports.items() if not report.empty}
+    reports[f"analysis_{start_date}_{end_date}"] = range_report
+    success = save_reports(SIMULATED_S3_OUTPUT_PATH, reports)
+    if success and manifest is not None:
+        success = save_manifest(manifest)
+    if success:
+        print("Lambda batch simulation completed successfully.")
+        return {'statusCode': 200, 'body': f'Analysis complete for {len(daily_reports)} dates from {start_date} to {end_date}. Results saved.'}
+    else:
+        print("Lambda batch simulation failed during saving results.")
+        return {'statusCode': 500, 'body': 'Failed to save analysis results'}
+
 # Simulating the Lambda handler function
 def lambda_handler(event, context):
     """Main function simulating the AWS Lambda execution flow."""
+    event = event or {}
+    tickers = parse_tickers(event.get('tickers') or ANALYSIS_TICKERS)
+    start_date = event.get('start_date') or START_DATE_STR
+    if start_date:
+        return batch_handler(start_date, event.get('end_date') or END_DATE_STR or start_date, tickers)
+
     print(f"Lambda simulation started for date: {TARGET_DATE_STR}")
     
-    # 1. Find the trade data file (Simulated S3 List/Get)
-    trade_file_path = find_latest_trade_file(SIMULATED_S3_BUCKET_PATH, TARGET_DATE_STR)
+    # 1. Find the trade data file (Simulated S3 List/Get), or stream it from the trades API
+    if TRADES_API_URL:
+        trade_file_path = build_trade_export_url(TRADES_API_URL, TARGET_DATE_STR)
+    else:
+        trade_file_path = find_latest_trade_file(SIMULATED_S3_BUCKET_PATH, TARGET_DATE_STR)
     
     if not trade_file_path:
         return {'statusCode': 404, 'body': f'Trade data not found for {TARGET_DATE_STR}'}
     
-    # 2. Analyze the trade data
-    analysis_results = analyze_trade_data(trade_file_path)
+    # 2. Analyze the trade data, incrementally unless it is streamed from the API
+    manifest = None
+    if INCREMENTAL_ANALYSIS and not TRADES_API_URL:
+        manifest = open_manifest()
+    analysis_results = analyze_trade_data(trade_file_path, tickers, manifest)
     
     if analysis_results is None:
         return {'statusCode': 500, 'body': 'Failed to analyze trade data'}
         
     # 3. Save the analysis results (Simulated S3 Put)
     success = save_analysis_results(analysis_results, SIMULATED_S3_OUTPUT_PATH, TARGET_DATE_STR)
+    if success and manifest is not None:
+        success = save_manifest(manifest)
     
     if success:
         print("Lambda simulation completed successfully.")
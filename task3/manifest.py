@@ -0,0 +1,102 @@
+
+import hashlib
+import io
+import json
+
+import pandas as pd
+
+# Incremental re-analysis for lambda_simulation.py. The manifest records, for
+# every input file analyzed, its size and mtime, how far into it the trades
+# have been processed, a hash of the bytes up to there, and the partial
+# aggregates of those trades. An unchanged file is not read again, and a CSV
+# file that has only been appended to is read from where the last run stopped.
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+READ_BLOCK = 1 << 20
+
+class Manifest:
+    """The manifest saved as `key` in a store (see storage.py): {input file path or URL: entry}, see lambda_simulation.incremental_trade_aggregates."""
+
+    def __init__(self, store, key=MANIFEST_FILE):
+        self.store = store
+        self.key = key
+        self.location = store.location(key)
+        self.inputs = {}
+        try:
+            data = json.loads(store.read(key))
+            if data.get('version') == MANIFEST_VERSION:
+                self.inputs = data['inputs']
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            print(f"Ignoring unreadable manifest {self.location}: {e}")
+
+    def save(self):
+        # Replaced whole, so a failed run leaves the previous manifest intact
+        self.store.write(self.key, json.dumps({'version': MANIFEST_VERSION, 'inputs': self.inputs}).encode())
+
+def aggregates_to_json(aggregates):
+    return {column: aggregates[column].tolist() for column in ('ticker', 'total_volume', 'total_value')}
+
+def aggregates_from_json(data):
+    volumes = data['total_volume']
+    return pd.DataFrame({
+        'ticker': pd.Series(data['ticker'], dtype='str'),
+        # Integer volumes stay integers, as they print differently
+        'total_volume': pd.Series(volumes, dtype='int64' if all(isinstance(v, int) for v in volumes) else 'float64'),
+        'total_value': pd.Series(data['total_value'], dtype='float64'),
+    })
+
+def hash_prefix(path, length):
+    """A hasher fed the first `length` bytes of a file, to compare with a manifest entry or to carry on from."""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while length > 0:
+            block = f.read(min(READ_BLOCK, length))
+            if not block:
+                break
+            hasher.update(block)
+            length -= len(block)
+    return hasher
+
+def complete_lines_end(path, size):
+    """Offset just past the last newline in the first `size` bytes of a file; a line still being written is left for the next run."""
+    with open(path, 'rb') as f:
+        end = size
+        while end > 0:
+            start = max(0, end - READ_BLOCK)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+class HashingRange(io.RawIOBase):
+    """
+    Bytes [start, end) of an open binary file as a stream, fed to `hasher` as
+    they are read; after `prefix`, which is not hashed.
+    """
+
+    def __init__(self, f, start, end, hasher, prefix=b''):
+        super().__init__()
+        f.seek(start)
+        self._file = f
+        self._left = end - start
+        self._hasher = hasher
+        self._prefix = prefix
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            count = min(len(buffer), len(self._prefix))
+            buffer[:count] = self._prefix[:count]
+            self._prefix = self._prefix[count:]
+            return count
+        view = memoryview(buffer)[:min(len(buffer), self._left)]
+        count = self._file.readinto(view)
+        self._hasher.update(view[:count])
+        self._left -= count
+        return count
@@ -0,0 +1,273 @@
+
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Where lambda_simulation.py keeps its trade files and results: a local
+# directory simulating S3, or an s3:// URL read and written with boto3.
+# S3_ENDPOINT_URL points boto3 at an S3-compatible server instead of AWS, e.g.
+# http://localhost:9000 for MinIO or http://localhost:5000 for moto_server
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+# Objects are downloaded and uploaded STORAGE_IO_WORKERS at a time. S3 requests
+# mostly wait on the network, so threads overlap them well past the CPU count;
+# the S3 client keeps as many connections open
+STORAGE_IO_WORKERS = int(os.getenv('STORAGE_IO_WORKERS', '16'))
+# S3 objects larger than this are downloaded as parts of this size, fetched
+# concurrently with ranged GETs, and uploaded as multipart uploads
+STORAGE_PART_SIZE = int(os.getenv('STORAGE_PART_SIZE', str(8 * 1024 * 1024)))
+
+ObjectInfo = namedtuple('ObjectInfo', ['key', 'size', 'mtime_ns'])
+
+def _mtime_ns(last_modified):
+    return int(last_modified.timestamp() * 1_000_000) * 1000
+
+def map_concurrently(function, items, workers=STORAGE_IO_WORKERS):
+    """[function(item) for item in items], `workers` at a time in a thread pool."""
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(function, items))
+
+class ObjectStore(ABC):
+    """
+    A bucket of objects under '/'-separated keys. Missing objects raise
+    FileNotFoundError, whatever the backend.
+    """
+
+    @abstractmethod
+    def location(self, key):
+        """The object's path or URL, as printed and recorded in the manifest."""
+
+    def local_path(self, key):
+        """The object's local file, if the store is local; None otherwise."""
+        return None
+
+    @abstractmethod
+    def list(self, prefix=''):
+        """ObjectInfo of every object whose key starts with `prefix`, in key order."""
+
+    @abstractmethod
+    def info(self, key):
+        """ObjectInfo of one object."""
+
+    @abstractmethod
+    def read(self, key, start=0, end=None):
+        """Bytes [start, end) of an object, or from start to its end."""
+
+    @abstractmethod
+    def write(self, key, data):
+        """Creates or replaces an object, which readers only ever see whole."""
+
+    @abstractmethod
+    def download(self, key, path, workers=STORAGE_IO_WORKERS):
+        """Copies an object to a local file, keeping its modification time."""
+
+    @abstractmethod
+    def upload(self, path, key):
+        """Creates or replaces an object with a local file's contents."""
+
+    def download_many(self, keys, directory, workers=STORAGE_IO_WORKERS):
+        """Downloads objects under `directory`, `workers` at a time; returns their local paths."""
+        keys = list(keys)
+        # Parts of large objects get whatever concurrency the objects leave over
+        part_workers = max(1, workers // max(1, len(keys)))
+
+        def download(key):
+            path = os.path.join(directory, *key.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.download(key, path, part_workers)
+            return path
+        return map_concurrently(download, keys, workers)
+
+    def write_many(self, objects, workers=STORAGE_IO_WORKERS):
+        """Writes (key, bytes) pairs, `workers` at a time."""
+        map_concurrently(lambda item: self.write(*item), objects, workers)
+
+class LocalStore(ObjectStore):
+    """Objects as files under a local directory, as the simulated S3 buckets have always been."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def location(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    local_path = location
+
+    def list(self, prefix=''):
+        # Only the directory the prefix points into needs walking
+        directory = self.location(prefix.rpartition('/')[0]) if '/' in prefix else self.root
+        objects = []
+        for parent, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(parent, name)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    stat = os.stat(path)
+                    objects.append(ObjectInfo(key, stat.st_size, stat.st_mtime_ns))
+        return sorted(objects)
+
+    def info(self, key):
+        stat = os.stat(self.location(key))
+        return ObjectInfo(key, stat.st_size, stat.st_mtime_ns)
+
+    def read(self, key, start=0, end=None):
+        with open(self.location(key), 'rb') as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(max(0, end - start))
+
+    def write(self, key, data):
+        path = self.location(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Replaced whole, so readers never see a partly written object, as on S3
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+
+    def download(self, key, path, workers=STORAGE_IO_WORKERS):
+        shutil.copy2(self.location(key), path)
+
+    def upload(self, path, key):
+        destination = self.location(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copy2(path, destination)
+
+class S3Store(ObjectStore):
+    """Objects of an S3 bucket, or of an S3-compatible server at `endpoint_url`, under an optional key prefix."""
+
+    def __init__(self, bucket, prefix='', endpoint_url=S3_ENDPOINT_URL, pool_size=STORAGE_IO_WORKERS,
+                 part_size=STORAGE_PART_SIZE):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.part_size = part_size
+        # One client is shared by every thread (botocore clients are thread
+        # safe). Its connection pool must be as large as the thread pools, or
+        # the extra requests open connections that are thrown away afterwards
+        self.client = boto3.session.Session().client('s3', endpoint_url=endpoint_url, config=Config(
+            max_pool_connections=pool_size, retries={'max_attempts': 5, 'mode': 'standard'}))
+        self.transfer_config = TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size,
+                                              max_concurrency=pool_size)
+
+    def location(self, key):
+        return f"s3://{self.bucket}/{self.prefix}{key}"
+
+    def _missing(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(self.location(key)) from e
+            raise
+
+    def list(self, prefix=''):
+        objects = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            for item in page.get('Contents', []):
+                objects.append(ObjectInfo(item['Key'][len(self.prefix):], item['Size'], _mtime_ns(item['LastModified'])))
+        return sorted(objects)
+
+    def info(self, key):
+        head = self._head(key)
+        return ObjectInfo(key, head['ContentLength'], _mtime_ns(head['LastModified']))
+
+    def read(self, key, start=0, end=None, etag=None):
+        """Ranged GET of bytes [start, end); with `etag`, fails if the object has been replaced since."""
+        from botocore.exceptions import ClientError
+
+        if end is not None and end <= start:
+            return b''
+        arguments = {'Bucket': self.bucket, 'Key': self.prefix + key}
+        if start or end is not None:
+            arguments['Range'] = f"bytes={start}-{'' if end is None else end - 1}"
+        if etag:
+            arguments['IfMatch'] = etag
+        try:
+            return self.client.get_object(**arguments)['Body'].read()
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(self.location(key)) from e
+            raise
+
+    def write(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def download(self, key, path, workers=STORAGE_IO_WORKERS):
+        head = self._head(key)
+        size = head['ContentLength']
+        with open(path, 'wb') as f:
+            if size <= self.part_size:
+                f.write(self.read(key))
+            else:
+                # Parts are written in place as they arrive; the ETag makes sure
+                # they all come from the same version of the object
+                f.truncate(size)
+
+                def fetch(start):
+                    os.pwrite(f.fileno(), self.read(key, start, min(start + self.part_size, size), head['ETag']), start)
+                map_concurrently(fetch, range(0, size, self.part_size), workers)
+        # Keeps unchanged objects recognizable by size and mtime, as local files are
+        mtime_ns = _mtime_ns(head['LastModified'])
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def upload(self, path, key):
+        # Multipart, with parts uploaded concurrently, above part_size
+        self.client.upload_file(path, self.bucket, self.prefix + key, Config=self.transfer_config)
+
+@lru_cache(maxsize=None)
+def open_store(location):
+    """
+    The store at a location: s3://bucket[/prefix] or a local directory. Stores
+    are kept, so every caller shares one S3 client and its connection pool.
+    """
+    if location.startswith('s3://'):
+        bucket, _, prefix = location[len('s3://'):].partition('/')
+        return S3Store(bucket, prefix)
+    return LocalStore(location)
+
+def split_location(location):
+    """The store holding the object at a location (see open_store), and the object's key in it."""
+    if location.startswith('s3://'):
+        bucket, _, key = location[len('s3://'):].partition('/')
+        return open_store(f"s3://{bucket}"), key
+    return open_store(os.path.dirname(location)), os.path.basename(location)
+
+@contextmanager
+def local_copies(store, keys, workers=STORAGE_IO_WORKERS):
+    """
+    Local paths of objects for the duration of the block: their own files in
+    a local store, temporary downloads, made concurrently, in any other.
+    """
+    if isinstance(store, LocalStore):
+        yield [store.local_path(key) for key in keys]
+        return
+    directory = tempfile.mkdtemp(prefix='trades_')
+    try:
+        yield store.download_many(keys, directory, workers)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+@contextmanager
+def local_copy(location):
+    """A local path for a trade file location; http(s) URLs are left as they are, for pandas to read."""
+    if not location.startswith('s3://'):
+        yield location
+        return
+    store, key = split_location(location)
+    with local_copies(store, [key]) as (path,):
+        yield path
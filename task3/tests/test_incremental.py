@@ -0,0 +1,46 @@
+
+"""
+Incremental re-analysis (incremental_trade_aggregates in lambda_simulation.py)
+against reading the whole file, for CSV files whose last line has no newline
+yet:
+
+    cd task3 && python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from lambda_simulation import incremental_trade_aggregates, read_trade_aggregates
+
+HEADER = "ticker,price,quantity,side\n"
+
+def check_against_full_read(path, entry, expected_status):
+    aggregates, entry, status, _ = incremental_trade_aggregates(str(path), entry)
+    full, trades = read_trade_aggregates(str(path))
+    assert status == expected_status
+    assert entry['trades'] == trades
+    pd.testing.assert_frame_equal(aggregates, full)
+    return entry
+
+@pytest.mark.parametrize("tail", ["B,2,3,sell", "B,2,3"], ids=["no final newline", "fields still missing"])
+def test_unterminated_last_line(tmp_path, tail):
+    path = tmp_path / "trades.csv"
+    path.write_text(HEADER + "A,1,2,buy\n" + tail)
+
+    entry = check_against_full_read(path, None, 'full')
+    assert entry['complete_lines'] is not None
+    entry = check_against_full_read(path, entry, 'unchanged')
+
+    # The rest of the line arrives, then more trades, one still unterminated
+    with open(path, 'a') as f:
+        f.write(("0,sell" if tail.count(',') == 2 else "0") + "\nA,4,5,buy\nC,6,7")
+    entry = check_against_full_read(path, entry, 'appended')
+    with open(path, 'a') as f:
+        f.write(",buy\n")
+    entry = check_against_full_read(path, entry, 'appended')
+    assert entry['complete_lines'] is None
@@ -0,0 +1,134 @@
+
+"""
+The object stores of storage.py, the S3 one against moto's in-process mock of
+S3, and the manifest saved through them:
+
+    cd task3 && python -m pytest tests
+
+Skipped when boto3 or moto is not installed.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+import pandas as pd
+
+from manifest import Manifest, aggregates_from_json, aggregates_to_json
+from storage import LocalStore, ObjectStore, S3Store
+
+BUCKET = "test-trades"
+# The smallest part S3 accepts in a multipart upload
+PART_SIZE = 5 * 1024 * 1024
+
+TRADES = {
+    "2025/06/05/trades.csv": b"ticker,price,quantity\nAAPL,190.5,10\nMSFT,420.0,5\n",
+    "2025/06/05/trades-late.csv": b"ticker,price,quantity\nAAPL,191.0,3\n",
+    "2025/06/06/trades.csv": b"ticker,price,quantity\nGOOG,175.25,7\n",
+}
+
+@pytest.fixture
+def s3_store(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BUCKET)
+        yield S3Store(BUCKET, "trades", endpoint_url=None, pool_size=4, part_size=PART_SIZE)
+
+@pytest.fixture(params=["local", "s3"])
+def store(request, tmp_path):
+    if request.param == "s3":
+        return request.getfixturevalue("s3_store")
+    return LocalStore(str(tmp_path / "bucket"))
+
+def test_object_store_is_abstract():
+    class ReadOnlyStore(ObjectStore):
+        def location(self, key):
+            return key
+
+    with pytest.raises(TypeError):
+        ObjectStore()
+    with pytest.raises(TypeError):
+        ReadOnlyStore()
+
+def test_list(store):
+    store.write_many(TRADES.items())
+
+    listed = store.list("2025/06/05/")
+    assert [info.key for info in listed] == ["2025/06/05/trades-late.csv", "2025/06/05/trades.csv"]
+    assert [info.size for info in listed] == [len(TRADES[info.key]) for info in listed]
+    assert [info.key for info in store.list()] == sorted(TRADES)
+    assert store.list("2025/07/") == []
+    assert store.info("2025/06/06/trades.csv") == store.list("2025/06/06/")[0]
+
+def test_ranged_read(store):
+    key = "2025/06/05/trades.csv"
+    data = TRADES[key]
+    store.write(key, data)
+
+    assert store.read(key) == data
+    assert store.read(key, 8, 20) == data[8:20]
+    assert store.read(key, 22) == data[22:]
+    assert store.read(key, 10, 10) == b""
+
+def test_missing_objects_raise_file_not_found(store, tmp_path):
+    store.write("2025/06/05/trades.csv", TRADES["2025/06/05/trades.csv"])
+    missing = "2025/06/05/missing.csv"
+
+    with pytest.raises(FileNotFoundError):
+        store.info(missing)
+    with pytest.raises(FileNotFoundError):
+        store.read(missing)
+    with pytest.raises(FileNotFoundError):
+        store.read(missing, 0, 10)
+    with pytest.raises(FileNotFoundError):
+        store.download(missing, str(tmp_path / "missing.csv"))
+
+def test_multipart_upload_and_download(store, tmp_path):
+    key = "2025/06/05/large.csv"
+    # Two full parts and a partial one
+    data = os.urandom(2 * PART_SIZE + 12345)
+    source = tmp_path / "large.csv"
+    source.write_bytes(data)
+
+    store.upload(str(source), key)
+    if isinstance(store, S3Store):
+        # A multipart upload's ETag ends with its number of parts
+        assert store.client.head_object(Bucket=BUCKET, Key=store.prefix + key)["ETag"].strip('"').endswith("-3")
+    destination = tmp_path / "download" / "2025" / "06" / "05" / "large.csv"
+    [path] = store.download_many([key], str(tmp_path / "download"), workers=4)
+
+    assert path == str(destination)
+    assert destination.read_bytes() == data
+    assert os.stat(destination).st_mtime_ns == store.info(key).mtime_ns
+
+def test_manifest_round_trip(store):
+    aggregates = pd.DataFrame({
+        "ticker": pd.Series(["AAPL", "MSFT"], dtype="str"),
+        "total_volume": pd.Series([13, 5], dtype="int64"),
+        "total_value": pd.Series([2478.0, 2100.0], dtype="float64"),
+    })
+    location = store.location("2025/06/05/trades.csv")
+
+    manifest = Manifest(store)
+    assert manifest.inputs == {}
+    manifest.inputs[location] = {"size": 10, "mtime_ns": 1, "tickers": None, "offset": 10, "hash": "00",
+                                 "trades": 2, "aggregates": aggregates_to_json(aggregates), "complete_lines": None}
+    manifest.save()
+
+    reloaded = Manifest(store)
+    assert reloaded.location == store.location("manifest.json")
+    assert reloaded.inputs == manifest.inputs
+    pd.testing.assert_frame_equal(aggregates_from_json(reloaded.inputs[location]["aggregates"]), aggregates)
+
+def test_unreadable_manifest_is_ignored(store, capsys):
+    store.write("manifest.json", b"{not json")
+
+    assert Manifest(store).inputs == {}
+    assert "Ignoring unreadable manifest" in capsys.readouterr().out
@@ -0,0 +1,44 @@
+
+"""
+Which of a CSV and Parquet trade file of the same name is analyzed
+(current_trade_files in lambda_simulation.py):
+
+    cd task3 && python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lambda_simulation import find_latest_trade_file, list_trade_objects
+from storage import LocalStore
+
+DATE = "2025/06/05"
+
+def write(root, key, mtime):
+    path = root / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"ticker,price,quantity\nAAPL,190.5,10\n")
+    os.utime(path, (mtime, mtime))
+
+@pytest.mark.parametrize("csv_mtime, parquet_mtime, expected", [
+    (1_000, 2_000, "trades.parquet"),
+    (1_000, 1_000, "trades.parquet"),
+    (2_000, 1_000, "trades.csv"),
+], ids=["converted", "same mtime", "csv modified since"])
+def test_parquet_only_when_as_new_as_csv(tmp_path, csv_mtime, parquet_mtime, expected):
+    write(tmp_path, f"{DATE}/trades.csv", csv_mtime)
+    write(tmp_path, f"{DATE}/trades.parquet", parquet_mtime)
+    write(tmp_path, f"{DATE}/trades-late.csv", 3_000)
+
+    keys = [info.key for info in list_trade_objects(LocalStore(str(tmp_path)), "2025-06-05")]
+    assert keys == [f"{DATE}/{expected}", f"{DATE}/trades-late.csv"]
+    assert find_latest_trade_file(str(tmp_path), "2025-06-05") == str(tmp_path / DATE / expected)
+
+def test_parquet_without_csv(tmp_path):
+    write(tmp_path, f"{DATE}/trades.parquet", 1_000)
+
+    keys = [info.key for info in list_trade_objects(LocalStore(str(tmp_path)), "2025-06-05")]
+    assert keys == [f"{DATE}/trades.parquet"]